@@ -0,0 +1,158 @@
+import json
+import os
+import re
+import tempfile
+from urllib.parse import urlsplit
+
+from profiler import percentile as compute_percentile
+
+DEFAULT_HISTORY_FILE = '.timing_history.json'
+
+# URLのパスで値が変わる部分 (数字のみ・UUID・長い16進数) は同じページとして扱う
+_VARIABLE_SEGMENT = re.compile(r'^(\d+|[0-9a-fA-F]{8}(-?[0-9a-fA-F]{4}){3}-?[0-9a-fA-F]{12}|[0-9a-fA-F]{16,})$')
+
+
+def url_pattern(url):
+    """
+    履歴のキーに使用するURLのパターンを返します。クエリとフラグメントを除き、IDなどのパス部分を '*' に置き換えます。
+
+    例: 'https://example.com/users/123/edit?tab=1' -> 'example.com/users/*/edit'
+    """
+    if not url:
+        return ''
+    parts = urlsplit(url)
+    segments = ['*' if _VARIABLE_SEGMENT.match(segment) else segment for segment in parts.path.split('/')]
+    return f"{parts.netloc}{'/'.join(segments)}" if parts.netloc else url
+
+
+class AdaptiveTimeouts:
+    """
+    要素が表示されるまでにかかった時間を「URLのパターン + セレクタ」ごとにファイルへ記録し、
+    過去の記録のパーセンタイルに安全係数を掛けた値を要素の待機時間として使用します。
+    記録が min_samples 件に満たない要素は既定の待機時間を使用します。
+
+    ファイルは最初に使用したときに読み込み、save() で書き込みます。
+    保存時にはファイルの内容と今回の記録を統合します。並列実行では各ワーカーが take_new_samples() で今回の記録を返し、
+    親プロセスが add_samples() でまとめてから1回だけ save() します (ワーカーごとに保存すると記録が上書きされるため)。
+    """
+
+    def __init__(self, filepath=DEFAULT_HISTORY_FILE, percentile=95, safety_factor=3.0, floor=2.0, ceiling=30.0,
+                 min_samples=5, max_samples=50):
+        """
+        Args:
+            filepath (str): 記録を保存するJSONファイルのパス。
+            percentile (float): 待機時間の算出に使用するパーセンタイル (0-100)。
+            safety_factor (float): パーセンタイル値に掛ける安全係数。
+            floor (float): 算出した待機時間の下限（秒）。
+            ceiling (float): 算出した待機時間の上限（秒）。
+            min_samples (int): 記録から待機時間を算出するのに必要な最小件数。
+            max_samples (int): 要素ごとに保持する直近の記録の件数。
+        """
+        self.filepath = filepath
+        self.percentile = percentile
+        self.safety_factor = safety_factor
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self._samples = None # キー -> 所要時間のリスト (最初に使用したときに読み込む)
+        self._new_samples = {} # キー -> 今回記録した所要時間のリスト (保存時の統合用)
+
+    @staticmethod
+    def make_key(url, selector_type, selector_value):
+        return f"{url_pattern(url)} {selector_type.lower()}={selector_value}"
+
+    def _read_file(self):
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {} # 初回実行時や壊れたファイルは記録なしとして扱う
+
+    def _loaded(self):
+        if self._samples is None:
+            self._samples = self._read_file()
+        return self._samples
+
+    def record(self, url, selector_type, selector_value, seconds):
+        """
+        要素が表示されるまでにかかった時間を記録します。
+
+        Args:
+            url (str): 要素を探したページのURL。
+            selector_type (str): セレクタのタイプ。
+            selector_value (str): セレクタの値。
+            seconds (float): 要素が表示されるまでにかかった時間（秒）。
+        """
+        key = self.make_key(url, selector_type, selector_value)
+        samples = self._loaded().setdefault(key, [])
+        samples.append(round(seconds, 4))
+        del samples[:-self.max_samples]
+        self._new_samples.setdefault(key, []).append(round(seconds, 4))
+
+    def take_new_samples(self):
+        """
+        今回記録した所要時間を取り出します。取り出した記録は save() で保存されません。
+
+        Returns:
+            dict: キーから所要時間のリストへのマップ (add_samples に渡す形式)。
+        """
+        samples, self._new_samples = self._new_samples, {}
+        return samples
+
+    def add_samples(self, samples):
+        """
+        他のプロセスで記録した所要時間 (take_new_samples の戻り値) を今回の記録に追加します。
+
+        Args:
+            samples (dict): キーから所要時間のリストへのマップ。
+        """
+        for key, values in (samples or {}).items():
+            if self._samples is not None:
+                loaded = self._samples.setdefault(key, [])
+                loaded.extend(values)
+                del loaded[:-self.max_samples]
+            self._new_samples.setdefault(key, []).extend(values)
+
+    def timeout_for(self, url, selector_type, selector_value, default):
+        """
+        要素の待機時間を返します。
+
+        Args:
+            url (str): 要素を探すページのURL。
+            selector_type (str): セレクタのタイプ。
+            selector_value (str): セレクタの値。
+            default (float): 記録が足りない場合の待機時間（秒）。
+
+        Returns:
+            float: 待機時間（秒）。
+        """
+        samples = self._loaded().get(self.make_key(url, selector_type, selector_value), [])
+        if len(samples) < self.min_samples:
+            return default
+        learned = compute_percentile(sorted(samples), self.percentile) * self.safety_factor
+        return min(max(learned, self.floor), self.ceiling)
+
+    def save(self):
+        """
+        今回の記録をファイルに保存します。ファイルの最新の内容に今回の記録を追加してから書き込みます。
+        """
+        if not self._new_samples:
+            return
+        data = self._read_file()
+        for key, samples in self._new_samples.items():
+            merged = data.get(key, []) + samples
+            data[key] = merged[-self.max_samples:]
+        directory = os.path.dirname(os.path.abspath(self.filepath))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.filepath) # 書き込み途中のファイルを読まれないよう置き換える
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._samples = data
+        self._new_samples = {}
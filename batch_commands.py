@@ -0,0 +1,104 @@
+# まとめて1回の execute_script で実行できるコマンド
+BATCHABLE_COMMANDS = ('input', 'log_content')
+
+# 1回の execute_script で実行する最大コマンド数
+DEFAULT_MAX_BATCH_SIZE = 100
+
+# 連続する input / log_content をページ内でまとめて実行するスクリプト。
+# 先頭から順に実行し、要素が見つからない・表示されていない・入力できない場合はそこで停止して
+# それまでの結果を返す (停止したコマンドは呼び出し側で通常の方法で実行する)。
+BATCH_JS = """
+const steps = arguments[0];
+const results = [];
+
+function findElement(type, value) {
+    switch (type) {
+        case 'id': return document.getElementById(value);
+        case 'name': return document.getElementsByName(value)[0] || null;
+        case 'class_name': return document.getElementsByClassName(value)[0] || null;
+        case 'tag_name': return document.getElementsByTagName(value)[0] || null;
+        case 'css_selector': return document.querySelector(value);
+        case 'xpath':
+            return document.evaluate(value, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        case 'link_text':
+        case 'partial_link_text':
+            for (const link of document.getElementsByTagName('a')) {
+                const text = link.innerText.trim();
+                if (type === 'link_text' ? text === value : text.indexOf(value) !== -1) return link;
+            }
+            return null;
+    }
+    return null;
+}
+
+function isVisible(element) {
+    const style = window.getComputedStyle(element);
+    return style.visibility !== 'hidden' && style.display !== 'none' && element.getClientRects().length > 0;
+}
+
+function setValue(element, value) {
+    const tag = element.tagName;
+    const textTypes = ['text', 'search', 'email', 'password', 'tel', 'url', 'number', ''];
+    if (element.disabled || element.readOnly) return false;
+    if (tag === 'INPUT' && textTypes.indexOf((element.getAttribute('type') || '').toLowerCase()) === -1) return false;
+    if (tag !== 'INPUT' && tag !== 'TEXTAREA') return false;
+    // Reactなどのフレームワークが値の変更を検知できるよう、プロトタイプのsetterで設定する
+    const prototype = tag === 'INPUT' ? HTMLInputElement.prototype : HTMLTextAreaElement.prototype;
+    element.focus();
+    Object.getOwnPropertyDescriptor(prototype, 'value').set.call(element, value);
+    element.dispatchEvent(new Event('input', {bubbles: true}));
+    element.dispatchEvent(new Event('change', {bubbles: true}));
+    return true;
+}
+
+for (const step of steps) {
+    const element = findElement(step.selector_type, step.selector_value);
+    if (!element || !isVisible(element)) break;
+    if (step.command === 'input') {
+        if (!setValue(element, step.value)) break;
+        results.push(null);
+    } else {
+        const contentType = step.value.toLowerCase();
+        let content;
+        if (contentType === 'text') {
+            content = element.innerText;
+        } else if (contentType === 'value') {
+            content = element.value === undefined ? element.getAttribute('value') : element.value;
+        } else {
+            content = ('text' in element) ? element.text : element.getAttribute('text');
+        }
+        results.push(content === undefined || content === null ? null : String(content));
+    }
+}
+return results;
+"""
+
+
+def collect_batch(commands, start, max_size=DEFAULT_MAX_BATCH_SIZE):
+    """
+    start の位置から連続する input / log_content コマンドを取り出します。
+
+    Args:
+        commands (list): scenario_compiler.Command のリスト。
+        start (int): 取り出しを開始する位置。
+        max_size (int): 取り出す最大件数。
+
+    Returns:
+        list: 連続する input / log_content コマンドのリスト (該当しない場合は空のリスト)。
+    """
+    batch = []
+    for command in commands[start:start + max_size]:
+        if command.name not in BATCHABLE_COMMANDS:
+            break
+        batch.append(command)
+    return batch
+
+
+def batch_steps(commands):
+    """BATCH_JS に渡す引数に変換します。"""
+    return [{
+        'command': command.name,
+        'selector_type': command.selector_type.lower(),
+        'selector_value': command.selector_value,
+        'value': command.value,
+    } for command in commands]
@@ -0,0 +1,564 @@
+import argparse
+import base64
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image
+
+from batch_commands import BATCH_JS
+from buffered_logger import BufferedCsvLogger, BufferedJsonlLogger
+from fullpage_capture import CapturedPage, save_captured_page
+from gen_scenario import generate_commands_with_vars
+from scenario_compiler import compile_rows, compile_scenario
+from test_automation import WebTestAutomation
+from wait_engine import PAGE_STATE_JS
+
+# 結果ファイルの形式を変更した場合は値を上げる
+RESULT_FORMAT_VERSION = 1
+
+# ベースラインより中央値がこの割合以上遅くなった場合に性能低下とみなす
+DEFAULT_THRESHOLD = 0.10
+
+SCENARIO_HEADER = ['コマンド', 'セレクタタイプ', 'セレクタ値', '値／ファイルパス', 'オプション1', 'オプション2']
+
+
+def _render_png(width, height):
+    """計測用のグラデーション画像をPNGのバイト列で返します。"""
+    gradient = Image.linear_gradient('L').resize((width, height))
+    image = Image.merge('RGB', (gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), gradient))
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+class FakeElement:
+    """FakeDriver が返す要素。操作を記録するだけで何もしません。"""
+
+    def __init__(self, driver, selector_value):
+        self._driver = driver
+        self.text = f"fixture:{selector_value}"
+
+    def is_displayed(self):
+        self._driver._record('is_displayed')
+        return True
+
+    def clear(self):
+        self._driver._record('clear')
+
+    def send_keys(self, value):
+        self._driver._record('send_keys')
+
+    def click(self):
+        self._driver._record('click')
+
+    def get_attribute(self, name):
+        self._driver._record('get_attribute')
+        return self.text
+
+
+class _FakeSwitchTo:
+    def __init__(self, driver):
+        self._driver = driver
+
+    def window(self, handle):
+        self._driver._record('switch_to.window')
+
+
+class FakeDriver:
+    """
+    ブラウザを起動せずにフレームワーク自体の処理時間を計測するための、プロセス内で動作するWebDriverの代替です。
+    呼び出しを記録し、スクリーンショットには事前に生成した画像を返します。ページは常に準備完了の状態です。
+    """
+
+    name = 'chrome'
+
+    def __init__(self, page_height=4000, viewport=(1280, 800)):
+        """
+        Args:
+            page_height (int): ページ全体の高さ (CSSピクセル)。
+            viewport (tuple): 表示領域の (幅, 高さ)。
+        """
+        self.page_height = page_height
+        self.viewport = viewport
+        self.calls = [] # 呼び出したメソッド名 (呼び出し順)
+        self.current_url = 'about:blank'
+        self.window_handles = ['main']
+        self.switch_to = _FakeSwitchTo(self)
+        self._scroll_y = 0
+        self._viewport_png = _render_png(*viewport)
+        self._bands = {} # 高さ -> CDPで返すbase64エンコード済みの画像
+
+    def _record(self, name):
+        self.calls.append(name)
+
+    def get(self, url):
+        self._record('get')
+        self.current_url = url
+        self._scroll_y = 0
+
+    def find_element(self, by, value):
+        self._record('find_element')
+        return FakeElement(self, value)
+
+    def execute_script(self, script, *args):
+        self._record('execute_script')
+        if script == PAGE_STATE_JS:
+            return {'readyState': 'complete', 'pending': 0, 'quietMs': 1e9, 'imagesLoaded': True, 'fontsLoaded': True}
+        if script == BATCH_JS:
+            return [None if step['command'] == 'input' else f"fixture:{step['selector_value']}" for step in args[0]]
+        scroll = re.search(r'scrollTo\(0, (\d+)\)', script)
+        if scroll:
+            self._scroll_y = min(int(scroll.group(1)), max(self.page_height - self.viewport[1], 0))
+            return None
+        if 'scrollHeight' in script:
+            return self.page_height
+        if 'innerHeight' in script:
+            return self.viewport[1]
+        if 'pageYOffset' in script:
+            return self._scroll_y
+        return None
+
+    def execute_cdp_cmd(self, cmd, params):
+        self._record(cmd)
+        if cmd == 'Page.getLayoutMetrics':
+            return {'cssContentSize': {'width': self.viewport[0], 'height': self.page_height}}
+        if cmd == 'Page.captureScreenshot':
+            height = params['clip']['height']
+            if height not in self._bands:
+                self._bands[height] = base64.b64encode(_render_png(self.viewport[0], height)).decode('ascii')
+            return {'data': self._bands[height]}
+        return {}
+
+    def get_screenshot_as_png(self):
+        self._record('get_screenshot_as_png')
+        return self._viewport_png
+
+    def get_full_page_screenshot_as_png(self):
+        self._record('get_full_page_screenshot_as_png')
+        return self._viewport_png
+
+    def get_window_size(self):
+        return {'width': self.viewport[0], 'height': self.viewport[1]}
+
+    def set_window_size(self, width, height):
+        self._record('set_window_size')
+
+    def maximize_window(self):
+        self._record('maximize_window')
+
+    def delete_all_cookies(self):
+        self._record('delete_all_cookies')
+
+    def close(self):
+        self._record('close')
+
+    def quit(self):
+        self._record('quit')
+
+
+# 計測用の1x1 PNG画像
+_PIXEL_PNG = _render_png(1, 1)
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    """FixtureSite のページを生成して返します。"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == '/long':
+            height = int(query.get('height', 20000))
+            sections = ''.join(f'<section style="height:1000px"><h2 id="section{i}">Section {i}</h2></section>'
+                               for i in range(height // 1000))
+            self._send_html(f'<h1 id="title">Long page</h1>{sections}')
+        elif url.path == '/form':
+            fields = int(query.get('fields', 200))
+            inputs = ''.join(f'<p><label>Field {i} <input type="text" name="field{i}" id="field{i}"></label></p>'
+                             for i in range(fields))
+            self._send_html(f'<form id="form">{inputs}<button type="button" id="submit" '
+                            f'onclick="document.getElementById(\'result\').innerText=\'submitted\'">Submit</button>'
+                            f'</form><p id="result"></p>')
+        elif url.path == '/slow':
+            assets = int(query.get('assets', 5))
+            delay = int(query.get('delay', 500))
+            images = ''.join(f'<img src="/asset?delay={delay}&n={i}" width="100" height="100">' for i in range(assets))
+            self._send_html(f'<h1 id="title">Slow page</h1>{images}')
+        elif url.path == '/asset':
+            time.sleep(int(query.get('delay', 0)) / 1000)
+            self._send(200, 'image/png', _PIXEL_PNG)
+        else:
+            self._send(404, 'text/plain', b'not found')
+
+    def _send_html(self, body):
+        html = f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>fixture</title></head><body>{body}</body></html>'
+        self._send(200, 'text/html; charset=utf-8', html.encode('utf-8'))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # 計測結果の表示を妨げないようアクセスログは出力しない
+
+
+class FixtureSite:
+    """
+    計測用のページをローカルで配信するHTTPサーバーです。ネットワークに接続せずにブラウザでの処理時間を計測できます。
+      /long?height=20000          : 縦に長いページ
+      /form?fields=200            : 入力欄の多いフォーム
+      /slow?assets=5&delay=500    : 読み込みに時間のかかる画像を含むページ
+
+    使用例:
+        with FixtureSite() as site:
+            driver.get(site.url('/form?fields=50'))
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._server = ThreadingHTTPServer((host, port), _FixtureHandler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='FixtureSite', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def url(self, path):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+
+def _scenario_rows(count, base_url='http://fixture.invalid'):
+    """計測用のシナリオ行を count 行生成します (フォームへの入力を繰り返す構成)。"""
+    pattern = [
+        ['navigate', '', '', f'{base_url}/form?fields=20', 'wait_time=1', ''],
+        ['input', 'name', 'field1', 'value', '', ''],
+        ['input', 'id', 'field2', 'value', '', ''],
+        ['click', 'id', 'submit', '', '', ''],
+        ['log_content', 'id', 'result', 'text', 'remark=benchmark', ''],
+        ['log_remark', '', '', '', 'remark=benchmark', ''],
+    ]
+    return [pattern[i % len(pattern)] for i in range(count)]
+
+
+def _write_csv(filepath, header, rows):
+    with open(filepath, 'w', newline='', encoding='sjis') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def _capture_parts(width, total_height, band_height, step):
+    """高さ band_height の画像を step ピクセルずつずらして並べた撮影結果を作成します。"""
+    band = _render_png(width, band_height)
+    return CapturedPage(total_height, [(band, top, band_height) for top in range(0, total_height, step)])
+
+
+# --- ベンチマーク ---
+# 各関数は (作業ディレクトリ, 規模の倍率) を受け取り、(パラメーター, 計測対象の関数) を返す。
+# パラメーターの 'items' は1回の実行で処理する件数で、1秒あたりの処理件数の計算に使用する。
+
+def bench_compile_rows(workdir, scale):
+    rows = _scenario_rows(int(20000 * scale))
+    return {'items': len(rows)}, lambda: compile_rows(rows)
+
+
+def bench_parse_scenario(workdir, scale):
+    filepath = os.path.join(workdir, 'parse_scenario.csv')
+    rows = _scenario_rows(int(20000 * scale))
+    _write_csv(filepath, SCENARIO_HEADER, rows)
+    return {'items': len(rows)}, lambda: compile_scenario(filepath, cache_dir=None)
+
+
+def bench_parse_scenario_cached(workdir, scale):
+    filepath = os.path.join(workdir, 'parse_scenario_cached.csv')
+    cache_dir = os.path.join(workdir, 'cache')
+    rows = _scenario_rows(int(20000 * scale))
+    _write_csv(filepath, SCENARIO_HEADER, rows)
+    compile_scenario(filepath, cache_dir=cache_dir) # キャッシュを作成しておく
+    return {'items': len(rows)}, lambda: compile_scenario(filepath, cache_dir=cache_dir)
+
+
+def bench_logging(workdir, scale):
+    count = int(50000 * scale)
+    filepath = os.path.join(workdir, 'logging.csv')
+
+    def run():
+        logger = BufferedCsvLogger(filepath, echo=False)
+        for i in range(count):
+            logger.log("INFO", f"'field{i}' に値 'value' を入力中 (タイプ: name)")
+        logger.close()
+
+    return {'items': count}, run
+
+
+def bench_logging_jsonl(workdir, scale):
+    count = int(50000 * scale)
+    filepath = os.path.join(workdir, 'logging.jsonl')
+
+    def run():
+        logger = BufferedJsonlLogger(filepath, echo=False)
+        for i in range(count):
+            logger.log("INFO", f"'field{i}' に値 'value' を入力中 (タイプ: name)", row=i)
+        logger.close()
+
+    return {'items': count}, run
+
+
+def bench_execute_fake(workdir, scale):
+    commands, _, _ = compile_rows(_scenario_rows(int(3000 * scale)))
+    driver = FakeDriver()
+
+    def run():
+        automation = WebTestAutomation(screenshot_dir=os.path.join(workdir, 'execute_fake'),
+                                       log_filepath=os.path.join(workdir, 'execute_fake.csv'),
+                                       log_echo=False, driver=driver)
+        automation.execute_plan(commands)
+        automation.close()
+
+    return {'items': len(commands)}, run
+
+
+def bench_screenshot_fake(workdir, scale):
+    count = max(int(10 * scale), 1)
+    driver = FakeDriver(page_height=20000)
+
+    def run():
+        automation = WebTestAutomation(screenshot_dir=os.path.join(workdir, 'screenshot_fake'),
+                                       log_filepath=os.path.join(workdir, 'screenshot_fake.csv'),
+                                       log_echo=False, driver=driver)
+        for i in range(count):
+            automation.take_screenshot(f"page_{i}.png", full_page=True)
+        automation.close()
+
+    return {'items': count, 'page_height': driver.page_height}, run
+
+
+def bench_stitch_cdp(workdir, scale):
+    total_height = int(40000 * scale)
+    captured = _capture_parts(1280, total_height, 4096, 4096)
+    filepath = os.path.join(workdir, 'stitch_cdp.png')
+    return ({'items': 1, 'width': 1280, 'height': total_height, 'parts': len(captured.parts)},
+            lambda: save_captured_page(captured, filepath))
+
+
+def bench_stitch_scrolling(workdir, scale):
+    total_height = int(20000 * scale)
+    captured = _capture_parts(1280, total_height, 800, 790) # 10ピクセル重複させたスクロール撮影
+    filepath = os.path.join(workdir, 'stitch_scrolling.png')
+    return ({'items': 1, 'width': 1280, 'height': total_height, 'parts': len(captured.parts)},
+            lambda: save_captured_page(captured, filepath))
+
+
+def bench_template_expand(workdir, scale):
+    count = int(20000 * scale)
+    var_filepath = os.path.join(workdir, 'vars.csv')
+    template_filepath = os.path.join(workdir, 'commands_template.csv')
+    output_filepath = os.path.join(workdir, 'generated_commands.csv')
+    _write_csv(var_filepath, ['var1', 'var2'], [[f'入力例{i}', f'場所{i}'] for i in range(count)])
+    _write_csv(template_filepath, SCENARIO_HEADER, [
+        ['navigate', '-', '-', 'https://example.com/form', 'wait_time=5', '-'],
+        ['for'],
+        ['input', 'name', '$var1', '-', '-'],
+        ['click', 'class_name', '$var2', '-', 'wait_time=5', '-'],
+        ['log_content', 'class_name', 'profile', 'text', 'remark=$var1', ''],
+        ['screenshot', '-', '-', 'evidence_$var1.png', 'remark=$var2', 'full_page=True'],
+        ['forend'],
+    ])
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()): # 完了メッセージを表示しない
+            generate_commands_with_vars(var_filepath, template_filepath, output_filepath)
+
+    return {'items': count}, run
+
+
+BENCHMARKS = {
+    'compile_rows': bench_compile_rows,
+    'parse_scenario': bench_parse_scenario,
+    'parse_scenario_cached': bench_parse_scenario_cached,
+    'logging': bench_logging,
+    'logging_jsonl': bench_logging_jsonl,
+    'execute_fake': bench_execute_fake,
+    'screenshot_fake': bench_screenshot_fake,
+    'stitch_cdp': bench_stitch_cdp,
+    'stitch_scrolling': bench_stitch_scrolling,
+    'template_expand': bench_template_expand,
+}
+
+
+def bench_e2e(workdir, scale, site, browser='chrome'):
+    """
+    FixtureSite のページに対して実際のブラウザでシナリオを実行します。ブラウザとWebDriverが必要です。
+    シナリオは長いページのフルページ撮影、大きなフォームへの入力、読み込みの遅いページの待機で構成します。
+    """
+    fields = max(int(100 * scale), 1)
+    rows = [
+        ['navigate', '', '', site.url('/long?height=20000'), 'wait_time=5', ''],
+        ['screenshot', '', '', 'long.png', 'remark=long', 'full_page=True'],
+        ['navigate', '', '', site.url(f'/form?fields={fields}'), 'wait_time=5', ''],
+    ]
+    rows += [['input', 'name', f'field{i}', f'value{i}', '', ''] for i in range(fields)]
+    rows += [
+        ['click', 'id', 'submit', '', '', ''],
+        ['log_content', 'id', 'result', 'text', 'remark=submit', ''],
+        ['navigate', '', '', site.url('/slow?assets=5&delay=500'), 'wait_time=10', ''],
+        ['screenshot', '', '', 'slow.png', 'remark=slow', ''],
+    ]
+    filepath = os.path.join(workdir, 'e2e.csv')
+    _write_csv(filepath, SCENARIO_HEADER, rows)
+
+    def run():
+        automation = WebTestAutomation(browser=browser, screenshot_dir=os.path.join(workdir, 'e2e'),
+                                       log_filepath=os.path.join(workdir, 'e2e_log.csv'), log_echo=False)
+        try:
+            automation.execute_commands_from_csv(filepath)
+        finally:
+            automation.close()
+
+    return {'items': len(rows), 'browser': browser}, run
+
+
+def run_benchmark(name, factory, workdir, scale, repeat):
+    """
+    1つのベンチマークを repeat 回実行し、処理時間を集計します。最初に1回実行してから計測します (ウォームアップ)。
+
+    Returns:
+        dict: パラメーター・各回の処理時間・最小値・中央値・平均値・1秒あたりの処理件数。
+    """
+    params, run = factory(workdir, scale)
+    run()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {
+        'params': params,
+        'times': times,
+        'min': min(times),
+        'median': median,
+        'mean': statistics.mean(times),
+        'items_per_second': params.get('items', 1) / median if median > 0 else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=10,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    計測結果をベースラインの結果と比較して表示します。
+
+    Args:
+        results (dict): 今回の計測結果 (結果ファイルの 'results')。
+        baseline (dict): ベースラインの結果ファイルの内容。
+        threshold (float): 性能低下とみなす中央値の増加率。
+
+    Returns:
+        list: 性能が低下したベンチマーク名のリスト。
+    """
+    regressions = []
+    print(f"\n--- ベースラインとの比較 (commit: {baseline.get('commit')}) ---")
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            print(f"{name:24} ベースラインに結果がありません")
+            continue
+        if base.get('params') != result['params']:
+            print(f"{name:24} パラメーターが異なるため比較できません")
+            continue
+        ratio = result['median'] / base['median'] if base['median'] else float('inf')
+        mark = ''
+        if ratio > 1 + threshold:
+            mark = ' <- 性能低下'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            mark = ' (改善)'
+        print(f"{name:24} {base['median']:.4f}s -> {result['median']:.4f}s ({ratio:.2f}x){mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ネットワークに接続せずにフレームワークの処理時間を計測します。")
+    parser.add_argument('benchmarks', nargs='*', help=f"実行するベンチマーク (既定: すべて): {', '.join(BENCHMARKS)}")
+    parser.add_argument('-o', '--output', default=None, help="結果を保存するJSONファイル (既定: benchmark_<日時>.json)")
+    parser.add_argument('-r', '--repeat', type=int, default=5, help="各ベンチマークの計測回数")
+    parser.add_argument('--quick', action='store_true', help="規模を1/10にして短時間で実行する")
+    parser.add_argument('--baseline', help="比較するベースラインの結果JSONファイル")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="性能低下とみなす中央値の増加率 (既定: 0.10)")
+    parser.add_argument('--e2e', action='store_true', help="ローカルの計測用サイトに対して実際のブラウザでも計測する")
+    parser.add_argument('-b', '--browser', default='chrome', choices=['chrome', 'firefox'], help="--e2e で使用するブラウザ")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"不明なベンチマークです: {', '.join(unknown)}")
+    selected = {name: BENCHMARKS[name] for name in (args.benchmarks or BENCHMARKS)}
+    scale = 0.1 if args.quick else 1.0
+
+    results = {}
+    with contextlib.ExitStack() as stack:
+        workdir = stack.enter_context(tempfile.TemporaryDirectory(prefix='wta_bench_'))
+        if args.e2e:
+            site = stack.enter_context(FixtureSite())
+            selected['e2e'] = lambda workdir, scale: bench_e2e(workdir, scale, site, args.browser)
+        for name, factory in selected.items():
+            result = run_benchmark(name, factory, workdir, scale, args.repeat)
+            results[name] = result
+            rate = f", {result['items_per_second']:.0f} 件/秒" if result['items_per_second'] else ''
+            print(f"{name:24} 中央値 {result['median']:.4f}s (最小 {result['min']:.4f}s{rate})")
+
+    output = {
+        'format': RESULT_FORMAT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'scale': scale,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    output_filepath = args.output or f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_filepath, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"結果を保存しました: {output_filepath}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
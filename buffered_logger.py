@@ -0,0 +1,240 @@
+import atexit
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+# JSONLログを次のファイルに切り替えるサイズの既定値（バイト）
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3] # ミリ秒まで
+
+
+class _BufferedLogger:
+    """
+    ログをキューに積み、バックグラウンドスレッドでまとめてファイルに書き込むロガーの共通処理です。
+    サブクラスは _open() でファイルを開き、_write_batch() でまとめて書き込みます。
+    """
+
+    _STOP = object() # 書き込みスレッドの終了を指示する番兵
+
+    def __init__(self, filepath, echo=True, batch_size=200, flush_interval=0.5):
+        self.filepath = filepath
+        self.echo = echo
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.write_error = None # 書き込みスレッドで発生した最後のエラー
+        self._queue = queue.Queue()
+        self._closed = False
+        self._open()
+
+        self._thread = threading.Thread(target=self._write_loop, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        # 例外で終了した場合もキューに残ったログを書き出す
+        atexit.register(self.close)
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _write_batch(self, batch):
+        raise NotImplementedError
+
+    def _close_file(self):
+        self._file.close()
+
+    def _echo(self, timestamp, level, message):
+        if self.echo:
+            print(f"[{timestamp}] [{level}] {message}")
+
+    def flush(self):
+        """キューに積まれたログがすべてファイルに書き込まれるまで待機します。"""
+        if not self._closed:
+            self._queue.join()
+
+    def close(self):
+        """残りのログを書き込み、書き込みスレッドを終了してファイルを閉じます。複数回呼び出しても安全です。"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._close_file()
+        atexit.unregister(self.close)
+
+    def _write_loop(self):
+        """キューからログを取り出し、件数または時間のしきい値ごとにまとめて書き込みます。"""
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not self._STOP:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            if batch[-1] is self._STOP:
+                stopping = True
+                batch.pop()
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                self.write_error = e
+                print(f"ログファイルへの書き込み中にエラーが発生しました: {e}")
+            finally:
+                for _ in range(len(batch) + (1 if stopping else 0)):
+                    self._queue.task_done()
+
+
+class BufferedCsvLogger(_BufferedLogger):
+    """
+    ログをキューに積み、バックグラウンドスレッドでまとめてCSVファイルに書き込むロガーです。
+    ファイルは一度だけ開き、件数または経過時間のしきい値に達するごとに書き込みます。
+    """
+
+    def __init__(self, filepath, encoding='sjis', echo=True, batch_size=200, flush_interval=0.5):
+        """
+        ログファイルを初期化してヘッダーを書き込み、書き込みスレッドを開始します。
+
+        Args:
+            filepath (str): ログを保存するCSVファイルのパス。
+            encoding (str): ログファイルの文字コード。
+            echo (bool): ログをコンソールにも出力するかどうか。
+            batch_size (int): まとめて書き込むログの最大件数。
+            flush_interval (float): キューに残ったログを書き込むまでの最大待ち時間（秒）。
+        """
+        self.encoding = encoding
+        super().__init__(filepath, echo, batch_size, flush_interval)
+
+    def _open(self):
+        # 変換できない文字で書き込みスレッドが停止しないよう、置換して書き込む
+        self._file = open(self.filepath, 'w', encoding=self.encoding, errors='replace', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(['タイムスタンプ', 'レベル', 'メッセージ'])
+        self._file.flush()
+
+    def log(self, level, message, **fields):
+        """
+        ログをキューに追加します。ファイルへの書き込みは書き込みスレッドが行います。
+        close()後に呼び出された場合はファイルに直接追記します。
+
+        Args:
+            level (str): ログレベル (例: "INFO", "ERROR")。
+            message (str): ログメッセージ。
+            **fields: 構造化ログの項目 (行番号など)。CSV形式では記録しません。
+        """
+        timestamp = _timestamp()
+        if self._closed:
+            # close()後のログは従来どおり追記モードで直接書き込む
+            with open(self.filepath, 'a', encoding=self.encoding, errors='replace', newline='') as f:
+                csv.writer(f).writerow([timestamp, level, message])
+        else:
+            self._queue.put([timestamp, level, message])
+        self._echo(timestamp, level, message)
+
+    def event(self, event, **fields):
+        """構造化ログのイベント (コマンドの実行結果など) を記録します。CSV形式では何も記録しません。"""
+
+    def _write_batch(self, batch):
+        self._writer.writerows(batch)
+        self._file.flush()
+
+
+def jsonl_segment_path(filepath, index):
+    """
+    JSONLログの index 番目 (1から) のファイルのパスを返します。
+    1番目は filepath そのもの、2番目以降は 'name.2.jsonl' のように番号を付けたパスです。
+    """
+    if index == 1:
+        return filepath
+    stem, extension = os.path.splitext(filepath)
+    return f"{stem}.{index}{extension}"
+
+
+class BufferedJsonlLogger(_BufferedLogger):
+    """
+    1件のログを1行のJSON (UTF-8) として書き込むロガーです。書き込みは BufferedCsvLogger と同じく
+    バックグラウンドスレッドでまとめて行います。
+
+    ファイルが max_bytes を超えると、次のログから 'name.2.jsonl'、'name.3.jsonl' ... に切り替えます。
+    書き込み済みのファイルの名前は変更しないため、実行中にレポートを作成する場合も読み込んだ位置から続けて読めます。
+
+    レコードの形式:
+        ログ: {"ts": タイムスタンプ, "level": レベル, "message": メッセージ, "row": 行番号, ...}
+        イベント: {"ts": タイムスタンプ, "event": イベント名, ...} (コマンドの実行結果など)
+    """
+
+    def __init__(self, filepath, echo=True, batch_size=200, flush_interval=0.5, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            filepath (str): ログを保存するJSONLファイルのパス。
+            echo (bool): ログをコンソールにも出力するかどうか。
+            batch_size (int): まとめて書き込むログの最大件数。
+            flush_interval (float): キューに残ったログを書き込むまでの最大待ち時間（秒）。
+            max_bytes (int): 1つのファイルの最大サイズ（バイト）。Noneの場合は切り替えません。
+        """
+        self.max_bytes = max_bytes
+        self.segment = 1 # 書き込み中のファイルの番号
+        super().__init__(filepath, echo, batch_size, flush_interval)
+
+    @property
+    def current_path(self):
+        """書き込み中のファイルのパス。"""
+        return jsonl_segment_path(self.filepath, self.segment)
+
+    def _open(self):
+        self._file = open(self.current_path, 'wb')
+        self._size = 0
+
+    def log(self, level, message, **fields):
+        """
+        ログをキューに追加します。値がNoneの項目は記録しません。
+
+        Args:
+            level (str): ログレベル (例: "INFO", "ERROR")。
+            message (str): ログメッセージ。
+            **fields: 追加で記録する項目 (例: row=行番号, artifact=画像のパス)。
+        """
+        timestamp = _timestamp()
+        record = {'ts': timestamp, 'level': level, 'message': message}
+        record.update((key, value) for key, value in fields.items() if value is not None)
+        self._put(record)
+        self._echo(timestamp, level, message)
+
+    def event(self, event, **fields):
+        """
+        イベントを記録します。コンソールには出力しません。
+
+        Args:
+            event (str): イベント名 (例: "run_start", "command", "run_end")。
+            **fields: イベントの項目。
+        """
+        record = {'ts': _timestamp(), 'event': event}
+        record.update(fields)
+        self._put(record)
+
+    def _put(self, record):
+        line = (json.dumps(record, ensure_ascii=False, default=str) + '\n').encode('utf-8')
+        if self._closed:
+            with open(self.current_path, 'ab') as f:
+                f.write(line)
+        else:
+            self._queue.put(line)
+
+    def _write_batch(self, batch):
+        for line in batch:
+            if self.max_bytes and self._size and self._size + len(line) > self.max_bytes:
+                self._file.close()
+                self.segment += 1
+                self._open()
+            self._file.write(line)
+            self._size += len(line)
+        self._file.flush()
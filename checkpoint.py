@@ -0,0 +1,312 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+from bisect import bisect_right
+from pathlib import Path
+
+# チェックポイントファイルの形式を変更した場合は値を上げる (異なる形式のファイルは読み込まない)
+CHECKPOINT_VERSION = 1
+
+DEFAULT_CHECKPOINT_DIR = '.checkpoints'
+
+# この行数を実行するごとにチェックポイントを保存する
+DEFAULT_SAVE_INTERVAL = 50
+
+# 再実行の方法
+RESUME = 'resume' # 前回の続きから実行する
+RERUN_FAILED = 'failed' # 前回失敗した行 (イテレーション) だけを実行する
+
+
+def checkpoint_path(source_filepath, checkpoint_dir=DEFAULT_CHECKPOINT_DIR):
+    """
+    シナリオ (テンプレート) に対応するチェックポイントファイルのパスを返します。
+    同名のファイルが別ディレクトリにあっても衝突しないよう、絶対パスのハッシュをファイル名に含めます。
+
+    Args:
+        source_filepath (str): シナリオCSVまたはコマンドテンプレートCSVのパス。
+        checkpoint_dir (str): チェックポイントの保存先ディレクトリ。
+
+    Returns:
+        str: チェックポイントファイルのパス。
+    """
+    path_hash = hashlib.sha1(os.path.abspath(source_filepath).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(checkpoint_dir, f"{Path(source_filepath).stem}_{path_hash}.json")
+
+
+def shard_checkpoint_path(filepath, shard_number):
+    """分割実行の各シャードが書き込むチェックポイントファイルのパスを返します。"""
+    return f"{os.path.splitext(filepath)[0]}.shard{shard_number}.json"
+
+
+def _shard_checkpoint_files(filepath):
+    return sorted(glob.glob(f"{glob.escape(os.path.splitext(filepath)[0])}.shard*.json"))
+
+
+def file_fingerprint(*filepaths):
+    """
+    ファイルの内容のハッシュを返します。内容が変わったシナリオを前回の続きから実行しないよう、チェックポイントに記録します。
+
+    Args:
+        *filepaths (str): 対象のファイルのパス。Noneは無視します。
+
+    Returns:
+        str: SHA-256のハッシュ値。
+    """
+    digest = hashlib.sha256()
+    for filepath in filepaths:
+        if filepath is None:
+            continue
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class RunCheckpoint:
+    """
+    シナリオの実行状況 (行ごとの成否・各行を展開した変数定義CSVの行・最後に完了した行) を記録し、
+    一定の行数ごとにファイルへ保存します。
+
+    ファイルでは行ごとの成否を1行1文字 ('.': 成功, 'F': 失敗, ' ': 未実行) の文字列、
+    行と変数定義CSVの行 (イテレーション) の対応をイテレーションが変わる行の一覧として保存します。
+    """
+
+    def __init__(self, filepath, fingerprint='', save_interval=DEFAULT_SAVE_INTERVAL):
+        """
+        Args:
+            filepath (str): チェックポイントファイルのパス。
+            fingerprint (str): シナリオの内容のハッシュ (file_fingerprint の戻り値)。
+            save_interval (int): チェックポイントを保存する間隔 (実行した行数)。
+        """
+        self.filepath = filepath
+        self.fingerprint = fingerprint
+        self.save_interval = save_interval
+        self.status = {} # 行番号 -> 成功した場合はTrue
+        self.row_iterations = {} # 行番号 -> イテレーション番号 (変数定義CSVのデータ行の0始まりの番号)
+        self.iterations = {} # 完了したイテレーション番号 -> 成功した場合はTrue
+        self.last_row = None # 最後に完了した行番号
+        self.complete = False # シナリオを最後まで実行したかどうか
+        self._failed_iterations = set() # 失敗した行を含むイテレーション番号
+        self._unsaved = 0
+
+    def record(self, row_number, passed, iteration=None):
+        """
+        1行の実行結果を記録します。save_interval 行ごとにファイルへ保存します。
+
+        Args:
+            row_number (int): 行番号。
+            passed (bool): 成功した場合はTrue。
+            iteration (int): 行を展開したイテレーション番号。イテレーションの外側の行はNone。
+        """
+        self.status[row_number] = passed
+        if iteration is not None:
+            self.row_iterations[row_number] = iteration
+            if not passed:
+                self._failed_iterations.add(iteration)
+        if self.last_row is None or row_number > self.last_row:
+            self.last_row = row_number
+        self._unsaved += 1
+        if self._unsaved >= self.save_interval:
+            self.save()
+
+    def mark_failed(self, row_numbers):
+        """実行後に失敗が判明した行 (スクリーンショットの保存失敗など) を失敗として記録します。"""
+        for row_number in row_numbers:
+            if row_number not in self.status:
+                continue
+            self.status[row_number] = False
+            iteration = self.row_iterations.get(row_number)
+            if iteration is not None:
+                self._failed_iterations.add(iteration)
+                if iteration in self.iterations:
+                    self.iterations[iteration] = False
+
+    def start_iteration(self, iteration):
+        """イテレーションを最初から実行し直す前に、前回の失敗の記録を消去します。"""
+        self._failed_iterations.discard(iteration)
+        self.iterations.pop(iteration, None)
+
+    def end_iteration(self, iteration):
+        """イテレーションの完了を記録し、ファイルへ保存します。"""
+        self.iterations[iteration] = iteration not in self._failed_iterations
+        self.save()
+
+    def mark_complete(self):
+        """シナリオを最後まで実行したことを記録します。ファイルへは次の save() で保存します。"""
+        self.complete = True
+
+    def failed_rows(self):
+        """失敗した行番号のリストを返します。"""
+        return sorted(row_number for row_number, passed in self.status.items() if not passed)
+
+    def failed_iterations(self):
+        """失敗した行を含むイテレーション番号 (途中で中断したものを含む) のリストを返します。"""
+        return sorted(self._failed_iterations)
+
+    def needs_rerun(self, mode):
+        """
+        指定した方法で再実行する行があるかどうかを返します。
+
+        Args:
+            mode (str): RESUME または RERUN_FAILED。
+        """
+        if mode == RESUME:
+            return not self.complete
+        return any(not passed for passed in self.status.values())
+
+    def merge(self, other):
+        """別のチェックポイント (分割実行の他のシャードなど) の記録を統合します。"""
+        self.status.update(other.status)
+        self.row_iterations.update(other.row_iterations)
+        self.iterations.update(other.iterations)
+        # other で完了したイテレーションは other の結果を優先する
+        self._failed_iterations.difference_update(other.iterations)
+        self._failed_iterations |= other._failed_iterations
+        if other.last_row is not None and (self.last_row is None or other.last_row > self.last_row):
+            self.last_row = other.last_row
+        self.complete = self.complete or other.complete
+
+    def to_dict(self):
+        rows = sorted(self.status)
+        status = ''
+        if rows:
+            marks = {True: '.', False: 'F'}
+            status = ''.join(marks.get(self.status.get(row_number), ' ') for row_number in range(rows[0], rows[-1] + 1))
+        runs = [] # [イテレーションが変わる行番号, イテレーション番号 (外側の行はNone)]
+        for row_number in rows:
+            iteration = self.row_iterations.get(row_number)
+            if not runs or iteration != runs[-1][1]:
+                runs.append([row_number, iteration])
+        return {
+            'version': CHECKPOINT_VERSION,
+            'fingerprint': self.fingerprint,
+            'complete': self.complete,
+            'last_row': self.last_row,
+            'first_row': rows[0] if rows else None,
+            'status': status,
+            'row_iterations': runs,
+            'iterations_passed': sorted(i for i, passed in self.iterations.items() if passed),
+            'iterations_failed': sorted(i for i, passed in self.iterations.items() if not passed),
+        }
+
+    def _load_dict(self, data):
+        first_row = data.get('first_row')
+        for offset, mark in enumerate(data.get('status', '')):
+            if mark != ' ':
+                self.status[first_row + offset] = mark == '.'
+        runs = data.get('row_iterations', [])
+        starts = [start for start, _ in runs]
+        for row_number, passed in self.status.items():
+            i = bisect_right(starts, row_number) - 1
+            iteration = runs[i][1] if i >= 0 else None
+            if iteration is not None:
+                self.row_iterations[row_number] = iteration
+                if not passed:
+                    self._failed_iterations.add(iteration)
+        self.iterations.update((iteration, True) for iteration in data.get('iterations_passed', []))
+        self.iterations.update((iteration, False) for iteration in data.get('iterations_failed', []))
+        self._failed_iterations.update(data.get('iterations_failed', []))
+        self.last_row = data.get('last_row')
+        self.complete = bool(data.get('complete'))
+
+    def save(self):
+        """チェックポイントをファイルへ保存します。書き込み途中のファイルを読まれないよう置き換えます。"""
+        directory = os.path.dirname(os.path.abspath(self.filepath))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, separators=(',', ':'))
+            os.replace(tmp_path, self.filepath)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._unsaved = 0
+
+
+def _read_checkpoint_file(filepath, fingerprint):
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"警告: チェックポイント '{filepath}' を読み込めません: {e}")
+        return None
+    if data.get('version') != CHECKPOINT_VERSION:
+        print(f"警告: チェックポイント '{filepath}' は異なる形式のため使用しません。")
+        return None
+    if data.get('fingerprint') != fingerprint:
+        print(f"警告: 前回の実行からシナリオが変更されているため、チェックポイント '{filepath}' は使用しません。")
+        return None
+    return data
+
+
+def load_checkpoint(filepath, fingerprint='', save_interval=DEFAULT_SAVE_INTERVAL):
+    """
+    チェックポイントを読み込みます。分割実行で各シャードが書き込んだファイルがある場合は統合します。
+
+    Args:
+        filepath (str): チェックポイントファイルのパス。
+        fingerprint (str): 現在のシナリオの内容のハッシュ。記録されている値と異なる場合は読み込みません。
+        save_interval (int): 読み込んだチェックポイントを保存する間隔 (実行した行数)。
+
+    Returns:
+        RunCheckpoint: 読み込んだチェックポイント。ファイルがない場合や使用できない場合はNone。
+    """
+    checkpoint = None
+    for path in [filepath] + _shard_checkpoint_files(filepath):
+        data = _read_checkpoint_file(path, fingerprint)
+        if data is None:
+            continue
+        loaded = RunCheckpoint(filepath, fingerprint, save_interval)
+        loaded._load_dict(data)
+        if checkpoint is None:
+            checkpoint = loaded
+        else:
+            checkpoint.merge(loaded)
+    return checkpoint
+
+
+def remove_shard_checkpoints(filepath):
+    """分割実行の各シャードが書き込んだチェックポイントファイルを削除します (統合後に使用します)。"""
+    for path in _shard_checkpoint_files(filepath):
+        os.remove(path)
+
+
+def select_commands(commands, checkpoint, mode):
+    """
+    チェックポイントを基に再実行するコマンドを選択します。
+    RESUME の場合は最後に完了した行より後の行、RERUN_FAILED の場合は失敗した行を選択し、
+    それより前にある準備処理の行 (オプション setup=True の行) も実行順に含めます。
+    setup=True の行がシナリオにない場合は、最初に選択した行の直前の navigate を準備処理として含めます。
+
+    Args:
+        commands (list): scenario_compiler.Command のリスト。
+        checkpoint (RunCheckpoint): 前回の実行のチェックポイント。
+        mode (str): RESUME または RERUN_FAILED。
+
+    Returns:
+        list: 実行する Command のリスト。準備処理以外に実行する行がない場合は空のリスト。
+    """
+    if mode == RESUME:
+        last_row = checkpoint.last_row if checkpoint.last_row is not None else 0
+        targets = {command.row_number for command in commands if command.row_number > last_row}
+    else:
+        failed = set(checkpoint.failed_rows())
+        targets = {command.row_number for command in commands if command.row_number in failed}
+    if not targets:
+        return []
+
+    last_target = max(targets)
+    setup = {command.row_number for command in commands
+             if command.options.get('setup') is True and command.row_number < last_target}
+    if not any(command.options.get('setup') is True for command in commands):
+        first_target = min(targets)
+        navigates = [command.row_number for command in commands
+                     if command.name == 'navigate' and command.row_number < first_target]
+        setup = set(navigates[-1:])
+    return [command for command in commands if command.row_number in targets or command.row_number in setup]
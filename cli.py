@@ -0,0 +1,42 @@
+import importlib
+import os
+import sys
+
+# サブコマンド -> (モジュール, 関数, 説明)。モジュールはサブコマンドを実行するときに読み込むため、
+# validate / generate / report ではseleniumとPillowを読み込まない
+COMMANDS = {
+    'run': ('parallel_runner', 'main', "シナリオCSVまたはテンプレートを実行する"),
+    'generate': ('gen_scenario', 'main', "テンプレートと変数定義CSVからシナリオCSVを生成する"),
+    'validate': ('parallel_runner', 'validate_main', "ブラウザを起動せずにシナリオCSVとテンプレートを検証する"),
+    'report': ('log_report', 'main', "JSONLログからHTMLレポートを作成する"),
+    'compare': ('visual_compare', 'main', "2つのディレクトリのスクリーンショットを一括で比較する"),
+    'daemon': ('run_daemon', 'main', "ブラウザを起動したまま常駐し、送られたシナリオを実行する"),
+    'submit': ('run_daemon', 'submit_main', "常駐プロセスにシナリオを送って実行する"),
+}
+
+
+def usage():
+    lines = ["使用方法: python cli.py <サブコマンド> [引数...]", "", "サブコマンド:"]
+    lines.extend(f"  {name:<10}{description}" for name, (_, _, description) in COMMANDS.items())
+    lines.extend(["", "各サブコマンドの引数は 'python cli.py <サブコマンド> --help' で表示します。"])
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0 if argv else 2
+    command = argv[0]
+    if command not in COMMANDS:
+        print(f"エラー: 不明なサブコマンドです: '{command}'\n\n{usage()}")
+        return 2
+    module_name, function_name, _ = COMMANDS[command]
+    # サブコマンドのヘルプの使用方法に 'cli.py <サブコマンド>' と表示する
+    sys.argv[0] = f"{os.path.basename(sys.argv[0])} {command}"
+    function = getattr(importlib.import_module(module_name), function_name)
+    return function(argv[1:])
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,203 @@
+import json
+from dataclasses import dataclass, fields, replace
+from urllib.parse import quote
+
+# ブロックできるリソースの種類と、その種類として扱うURLの拡張子
+RESOURCE_TYPE_EXTENSIONS = {
+    'image': ('png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'svg', 'ico', 'bmp'),
+    'font': ('woff', 'woff2', 'ttf', 'otf', 'eot'),
+    'media': ('mp4', 'webm', 'ogg', 'ogv', 'mp3', 'wav', 'm4a', 'm3u8', 'mov'),
+    'stylesheet': ('css',),
+}
+
+# block_trackers で通信をブロックする主な解析・広告サービスのURLパターン
+TRACKER_URL_PATTERNS = (
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*googlesyndication.com*',
+    '*googleadservices.com*', '*connect.facebook.net*', '*hotjar.com*', '*clarity.ms*', '*scorecardresearch.com*',
+    '*nr-data.net*', '*cdn.segment.com*', '*api.segment.io*', '*mixpanel.com*', '*criteo.com*', '*adnxs.com*',
+)
+
+# Firefoxでブロックする通信の接続先 (接続できないポートに送り、すぐに失敗させる)
+_BLACKHOLE_PROXY = 'PROXY 127.0.0.1:9'
+
+
+@dataclass(frozen=True)
+class DriverProfile:
+    """
+    ブラウザの起動設定。ヘッドレスモード・ウィンドウサイズ・通信をブロックするリソースを指定します。
+
+    画像・フォント・動画や解析サービスの読み込みを止めると、テキストだけを確認するシナリオのページ読み込み時間と
+    ブラウザ1つあたりのメモリ使用量が減ります。スクリーンショットの見た目は変わるため、証跡の撮影には使用しないでください。
+    stylesheet をブロックすると非表示の要素が表示されるなど要素の表示判定が変わるため、通常は指定しないでください。
+    """
+    name: str
+    headless: bool = False
+    window_size: tuple = None # (幅, 高さ)。Noneの場合はウィンドウを最大化する
+    block_resource_types: tuple = () # RESOURCE_TYPE_EXTENSIONS のキー
+    block_trackers: bool = False # TRACKER_URL_PATTERNS の通信をブロックする
+    block_urls: tuple = () # ブロックするURLのパターン ('*' はワイルドカード)
+    arguments: tuple = () # ブラウザに渡す追加のコマンドライン引数
+
+    def blocked_url_patterns(self):
+        """ブロックするURLパターンの一覧を返します。クエリ文字列付きのURLにも一致するパターンを含みます。"""
+        patterns = []
+        for resource_type in self.block_resource_types:
+            for extension in RESOURCE_TYPE_EXTENSIONS[resource_type]:
+                patterns.extend((f'*.{extension}', f'*.{extension}?*'))
+        if self.block_trackers:
+            patterns.extend(TRACKER_URL_PATTERNS)
+        patterns.extend(self.block_urls)
+        return list(dict.fromkeys(patterns))
+
+
+BUILTIN_PROFILES = {
+    # 従来どおりウィンドウを表示して最大化する
+    'default': DriverProfile('default'),
+    'headless': DriverProfile('headless', headless=True, window_size=(1920, 1080)),
+    # テキストの確認向け。画像・フォント・動画と解析サービスを読み込まない
+    'fast': DriverProfile('fast', headless=True, window_size=(1366, 768), block_resource_types=('image', 'font', 'media'),
+                          block_trackers=True),
+}
+
+DEFAULT_PROFILE = 'default'
+
+
+def _profile_from_dict(name, values, profiles):
+    values = dict(values)
+    base_name = values.pop('base', DEFAULT_PROFILE)
+    if base_name not in profiles:
+        raise ValueError(f"プロファイル '{name}' の base に指定されたプロファイルがありません: '{base_name}'")
+    known = {f.name for f in fields(DriverProfile)} - {'name'}
+    unknown = set(values) - known
+    if unknown:
+        raise ValueError(f"プロファイル '{name}' に不明な項目があります: {', '.join(sorted(unknown))}")
+    for key in ('window_size', 'block_resource_types', 'block_urls', 'arguments'):
+        if values.get(key) is not None:
+            values[key] = tuple(values[key])
+    if values.get('window_size') is not None and len(values['window_size']) != 2:
+        raise ValueError(f"プロファイル '{name}' の window_size には [幅, 高さ] を指定してください。")
+    invalid = set(values.get('block_resource_types', ())) - set(RESOURCE_TYPE_EXTENSIONS)
+    if invalid:
+        raise ValueError(f"プロファイル '{name}' の block_resource_types が不正です: {', '.join(sorted(invalid))} "
+                         f"(使用可能: {', '.join(RESOURCE_TYPE_EXTENSIONS)})")
+    return replace(profiles[base_name], name=name, **values)
+
+
+def load_profiles(filepath=None):
+    """
+    組み込みのプロファイルに、JSONファイルで定義したプロファイルを追加した辞書を返します。
+
+    JSONファイルの形式:
+        {"mobile": {"base": "fast", "window_size": [390, 844], "block_urls": ["*ads.example.com*"]}}
+    base には元にするプロファイル (組み込みのプロファイルまたはファイル内で先に定義したプロファイル) を指定し、
+    指定した項目だけを上書きします。省略した場合は 'default' を元にします。
+
+    Args:
+        filepath (str): プロファイルを定義したJSONファイルのパス。Noneの場合は組み込みのプロファイルのみ。
+
+    Returns:
+        dict: プロファイル名から DriverProfile へのマップ。
+
+    Raises:
+        ValueError: ファイルの形式が正しくない場合。
+    """
+    profiles = dict(BUILTIN_PROFILES)
+    if filepath is None:
+        return profiles
+    with open(filepath, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError("プロファイルのファイルには、プロファイル名をキーとするオブジェクトを記述してください。")
+    for name, values in data.items():
+        profiles[name] = _profile_from_dict(name, values, profiles)
+    return profiles
+
+
+def resolve_profile(profile, profiles=None):
+    """
+    プロファイル名を DriverProfile に変換します。
+
+    Args:
+        profile (str または DriverProfile): プロファイル名またはプロファイル。Noneの場合は 'default'。
+        profiles (dict): プロファイル名から DriverProfile へのマップ (load_profiles の戻り値)。Noneの場合は組み込みのプロファイル。
+
+    Returns:
+        DriverProfile: プロファイル。
+
+    Raises:
+        ValueError: 定義されていないプロファイル名が指定された場合。
+    """
+    if isinstance(profile, DriverProfile):
+        return profile
+    profiles = BUILTIN_PROFILES if profiles is None else profiles
+    name = profile or DEFAULT_PROFILE
+    if name not in profiles:
+        raise ValueError(f"定義されていないドライバープロファイルです: '{name}' (使用可能: {', '.join(profiles)})")
+    return profiles[name]
+
+
+def chrome_options(profile):
+    """プロファイルに対応するChromeの起動オプションを作成します。"""
+    from selenium.webdriver.chrome.options import Options as ChromeOptions
+    options = ChromeOptions()
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    if profile.headless:
+        options.add_argument('--headless=new')
+    if profile.window_size:
+        options.add_argument(f'--window-size={profile.window_size[0]},{profile.window_size[1]}')
+    if 'image' in profile.block_resource_types:
+        # 拡張子のない画像URLも読み込まないよう、画像の表示自体を無効にする
+        options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+    for argument in profile.arguments:
+        options.add_argument(argument)
+    return options
+
+
+def firefox_options(profile):
+    """
+    プロファイルに対応するFirefoxの起動オプションを作成します。
+    FirefoxはDevToolsプロトコルでURLをブロックできないため、画像・フォント・動画は設定で無効にし、
+    それ以外のURLパターンはプロキシ自動設定 (PAC) で接続できないプロキシに送ってブロックします。
+    """
+    from selenium.webdriver.firefox.options import Options as FirefoxOptions
+    options = FirefoxOptions()
+    if profile.headless:
+        options.add_argument('-headless')
+    if 'image' in profile.block_resource_types:
+        options.set_preference('permissions.default.image', 2)
+    if 'font' in profile.block_resource_types:
+        options.set_preference('gfx.downloadable_fonts.enabled', False)
+    if 'media' in profile.block_resource_types:
+        options.set_preference('media.autoplay.default', 5)
+    patterns = profile.blocked_url_patterns()
+    if patterns:
+        pac = ("function FindProxyForURL(url, host) {"
+               f" var patterns = {json.dumps(patterns)};"
+               " for (var i = 0; i < patterns.length; i++) {"
+               f" if (shExpMatch(url, patterns[i])) return '{_BLACKHOLE_PROXY}'; }}"
+               " return 'DIRECT'; }")
+        options.set_preference('network.proxy.type', 2)
+        options.set_preference('network.proxy.autoconfig_url', 'data:text/javascript,' + quote(pac))
+        options.set_preference('network.proxy.autoconfig_url.include_path', True) # httpsのURLもパスで判定する
+    for argument in profile.arguments:
+        options.add_argument(argument)
+    return options
+
+
+def apply_profile(driver, profile):
+    """
+    起動したブラウザにプロファイルの設定を適用します。
+    ChromeではDevToolsプロトコルの Network.setBlockedURLs でURLパターンに一致するリクエストをブロックします。
+
+    Args:
+        driver (WebDriver): 起動したブラウザのWebDriver。
+        profile (DriverProfile): 適用するプロファイル。
+    """
+    if profile.window_size:
+        driver.set_window_size(*profile.window_size)
+    elif not profile.headless:
+        driver.maximize_window() # ウィンドウ状態の変更完了後に戻るため待機は不要
+    patterns = profile.blocked_url_patterns()
+    if patterns and hasattr(driver, 'execute_cdp_cmd'):
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
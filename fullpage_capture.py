@@ -0,0 +1,225 @@
+import base64
+import io
+import math
+import os
+import struct
+import zlib
+from dataclasses import dataclass, field
+
+# Chromeの1回の撮影で扱う最大の高さ (CSSピクセル)。これを超えるページは帯状に分割して撮影する
+DEFAULT_BAND_HEIGHT = 4096
+
+
+@dataclass
+class CapturedPage:
+    """
+    撮影したページ画像。PNGのバイト列を帯 (band) 単位で保持し、デコードは保存時まで行いません。
+    parts の各要素は (PNGのバイト列, 帯の上端のCSSピクセル位置, 帯の高さのCSSピクセル) です。
+    """
+    total_height: int # ページ全体の高さ (CSSピクセル)
+    parts: list = field(default_factory=list)
+
+
+class PngBandWriter:
+    """
+    RGB画像を上から帯単位で受け取り、PNGファイルへ逐次書き込みます。
+    画像全体をメモリに展開せずに巨大な画像を保存するために使用します。
+    """
+
+    def __init__(self, file, width, height, compress_level=6):
+        """
+        Args:
+            file (str またはファイルオブジェクト): 保存先のパス、またはバイナリモードで開いたファイルオブジェクト (io.BytesIO など)。
+                ファイルオブジェクトの場合は close() で閉じません。
+            width (int): 画像の幅 (ピクセル)。
+            height (int): 画像の高さ (ピクセル)。
+            compress_level (int): zlibの圧縮レベル (0-9)。
+        """
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._owns_file = isinstance(file, (str, os.PathLike))
+        self._file = open(file, 'wb') if self._owns_file else file
+        self._compressor = zlib.compressobj(compress_level)
+        self._file.write(b'\x89PNG\r\n\x1a\n')
+        # 8bit RGB、圧縮方式0、フィルタ方式0、インターレースなし
+        self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def _write_chunk(self, chunk_type, data):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+    def write_rows(self, image):
+        """
+        画像の行を現在の位置の下に追加します。幅が異なる場合は左上を基準に切り取り・黒で補完します。
+        画像全体の高さを超える行は無視します。
+
+        Args:
+            image (PIL.Image.Image): 追加する帯の画像。
+        """
+        rows = min(image.height, self.height - self.rows_written)
+        if rows <= 0:
+            return
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        if image.width != self.width or image.height != rows:
+            from PIL import Image
+            band = Image.new('RGB', (self.width, rows))
+            band.paste(image.crop((0, 0, min(image.width, self.width), rows)), (0, 0))
+            image = band
+        raw = image.tobytes()
+        stride = self.width * 3
+        # 各行の先頭にフィルタ種別 (0: None) を付ける
+        filtered = b''.join(b'\x00' + raw[y * stride:(y + 1) * stride] for y in range(rows))
+        compressed = self._compressor.compress(filtered)
+        if compressed:
+            self._write_chunk(b'IDAT', compressed)
+        self.rows_written += rows
+
+    def close(self):
+        """不足している行を黒で補完し、PNGファイルを完成させて閉じます。"""
+        from PIL import Image
+        while self.rows_written < self.height:
+            self.write_rows(Image.new('RGB', (self.width, min(DEFAULT_BAND_HEIGHT, self.height - self.rows_written))))
+        self._write_chunk(b'IDAT', self._compressor.flush())
+        self._write_chunk(b'IEND', b'')
+        if self._owns_file:
+            self._file.close()
+
+
+def capture_full_page_cdp(driver, band_height=DEFAULT_BAND_HEIGHT):
+    """
+    Chrome DevTools Protocol の Page.captureScreenshot (captureBeyondViewport) でページ全体を撮影します。
+    スクロールせずに撮影し、高さが band_height を超えるページは帯状にクリップして撮影します。
+
+    Args:
+        driver (WebDriver): ChromeのWebDriver。
+        band_height (int): 1回の撮影の最大の高さ (CSSピクセル)。
+
+    Returns:
+        CapturedPage: 撮影した画像。
+    """
+    metrics = driver.execute_cdp_cmd('Page.getLayoutMetrics', {})
+    content_size = metrics.get('cssContentSize') or metrics['contentSize']
+    total_width = math.ceil(content_size['width'])
+    total_height = math.ceil(content_size['height'])
+
+    captured = CapturedPage(total_height)
+    for top in range(0, total_height, band_height):
+        height = min(band_height, total_height - top)
+        result = driver.execute_cdp_cmd('Page.captureScreenshot', {
+            'format': 'png',
+            'captureBeyondViewport': True,
+            'clip': {'x': 0, 'y': top, 'width': total_width, 'height': height, 'scale': 1},
+        })
+        captured.parts.append((base64.b64decode(result['data']), top, height))
+    return captured
+
+
+def capture_full_page_scrolling(driver, settle=None, overlap=10):
+    """
+    表示領域ずつスクロールしながら撮影します。CDPが使用できない場合の代替手段です。
+    撮影した画像は get_screenshot_as_png のバイト列のまま保持し、一時ファイルは作成しません。
+    呼び出し側でスクロール位置を元に戻してください。
+
+    Args:
+        driver (WebDriver): WebDriver。
+        settle (callable): スクロール後に描画の完了を待つ関数。Noneの場合は待機しません。
+        overlap (int): 前の撮影と重複させる高さ (CSSピクセル)。
+
+    Returns:
+        CapturedPage: 撮影した画像。
+    """
+    total_height = max(driver.execute_script("return document.body.scrollHeight"),
+                       driver.execute_script("return document.documentElement.scrollHeight"))
+    viewport_height = driver.execute_script("return window.innerHeight")
+
+    captured = CapturedPage(total_height)
+    current_scroll_y = 0
+    driver.execute_script("window.scrollTo(0, 0);")
+    if settle is not None:
+        settle()
+    while True:
+        # 末尾ではブラウザがスクロール位置を補正するため、実際の位置を使用する
+        actual_scroll_y = driver.execute_script("return window.pageYOffset;")
+        captured.parts.append((driver.get_screenshot_as_png(), actual_scroll_y, viewport_height))
+        current_scroll_y += viewport_height - overlap
+        if current_scroll_y >= total_height or actual_scroll_y + viewport_height >= total_height:
+            break
+        driver.execute_script(f"window.scrollTo(0, {current_scroll_y});")
+        if settle is not None:
+            settle()
+    return captured
+
+
+def _write_stitched(captured, file, compress_level):
+    """分割撮影した画像を帯ごとにデコードし、1枚のPNGとして file (パスまたはファイルオブジェクト) に逐次書き込みます。"""
+    from PIL import Image # 分割撮影した画像のデコード用 (1枚だけの場合は読み込まない)
+    writer = None
+    try:
+        for png_bytes, top, height in captured.parts:
+            with Image.open(io.BytesIO(png_bytes)) as image:
+                # デバイスピクセル比を考慮し、CSSピクセルを画像のピクセルに換算する
+                scale = image.height / height if height else 1
+                if writer is None:
+                    writer = PngBandWriter(file, image.width, round(captured.total_height * scale), compress_level)
+                pixel_top = round(top * scale)
+                if pixel_top > writer.rows_written: # 撮影できなかった隙間は黒で補完する
+                    writer.write_rows(Image.new('RGB', (writer.width, pixel_top - writer.rows_written)))
+                skip = max(writer.rows_written - pixel_top, 0) # 既に書き込んだ重複部分
+                if skip < image.height:
+                    writer.write_rows(image.crop((0, skip, image.width, image.height)))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def save_captured_page(captured, filepath, compress_level=6):
+    """
+    撮影した画像をPNGファイルに保存します。
+    1枚だけの場合はデコードせずにそのまま書き込み、複数の場合は帯ごとにデコードして逐次書き込みます。
+
+    Args:
+        captured (CapturedPage): 撮影した画像。
+        filepath (str): 保存先のパス。
+        compress_level (int): 結合時のzlibの圧縮レベル (0-9)。
+
+    Returns:
+        int: 書き込んだバイト数。
+
+    Raises:
+        ValueError: 撮影した画像がない場合 (ページの高さが0の場合など)。
+    """
+    if not captured.parts:
+        raise ValueError(f"保存する画像がありません (ページの高さ: {captured.total_height}): {filepath}")
+    if len(captured.parts) == 1:
+        with open(filepath, 'wb') as f:
+            f.write(captured.parts[0][0])
+        return len(captured.parts[0][0])
+    _write_stitched(captured, filepath, compress_level)
+    return os.path.getsize(filepath)
+
+
+def captured_page_to_png(captured, compress_level=6):
+    """
+    撮影した画像を1枚のPNGのバイト列に変換します。ファイルは作成せず、結合した画像はメモリ上に書き込みます。
+
+    Args:
+        captured (CapturedPage): 撮影した画像。
+        compress_level (int): 結合時のzlibの圧縮レベル (0-9)。
+
+    Returns:
+        bytes: PNGのバイト列。1枚だけの場合は撮影したバイト列そのもの。
+
+    Raises:
+        ValueError: 撮影した画像がない場合 (ページの高さが0の場合など)。
+    """
+    if not captured.parts:
+        raise ValueError(f"撮影した画像がありません (ページの高さ: {captured.total_height})")
+    if len(captured.parts) == 1:
+        return captured.parts[0][0]
+    buffer = io.BytesIO()
+    _write_stitched(captured, buffer, compress_level)
+    return buffer.getvalue()
@@ -1,139 +1,478 @@
+import argparse
 import csv
 import re
 import os
+from dataclasses import dataclass, field
 
-def generate_commands_with_vars(var_filepath, template_filepath, output_filepath):
+class TemplateError(Exception):
+    """テンプレートの構成やデータソースの指定に誤りがある場合に発生します。"""
+
+# 変数プレースホルダーとエスケープ: ${name} / $name / $$ (文字の '$') / $- (文字の '-')
+PLACEHOLDER_PATTERN = re.compile(r'\$(?:\{(\w+)\}|(\w+)|([$-]))')
+
+@dataclass
+class TemplateLoop:
+    """テンプレートの 'for'/'forend' ブロック。"""
+    source: str # データソース名 (空文字列の場合は既定の変数定義CSV)
+    body: list = field(default_factory=list) # TemplateRow または入れ子の TemplateLoop
+    line: int = 0 # 'for' 行のテンプレートCSV上の行番号
+
+@dataclass
+class TemplateRow:
+    """テンプレートのコマンド行。"""
+    cells: list # テンプレートに記述された値
+    line: int = 0 # テンプレートCSV上の行番号
+    segments: list = None # compile_template で作成する、セルごとの文字列または部品のタプル
+
+@dataclass(frozen=True)
+class TemplateVar:
+    """コンパイル済みのセルに含まれる変数の参照。"""
+    name: str
+
+def compile_cell(cell, known_names, undefined=None):
     """
-    変数定義CSVとテンプレートCSVを基に、変数を代入した新しいCSVファイルを生成します。
+    セルを文字列部分と変数の参照に分割します。展開時は分割結果を連結するだけで、正規表現による検索は行いません。
+
+    規則:
+      * セル全体が '-' の場合は空文字列
+      * '$name' または '${name}' は変数の値 (変数名の直後に英数字や '_' が続く場合は '${name}' を使用)
+      * '$$' は文字の '$'、'$-' は文字の '-' (値が '-' だけのセルを出力する場合に使用)
+      * それ以外の '-' と '$' はそのまま出力
 
     Args:
-        var_filepath (str): 変数定義CSVファイルのパス。
-        template_filepath (str): コマンドテンプレートCSVファイルのパス。
-        output_filepath (str): 出力する新しいCSVファイルのパス。
+        cell (str): テンプレートのセルの値。
+        known_names (frozenset): 参照できる変数名。
+        undefined (list): 未定義の変数名を追加するリスト。未定義の変数はそのままの文字列として出力します。
+
+    Returns:
+        str または tuple: 変数を含まない場合は出力する文字列、含む場合は文字列と TemplateVar のタプル。
     """
-    # 1. 変数定義CSVの読み込み
-    var_data = []
-    try:
-        with open(var_filepath, 'r', newline='', encoding='sjis') as infile:
-            reader = csv.reader(infile)
-            var_header = next(reader)  # ヘッダー行を読み込む
-            # var_headerから変数名のインデックスをマップ
-            var_name_to_index = {name.strip(): i for i, name in enumerate(var_header)}
-
-            for row in reader:
-                var_data.append(row)
-    except FileNotFoundError:
-        print(f"エラー: 変数定義ファイル '{var_filepath}' が見つかりません。")
-        return
-    except Exception as e:
-        print(f"変数定義ファイルの読み込み中にエラーが発生しました: {e}")
-        return
+    if cell == '-':
+        return ''
+    segments = []
+    literal = []
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(cell):
+        literal.append(cell[position:match.start()])
+        position = match.end()
+        name = match.group(1) or match.group(2)
+        if name is None:
+            literal.append(match.group(3)) # '$$' または '$-'
+        elif name in known_names:
+            if ''.join(literal):
+                segments.append(''.join(literal))
+            literal = []
+            segments.append(TemplateVar(name))
+        else:
+            if undefined is not None:
+                undefined.append(name)
+            literal.append(match.group(0))
+    literal.append(cell[position:])
+    if not segments:
+        return ''.join(literal)
+    if ''.join(literal):
+        segments.append(''.join(literal))
+    return tuple(segments)
 
-    # 2. テンプレートCSVの読み込み
-    template_commands = []
-    try:
-        with open(template_filepath, 'r', newline='', encoding='sjis') as infile:
-            reader = csv.reader(infile)
-            command_header = next(reader) # コマンドテンプレートのヘッダーを読み込む
-            for row in reader:
-                template_commands.append(row)
-    except FileNotFoundError:
-        print(f"エラー: テンプレートファイル '{template_filepath}' が見つかりません。")
-        return
-    except Exception as e:
-        print(f"テンプレートファイルの読み込み中にエラーが発生しました: {e}")
-        return
+def _render_row(segments, scope, missing):
+    """
+    コンパイル済みのコマンド行に変数の値を代入します。
+
+    Args:
+        segments (list): compile_cell の戻り値のリスト。
+        scope (dict): 変数名から値へのマップ。変数定義CSVの行に値がない変数の値はNone。
+        missing (dict): 値がない変数名ごとの件数を加算する辞書。
+
+    Returns:
+        list: 変数を代入したコマンド行。
+    """
+    row = []
+    for cell in segments:
+        if isinstance(cell, str):
+            row.append(cell)
+            continue
+        parts = []
+        for part in cell:
+            if isinstance(part, str):
+                parts.append(part)
+                continue
+            value = scope.get(part.name)
+            if value is None: # 値がない場合は空文字列として扱い、展開の最後にまとめて報告する
+                missing[part.name] = missing.get(part.name, 0) + 1
+            else:
+                parts.append(value)
+        row.append(''.join(parts))
+    return row
 
-    # 処理後のコマンドを格納するリスト
-    generated_commands = [command_header] # ヘッダーを出力に追加
+def read_var_names(var_filepath):
+    """変数定義CSVのヘッダー行から変数名を読み込みます。"""
+    with open(var_filepath, 'r', newline='', encoding='sjis') as infile:
+        return [name.strip() for name in next(csv.reader(infile), [])]
 
-    # 3. `for`/`forend` ブロックの検出と処理
-    in_for_block = False
-    for_block_commands = []
+def iter_var_rows(var_filepath):
+    """
+    変数定義CSVを1行ずつ読み込みます。ファイル全体をメモリに読み込みません。
 
-    for i, row in enumerate(template_commands):
-        command = row[0].strip().lower() # コマンド名を小文字で取得
+    Args:
+        var_filepath (str): 変数定義CSVファイルのパス。
+
+    Yields:
+        dict: 変数名から値へのマップ。行に値がない変数の値はNone。
+    """
+    with open(var_filepath, 'r', newline='', encoding='sjis') as infile:
+        reader = csv.reader(infile)
+        var_header = next(reader, None)
+        if var_header is None:
+            return
+        names = [name.strip() for name in var_header]
+        for row in reader:
+            yield {name: row[i] if i < len(row) else None for i, name in enumerate(names)}
+
+def parse_template(template_rows):
+    """
+    テンプレートのコマンド行を 'for'/'forend' ブロックの入れ子構造に変換します。
+    'for' の2列目にデータソース名を指定すると、そのデータソースの行ごとにブロックを展開します。
+
+    Args:
+        template_rows (list): テンプレートのコマンド行 (ヘッダーを除く)。
+
+    Returns:
+        list: TemplateRow と TemplateLoop のリスト。
+    """
+    nodes = []
+    stack = [(None, nodes)] # (開いている TemplateLoop, 追加先のリスト)
+    for i, row in enumerate(template_rows):
+        command = row[0].strip().lower() if row else '' # コマンド名を小文字で取得
 
         if command == 'for':
-            if in_for_block:
-                print(f"警告: ネストされた 'for' コマンドが検出されました (行 {i+2})。現在の実装ではネストはサポートされていません。")
-                continue
-            in_for_block = True
-            for_block_commands = [] # 新しいforブロックのコマンドを初期化
+            source = row[1].strip() if len(row) > 1 and row[1].strip() != '-' else ''
+            loop = TemplateLoop(source, line=i + 2)
+            stack[-1][1].append(loop)
+            stack.append((loop, loop.body))
             continue # 'for' コマンド自体は出力しない
 
         if command == 'forend':
-            if not in_for_block:
+            if len(stack) == 1:
                 print(f"警告: 'forend' が 'for' の開始なしで検出されました (行 {i+2})。スキップします。")
                 continue
-            in_for_block = False
+            stack.pop()
+            continue # 'forend' コマンド自体は出力しない
 
-            # forブロック内のコマンドを変数データに基づいて展開
-            if not var_data:
-                print("警告: 変数データがありません。'for' ブロックはスキップされます。")
+        stack[-1][1].append(TemplateRow(row, line=i + 2))
+
+    if len(stack) > 1:
+        print("警告: 'for' コマンドが 'forend' で閉じられていません。未処理の 'for' ブロックがあります。")
+        outermost, parent_body = stack[1][0], stack[0][1]
+        parent_body.remove(outermost)
+    return nodes
+
+def _iter_loops(nodes):
+    for node in nodes:
+        if isinstance(node, TemplateLoop):
+            yield node
+            yield from _iter_loops(node.body)
+
+def _source_resolver(template_filepath, var_filepath, sources):
+    """
+    データソース名から変数定義CSVのパスを求める関数を返します。
+    名前のない 'for' は var_filepath、名前付きの 'for' は sources の指定、
+    指定がない場合はテンプレートと同じディレクトリにあるその名前のファイルを使用します。
+    """
+    sources = sources or {}
+    template_dir = os.path.dirname(os.path.abspath(template_filepath))
+
+    def resolve(name):
+        if not name:
+            if var_filepath is None:
+                raise TemplateError("'for' ブロックに使用する変数定義CSVが指定されていません。")
+            return var_filepath
+        if name in sources:
+            return sources[name]
+        candidate = os.path.join(template_dir, name)
+        if os.path.isfile(candidate):
+            return candidate
+        raise TemplateError(f"データソース '{name}' が見つかりません。")
+
+    return resolve
+
+def compile_template(nodes, resolve_source, known_names=frozenset()):
+    """
+    テンプレートの各行を compile_cell で分割します。展開の前に1回だけ実行します。
+    未定義の変数はテンプレートの行ごとに1回だけ警告し、そのままの文字列として出力します。
+
+    Args:
+        nodes (list): parse_template の戻り値 (またはブロックの本体)。
+        resolve_source (callable): データソース名から変数定義CSVのパスを返す関数。
+        known_names (frozenset): 外側のブロックで定義されている変数名。
+    """
+    for node in nodes:
+        if isinstance(node, TemplateLoop):
+            inner_names = known_names | frozenset(read_var_names(resolve_source(node.source)))
+            compile_template(node.body, resolve_source, inner_names)
+            continue
+        undefined = []
+        node.segments = [compile_cell(cell, known_names, undefined) for cell in node.cells]
+        for name in dict.fromkeys(undefined):
+            if known_names:
+                print(f"警告: 未定義の変数 '{name}' が検出されました (行 {node.line})。そのまま出力します。")
             else:
-                for var_row_data in var_data:
-                    for for_cmd_row in for_block_commands:
-                        new_row = []
-                        for cell in for_cmd_row:
-                            # 変数プレースホルダーを置換
-                            # 例: "$var1" を対応する値に置換
-                            replaced_cell = cell
-                            matches = re.findall(r'\$(\w+)', cell) # $var1, $var2 などのパターンを検索
-                            for var_name in matches:
-                                if var_name in var_name_to_index:
-                                    var_index = var_name_to_index[var_name]
-                                    if var_index < len(var_row_data):
-                                        replaced_cell = replaced_cell.replace(f"${var_name}", var_row_data[var_index])
-                                    else:
-                                        print(f"警告: 変数 '{var_name}' の値が変数定義CSVの行に存在しません。")
-                                else:
-                                    print(f"警告: 未定義の変数 '{var_name}' が検出されました。")
-                            new_row.append(replaced_cell.replace('-', '')) # '-' もここで空文字列に置換
-
-                        generated_commands.append(new_row)
-            for_block_commands = [] # 処理後クリア
-            continue # 'forend' コマンド自体は出力しない
+                print(f"警告: 'for' ブロックの外側の変数 '{name}' は展開されません (行 {node.line})。そのまま出力します。")
 
-        if in_for_block:
-            for_block_commands.append(row)
+def _expand(nodes, resolve_source, scope, missing):
+    for node in nodes:
+        if isinstance(node, TemplateLoop):
+            expanded = False
+            for values in iter_var_rows(resolve_source(node.source)):
+                expanded = True
+                inner = dict(scope)
+                # 行に値がない変数は外側のブロックの値を引き継ぐ
+                inner.update((name, value) for name, value in values.items() if value is not None or name not in inner)
+                yield from _expand(node.body, resolve_source, inner, missing)
+            if not expanded:
+                print(f"警告: 変数データがありません。'for' ブロック (行 {node.line}) はスキップされます。")
         else:
-            # forブロック外の通常のコマンドをそのまま追加（'-'は置換）
-            processed_row = [cell.replace('-', '') if cell == '-' else cell for cell in row]
-            generated_commands.append(processed_row)
+            yield _render_row(node.segments, scope, missing)
 
-    if in_for_block:
-        print("警告: 'for' コマンドが 'forend' で閉じられていません。未処理の 'for' ブロックがあります。")
+def iter_template_iterations(nodes, resolve_source):
+    """
+    コンパイル済みのテンプレートを、最も外側の 'for' ブロックの変数定義CSVの1行 (イテレーション) ごとに展開します。
+    イテレーション番号は最も外側のブロック全体を通して0から数えます。ブロックの外側の連続する行はまとめて1つとし、番号はNoneです。
+    各イテレーションのコマンド行は、次のイテレーションを取得する前に読み終えてください。
+
+    Args:
+        nodes (list): compile_template を実行した parse_template の戻り値。
+        resolve_source (callable): データソース名から変数定義CSVのパスを返す関数。
+
+    Yields:
+        tuple: (イテレーション番号, 変数を代入したコマンド行のジェネレーター)。
+    """
+    missing = {}
+    iteration = 0
+    pending = [] # ブロックの外側の行
+    for node in nodes:
+        if not isinstance(node, TemplateLoop):
+            pending.append(node)
+            continue
+        if pending:
+            yield None, _expand(pending, resolve_source, {}, missing)
+            pending = []
+        expanded = False
+        for values in iter_var_rows(resolve_source(node.source)):
+            expanded = True
+            yield iteration, _expand(node.body, resolve_source, values, missing)
+            iteration += 1
+        if not expanded:
+            print(f"警告: 変数データがありません。'for' ブロック (行 {node.line}) はスキップされます。")
+    if pending:
+        yield None, _expand(pending, resolve_source, {}, missing)
+    report_missing_values(missing)
+
+def report_missing_values(missing):
+    """展開中に値がなかった変数を、変数ごとに1回だけ警告します。"""
+    for name, count in missing.items():
+        print(f"警告: 変数 '{name}' の値が変数定義CSVの {count} 箇所で存在しないため、空文字列として扱いました。")
+
+def expand_template(nodes, resolve_source, scope=None, missing=None):
+    """
+    コンパイル済みのテンプレートを1行ずつ展開するジェネレーターです。変数定義CSVはブロックの展開時に1行ずつ読み込みます。
+    入れ子のブロックでは内側のデータソースの変数が優先され、外側の変数も参照できます。
+
+    Args:
+        nodes (list): compile_template を実行した parse_template の戻り値 (またはブロックの本体)。
+        resolve_source (callable): データソース名から変数定義CSVのパスを返す関数。
+        scope (dict): 外側のブロックの変数。
+        missing (dict): 値がなかった変数名ごとの件数を加算する辞書。Noneの場合は展開の最後に警告を出力します。
+
+    Yields:
+        list: 変数を代入したコマンド行。
+    """
+    report = missing is None
+    missing = {} if missing is None else missing
+    yield from _expand(nodes, resolve_source, scope or {}, missing)
+    if report:
+        report_missing_values(missing)
+
+def load_template(template_filepath, var_filepath=None, sources=None):
+    """
+    テンプレートCSVを読み込んで構成を解析し、データソースの存在を確認してからコンパイルします。
+
+    Args:
+        template_filepath (str): コマンドテンプレートCSVファイルのパス。
+        var_filepath (str): 名前のない 'for' ブロックで使用する変数定義CSVファイルのパス。
+        sources (dict): データソース名から変数定義CSVファイルのパスへのマップ。
+
+    Returns:
+        tuple: (コマンドテンプレートのヘッダー行, コンパイル済みのテンプレート, データソース名からパスを返す関数)。
+
+    Raises:
+        FileNotFoundError: テンプレートファイルまたは変数定義ファイルが存在しない場合。
+        TemplateError: データソースが見つからない場合。
+    """
+    with open(template_filepath, 'r', newline='', encoding='sjis') as infile:
+        reader = csv.reader(infile)
+        command_header = next(reader) # コマンドテンプレートのヘッダーを読み込む
+        nodes = parse_template(list(reader))
+
+    resolve_source = _source_resolver(template_filepath, var_filepath, sources)
+    for loop in _iter_loops(nodes):
+        path = resolve_source(loop.source)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(2, "No such file or directory", path)
+    compile_template(nodes, resolve_source)
+    return command_header, nodes, resolve_source
+
+def open_template(template_filepath, var_filepath=None, sources=None, by_iteration=False):
+    """
+    テンプレートCSVを読み込み、展開結果を1行ずつ返すジェネレーターを作成します。
+    テンプレートの構成・使用するデータソースの存在・未定義の変数は、最初の行を返す前に確認します。
+
+    Args:
+        template_filepath (str): コマンドテンプレートCSVファイルのパス。
+        var_filepath (str): 名前のない 'for' ブロックで使用する変数定義CSVファイルのパス。
+        sources (dict): データソース名から変数定義CSVファイルのパスへのマップ。
+        by_iteration (bool): Trueの場合、iter_template_iterations と同じくイテレーションごとに返します。
+
+    Returns:
+        tuple: (コマンドテンプレートのヘッダー行, 展開したコマンド行のジェネレーター)。
+
+    Raises:
+        FileNotFoundError: テンプレートファイルまたは変数定義ファイルが存在しない場合。
+        TemplateError: データソースが見つからない場合。
+    """
+    command_header, nodes, resolve_source = load_template(template_filepath, var_filepath, sources)
+    if by_iteration:
+        return command_header, iter_template_iterations(nodes, resolve_source)
+    return command_header, expand_template(nodes, resolve_source)
+
+def generate_commands_with_vars(var_filepath, template_filepath, output_filepath, sources=None):
+    """
+    変数定義CSVとテンプレートCSVを基に、変数を代入した新しいCSVファイルを生成します。
+    展開した行は生成したそばから書き込むため、変数定義CSVの行数が多くてもメモリ使用量は増えません。
+
+    Args:
+        var_filepath (str): 変数定義CSVファイルのパス。
+        template_filepath (str): コマンドテンプレートCSVファイルのパス。
+        output_filepath (str): 出力する新しいCSVファイルのパス。
+        sources (dict): 'for' の2列目で指定するデータソース名から変数定義CSVファイルのパスへのマップ。
+
+    Returns:
+        bool: 生成できた場合はTrue。エラーの場合は内容を表示してFalseを返します。
+    """
+    try:
+        command_header, rows = open_template(template_filepath, var_filepath, sources)
+    except FileNotFoundError as e:
+        print(f"エラー: ファイル '{e.filename}' が見つかりません。")
+        return False
+    except TemplateError as e:
+        print(f"エラー: {e}")
+        return False
+    except Exception as e:
+        print(f"テンプレートファイルの読み込み中にエラーが発生しました: {e}")
+        return False
 
-    # 5. 新しいCSVファイルの作成
     try:
         with open(output_filepath, 'w', newline='', encoding='sjis') as outfile:
             writer = csv.writer(outfile)
-            writer.writerows(generated_commands)
+            writer.writerow(command_header)
+            for row in rows:
+                writer.writerow(row)
         print(f"処理が完了しました。生成されたコマンドは '{output_filepath}' に保存されました。")
     except Exception as e:
         print(f"生成されたコマンドの書き込み中にエラーが発生しました: {e}")
+        return False
+    return True
 
-# --- 実行例 ---
-if __name__ == "__main__":
-    # 実行用のダミーファイルを作成
+def build_iteration_units(var_filepath, template_filepath, sources=None):
+    """
+    テンプレートを展開せずに、変数定義CSVの1行ごとの実行単位に分割します。
+    並列実行時に各ワーカーへ割り当てるために使用します。
+    テンプレートの最も外側には 'for'/'forend' ブロックがちょうど1つ含まれている必要があります
+    (ブロックの中の入れ子のブロックは各実行単位の中で展開します)。
 
-    var_filename = input("変数設定ファイルのパスを入力してください：")#vars.csv
-    template_filename = input("テンプレートファイルのパスを入力してください：")#"commands_template.csv"
-    output_filename = input("出力ファイル名を入力してください：")#"generated_commands.csv"
+    Args:
+        var_filepath (str): 変数定義CSVファイルのパス。
+        template_filepath (str): コマンドテンプレートCSVファイルのパス。
+        sources (dict): データソース名から変数定義CSVファイルのパスへのマップ。
 
+    Returns:
+        dict: 実行単位。読み込みやテンプレートの構成に問題がある場合はNone。
+            'header': コマンドテンプレートのヘッダー行。
+            'prefix': 'for' より前のコマンド行 (navigateなどの準備処理)。
+            'iterations': 外側の 'for' のデータソースの各行について、変数を代入したforブロックのコマンド行のリスト。
+            'suffix': 'forend' より後のコマンド行。
+    """
+    try:
+        command_header, nodes, resolve_source = load_template(template_filepath, var_filepath, sources)
+        loops = [i for i, node in enumerate(nodes) if isinstance(node, TemplateLoop)]
+        if len(loops) != 1:
+            print("エラー: 分割実行にはテンプレートに 'for'/'forend' ブロックがちょうど1つ必要です。")
+            return None
+        loop = nodes[loops[0]]
+        missing = {}
+        iterations = [list(expand_template(loop.body, resolve_source, values, missing))
+                      for values in iter_var_rows(resolve_source(loop.source))]
+        report_missing_values(missing)
+    except FileNotFoundError as e:
+        print(f"エラー: ファイル '{e.filename}' が見つかりません。")
+        return None
+    except TemplateError as e:
+        print(f"エラー: {e}")
+        return None
+    except Exception as e:
+        print(f"変数定義ファイルまたはテンプレートファイルの読み込み中にエラーが発生しました: {e}")
+        return None
 
+    return {
+        'header': command_header,
+        'prefix': list(expand_template(nodes[:loops[0]], resolve_source)),
+        'iterations': iterations,
+        'suffix': list(expand_template(nodes[loops[0] + 1:], resolve_source)),
+    }
 
-    # 関数を実行
-    generate_commands_with_vars(var_filename, template_filename, output_filename)
+def parse_data_sources(specs):
+    """
+    '名前=パス' 形式のデータソース指定を辞書に変換します。
 
-    # 生成されたCSVの内容を確認 (オプション)
-    print("\n--- 生成されたCSVファイルの内容 ---")
+    Args:
+        specs (list): '名前=パス' 形式の文字列のリスト。
+
+    Returns:
+        dict: データソース名から変数定義CSVファイルのパスへのマップ。
+
+    Raises:
+        ValueError: 形式が正しくない場合。
+    """
+    sources = {}
+    for spec in specs or []:
+        name, sep, path = spec.partition('=')
+        if not sep or not name.strip() or not path.strip():
+            raise ValueError(f"データソースは '名前=パス' の形式で指定してください: {spec}")
+        sources[name.strip()] = path.strip()
+    return sources
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="コマンドテンプレートCSVに変数定義CSVの値を代入し、シナリオCSVを生成します。")
+    parser.add_argument('template', help="コマンドテンプレートCSV (例: commands_template.csv)")
+    parser.add_argument('--vars', help="変数定義CSV (例: vars.csv)")
+    parser.add_argument('--data', action='append', metavar='NAME=PATH',
+                        help="テンプレートの 'for,NAME' で使用する名前付きデータソース (複数指定可)")
+    parser.add_argument('-o', '--output', default='generated_commands.csv',
+                        help="生成するシナリオCSVのパス (デフォルト: generated_commands.csv)")
+    parser.add_argument('--show', action='store_true', help="生成したシナリオCSVの内容を表示する")
+    args = parser.parse_args(argv)
     try:
-        with open(output_filename, 'r', newline='', encoding='sjis') as f:
-            reader = csv.reader(f)
-            for row in reader:
+        sources = parse_data_sources(args.data)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not generate_commands_with_vars(args.vars, args.template, args.output, sources):
+        return 1
+    if args.show:
+        print("\n--- 生成されたCSVファイルの内容 ---")
+        with open(args.output, 'r', newline='', encoding='sjis') as f:
+            for row in csv.reader(f):
                 print(row)
-    except FileNotFoundError:
-        print("出力ファイルが見つかりませんでした。")
+    return 0
 
+if __name__ == "__main__":
+    exit(main())
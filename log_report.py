@@ -0,0 +1,418 @@
+import argparse
+import glob
+import heapq
+import html
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+from buffered_logger import jsonl_segment_path
+
+DEFAULT_REPORT = 'report.html'
+
+# 実行ごとに詳細を記録する失敗の最大件数 (件数は上限を超えても数える)
+MAX_FAILURES = 200
+
+# レポートに表示する処理時間の長いコマンドの件数
+SLOWEST_COMMANDS = 20
+
+# ログを一度に読み込むバイト数。ログ全体ではなくこの大きさずつ読み込む
+READ_CHUNK = 1024 * 1024
+
+# 集計状態のファイルの形式のバージョン。集計する項目を変えた場合は上げる (古い状態は破棄して集計し直す)
+STATE_VERSION = 1
+
+# 'name.2.jsonl' のような2番目以降のファイル
+_SEGMENT_PATTERN = re.compile(r'^(.*)\.(\d+)\.jsonl$', re.IGNORECASE)
+
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def discover_logs(paths):
+    """
+    JSONLログを探し、ログごとの1番目のファイルのパスを返します。2番目以降のファイル ('name.2.jsonl' など) は
+    1番目のファイルと合わせて1つのログとして読み込むため、一覧には含めません。
+
+    Args:
+        paths (list): ディレクトリ (サブディレクトリも含めて探します)、globパターン、またはファイルパス。
+
+    Returns:
+        list: JSONLログのパスのリスト (ソート済み)。
+    """
+    found = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found.update(glob.glob(os.path.join(path, '**', '*.jsonl'), recursive=True))
+        elif glob.has_magic(path):
+            found.update(p for p in glob.glob(path, recursive=True) if p.lower().endswith('.jsonl'))
+        elif os.path.isfile(path):
+            found.add(path)
+    logs = []
+    for path in found:
+        match = _SEGMENT_PATTERN.match(path)
+        if match and int(match.group(2)) > 1 and f"{match.group(1)}.jsonl" in found:
+            continue
+        logs.append(path)
+    return sorted(logs)
+
+
+def _new_run():
+    return {
+        'segment': 1, # 読み込み中のファイルの番号
+        'offset': 0, # 読み込み中のファイルの読み込み済みのバイト数
+        'scenario': None,
+        'started': None,
+        'updated': None,
+        'ended': False,
+        'commands': 0,
+        'failed': 0,
+        'errors': 0, # ERROR/CRITICALログの件数
+        'critical': False,
+        'duration': 0.0, # コマンドの処理時間の合計（秒）
+        'invalid_lines': 0, # JSONとして読み込めなかった行数
+        'failures': [], # 失敗の詳細 (MAX_FAILURES 件まで)
+    }
+
+
+def _elapsed(started, updated):
+    if not started or not updated:
+        return None
+    try:
+        return (datetime.strptime(updated, _TIMESTAMP_FORMAT) - datetime.strptime(started, _TIMESTAMP_FORMAT)).total_seconds()
+    except ValueError:
+        return None
+
+
+class ReportBuilder:
+    """
+    JSONLログを集計し、HTMLレポートを作成します。
+
+    ログは前回読み込んだ位置から続けて読み込むため、実行中のログに対して update() を繰り返し呼び出すと
+    追記された分だけを集計します。集計状態 (読み込み位置・件数・失敗の詳細) は save_state() でファイルに保存でき、
+    次回は load_state() で読み込んで続きから集計できます。
+    メモリ使用量はログのサイズによらず、実行数と MAX_FAILURES・SLOWEST_COMMANDS の件数で決まります。
+    """
+
+    def __init__(self, state=None):
+        """
+        Args:
+            state (dict): load_state() で読み込んだ集計状態。Noneの場合は最初から集計します。
+        """
+        if state is None or state.get('version') != STATE_VERSION:
+            state = {'version': STATE_VERSION, 'runs': {}, 'commands': {}, 'slowest': [], 'sequence': 0}
+        self.state = state
+
+    @classmethod
+    def load_state(cls, filepath):
+        """集計状態のファイルを読み込みます。ファイルがないか読み込めない場合は最初から集計します。"""
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                return cls(json.load(f))
+        except (OSError, ValueError):
+            return cls()
+
+    def save_state(self, filepath):
+        """集計状態をファイルに保存します。"""
+        _write_atomic(filepath, json.dumps(self.state, ensure_ascii=False))
+
+    def update(self, log_paths):
+        """
+        ログの追記された分を読み込んで集計します。
+
+        Args:
+            log_paths (list): JSONLログのパス (discover_logs の戻り値)。
+
+        Returns:
+            int: 新しく読み込んだレコード数。
+        """
+        count = 0
+        for path in log_paths:
+            run = self.state['runs'].get(path)
+            if run is None or (run['segment'] == 1 and os.path.getsize(path) < run['offset']):
+                # 新しいログ、または同じパスに作り直されたログ
+                run = self.state['runs'][path] = _new_run()
+            count += self._read_run(path, run)
+        return count
+
+    def _read_run(self, path, run):
+        count = 0
+        while True:
+            segment_path = jsonl_segment_path(path, run['segment'])
+            try:
+                with open(segment_path, 'rb') as f:
+                    f.seek(run['offset'])
+                    pending = b''
+                    while True:
+                        data = f.read(READ_CHUNK)
+                        if not data:
+                            break
+                        pending += data
+                        end = pending.rfind(b'\n') + 1
+                        # 書き込み途中の最後の行は次回に読み込む
+                        for line in pending[:end].splitlines():
+                            count += self._apply_line(path, run, line)
+                        run['offset'] += end
+                        pending = pending[end:]
+            except FileNotFoundError:
+                return count
+            # 次のファイルがある場合、このファイルへの書き込みは終わっている
+            if not os.path.exists(jsonl_segment_path(path, run['segment'] + 1)):
+                return count
+            run['segment'] += 1
+            run['offset'] = 0
+
+    def _apply_line(self, path, run, line):
+        if not line.strip():
+            return 0
+        try:
+            record = json.loads(line)
+        except ValueError:
+            run['invalid_lines'] += 1
+            return 0
+        if not isinstance(record, dict):
+            run['invalid_lines'] += 1
+            return 0
+        self._apply(path, run, record)
+        return 1
+
+    def _apply(self, path, run, record):
+        timestamp = record.get('ts')
+        if timestamp:
+            run['started'] = run['started'] or timestamp
+            run['updated'] = timestamp
+        event = record.get('event')
+        if event is None:
+            level = record.get('level')
+            if level in ('ERROR', 'CRITICAL'):
+                run['errors'] += 1
+            if level == 'CRITICAL':
+                # シナリオの実行を中断した例外。行に対応しないため失敗の詳細として記録する
+                run['critical'] = True
+                self._add_failure(run, {'iteration': record.get('iteration'), 'row': record.get('row'),
+                                        'command': None, 'reason': 'critical', 'errors': [record.get('message')],
+                                        'artifacts': [], 'ts': timestamp}, count=False)
+            return
+        if event == 'run_start':
+            run['scenario'] = record.get('scenario')
+        elif event == 'run_end':
+            run['ended'] = True
+            run['scenario'] = run['scenario'] or record.get('scenario')
+        elif event == 'command':
+            self._apply_command(path, run, record)
+        elif event == 'rows_failed':
+            for row in record.get('rows') or ():
+                self._add_failure(run, {'iteration': record.get('iteration'), 'row': row, 'command': None,
+                                        'reason': record.get('reason'), 'errors': [], 'artifacts': [],
+                                        'ts': timestamp})
+
+    def _apply_command(self, path, run, record):
+        name = record.get('command') or '?'
+        duration = record.get('duration') or 0.0
+        failed = record.get('status') == 'failed'
+        run['commands'] += 1
+        run['duration'] += duration
+        stats = self.state['commands'].setdefault(name, {'count': 0, 'failed': 0, 'total': 0.0, 'max': 0.0})
+        stats['count'] += 1
+        stats['failed'] += failed
+        stats['total'] += duration
+        stats['max'] = max(stats['max'], duration)
+
+        self.state['sequence'] += 1
+        entry = [duration, self.state['sequence'], path, record.get('iteration'), record.get('row'), name]
+        slowest = self.state['slowest']
+        if len(slowest) < SLOWEST_COMMANDS:
+            heapq.heappush(slowest, entry)
+        elif duration > slowest[0][0]:
+            heapq.heapreplace(slowest, entry)
+
+        if failed:
+            self._add_failure(run, {'iteration': record.get('iteration'), 'row': record.get('row'), 'command': name,
+                                    'reason': 'failed', 'errors': record.get('errors') or [],
+                                    'artifacts': record.get('artifacts') or [], 'duration': duration,
+                                    'ts': record.get('ts')})
+
+    def _add_failure(self, run, failure, count=True):
+        if count:
+            run['failed'] += 1
+        if len(run['failures']) < MAX_FAILURES:
+            run['failures'].append(failure)
+
+    def runs(self):
+        """集計した実行の一覧を (ログのパス, 集計) のリストで返します (開始時刻順)。"""
+        return sorted(self.state['runs'].items(), key=lambda item: (item[1]['started'] or '', item[0]))
+
+    def write_html(self, filepath, refresh=None):
+        """
+        HTMLレポートを書き込みます。書き込み途中のレポートを表示されないよう、一時ファイルに書き込んでから置き換えます。
+
+        Args:
+            filepath (str): レポートのパス。
+            refresh (float): ブラウザでレポートを再読み込みする間隔（秒）。Noneの場合は再読み込みしません。
+        """
+        _write_atomic(filepath, render_html(self, os.path.dirname(os.path.abspath(filepath)), refresh))
+
+
+def run_status(run):
+    """実行の状態 ('running'、'passed' または 'failed') を返します。"""
+    if run['failed'] or run['critical']:
+        return 'failed'
+    return 'passed' if run['ended'] else 'running'
+
+
+_STATUS_LABELS = {'running': '実行中', 'passed': '成功', 'failed': '失敗'}
+
+_REASON_LABELS = {'failed': 'コマンドの失敗', 'invalid': '不正な行', 'time_budget': '制限時間の超過',
+                  'screenshot': 'スクリーンショットの保存失敗', 'critical': '実行の中断'}
+
+_STYLE = """
+body { font-family: sans-serif; margin: 1.5em; }
+table { border-collapse: collapse; margin-bottom: 1.5em; }
+th, td { border: 1px solid #ccc; padding: 0.25em 0.6em; text-align: left; }
+th { background: #f0f0f0; }
+td.number { text-align: right; }
+.running { color: #06c; } .passed { color: #080; } .failed { color: #c00; font-weight: bold; }
+details { margin: 0.3em 0; } details details { margin-left: 1.5em; }
+img { max-width: 480px; border: 1px solid #ccc; margin: 0.3em; }
+"""
+
+
+def _link(path, base_dir):
+    """画像・ログのパスをレポートからの相対パスのリンクに変換します。相対パスは実行時のカレントディレクトリからのパスです。"""
+    try:
+        relative = os.path.relpath(os.path.abspath(path), base_dir)
+    except ValueError: # Windowsで別のドライブの場合
+        relative = os.path.abspath(path)
+    return quote(relative.replace(os.sep, '/'))
+
+
+def _location(iteration, row):
+    location = f"行 {row}" if row is not None else "行なし"
+    return f"イテレーション {iteration} / {location}" if iteration is not None else location
+
+
+def render_html(builder, base_dir, refresh=None):
+    """集計結果をHTMLにします。リンクは base_dir からの相対パスです。"""
+    e = html.escape
+    runs = builder.runs()
+    statuses = [run_status(run) for _, run in runs]
+    out = ['<!DOCTYPE html>', '<html lang="ja"><head><meta charset="utf-8">', '<title>テスト実行レポート</title>']
+    if refresh:
+        out.append(f'<meta http-equiv="refresh" content="{int(refresh)}">')
+    out.append(f'<style>{_STYLE}</style></head><body>')
+    out.append('<h1>テスト実行レポート</h1>')
+    out.append(f'<p>作成日時: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")} / 実行: {len(runs)} 件 '
+               f'(実行中: {statuses.count("running")}、成功: {statuses.count("passed")}、'
+               f'失敗: {statuses.count("failed")}) / コマンド: {sum(run["commands"] for _, run in runs)} 件 / '
+               f'失敗: {sum(run["failed"] for _, run in runs)} 件</p>')
+
+    out.append('<h2>実行の一覧</h2><table><tr><th>状態</th><th>シナリオ</th><th>ログ</th><th>開始</th><th>最終更新</th>'
+               '<th>経過（秒）</th><th>コマンド</th><th>失敗</th><th>エラーログ</th></tr>')
+    for (path, run), status in zip(runs, statuses):
+        elapsed = _elapsed(run['started'], run['updated'])
+        scenario = run['scenario'] or os.path.basename(path)
+        anchor = f'<a href="#run-{quote(path)}">{e(scenario)}</a>' if run['failures'] else e(scenario)
+        out.append(f'<tr><td class="{status}">{_STATUS_LABELS[status]}</td><td>{anchor}</td>'
+                   f'<td><a href="{_link(path, base_dir)}">{e(os.path.basename(path))}</a></td>'
+                   f'<td>{e(run["started"] or "")}</td><td>{e(run["updated"] or "")}</td>'
+                   f'<td class="number">{"" if elapsed is None else f"{elapsed:.1f}"}</td>'
+                   f'<td class="number">{run["commands"]}</td><td class="number">{run["failed"]}</td>'
+                   f'<td class="number">{run["errors"]}</td></tr>')
+    out.append('</table>')
+
+    commands = builder.state['commands']
+    if commands:
+        out.append('<h2>コマンドごとの集計</h2><table><tr><th>コマンド</th><th>回数</th><th>失敗</th>'
+                   '<th>合計（秒）</th><th>平均（秒）</th><th>最大（秒）</th></tr>')
+        for name, stats in sorted(commands.items(), key=lambda item: -item[1]['total']):
+            out.append(f'<tr><td>{e(name)}</td><td class="number">{stats["count"]}</td>'
+                       f'<td class="number">{stats["failed"]}</td><td class="number">{stats["total"]:.2f}</td>'
+                       f'<td class="number">{stats["total"] / stats["count"]:.3f}</td>'
+                       f'<td class="number">{stats["max"]:.3f}</td></tr>')
+        out.append('</table>')
+        out.append(f'<h2>処理時間の長いコマンド (上位 {SLOWEST_COMMANDS} 件)</h2><table><tr><th>処理時間（秒）</th>'
+                   '<th>コマンド</th><th>位置</th><th>ログ</th></tr>')
+        for duration, _, path, iteration, row, name in sorted(builder.state['slowest'], reverse=True):
+            out.append(f'<tr><td class="number">{duration:.3f}</td><td>{e(name)}</td>'
+                       f'<td>{e(_location(iteration, row))}</td><td>{e(os.path.basename(path))}</td></tr>')
+        out.append('</table>')
+
+    failed_runs = [(path, run) for path, run in runs if run['failures']]
+    if failed_runs:
+        out.append('<h2>失敗の詳細</h2>')
+    for path, run in failed_runs:
+        scenario = run['scenario'] or os.path.basename(path)
+        shown = len(run['failures'])
+        more = f' (先頭の {shown} 件を表示)' if run['failed'] > shown else ''
+        out.append(f'<details id="run-{quote(path)}" open><summary><b>{e(scenario)}</b> — '
+                   f'失敗 {run["failed"]} 件{more}</summary>')
+        for failure in run['failures']:
+            command = f" {failure['command']}" if failure['command'] else ''
+            reason = _REASON_LABELS.get(failure['reason'], failure['reason'] or '')
+            out.append(f'<details><summary>{e(_location(failure["iteration"], failure["row"]))}{e(command)} '
+                       f'— {e(reason)}</summary>')
+            if failure['errors']:
+                out.append('<ul>' + ''.join(f'<li>{e(str(message))}</li>' for message in failure['errors']) + '</ul>')
+            for artifact in failure['artifacts']:
+                href = _link(artifact, base_dir)
+                out.append(f'<a href="{href}"><img src="{href}" alt="{e(artifact)}" loading="lazy"></a>')
+            out.append('</details>')
+        out.append('</details>')
+    out.append('</body></html>')
+    return '\n'.join(out)
+
+
+def _write_atomic(filepath, text):
+    directory = os.path.dirname(os.path.abspath(filepath))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, filepath)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSONL形式の実行ログを集計し、HTMLレポートを作成します。")
+    parser.add_argument('paths', nargs='+', help="JSONLログのディレクトリ、globパターン、またはファイルパス")
+    parser.add_argument('-o', '--output', default=DEFAULT_REPORT, help=f"HTMLレポートのパス (デフォルト: {DEFAULT_REPORT})")
+    parser.add_argument('--state', metavar='PATH',
+                        help="集計状態の保存先。次回は前回読み込んだ位置から集計します (デフォルト: レポートのパス + .state.json)")
+    parser.add_argument('--rebuild', action='store_true', help="集計状態を破棄し、ログを最初から集計し直す")
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help="指定した間隔でログの追記を読み込み、レポートを更新し続ける (Ctrl+C で終了)")
+    args = parser.parse_args(argv)
+    if args.watch is not None and args.watch <= 0:
+        parser.error("--watch には正の秒数を指定してください。")
+
+    state_path = args.state or f"{args.output}.state.json"
+    builder = ReportBuilder() if args.rebuild else ReportBuilder.load_state(state_path)
+    logs = []
+    try:
+        while True:
+            start = time.perf_counter()
+            logs = discover_logs(args.paths)
+            records = builder.update(logs)
+            builder.write_html(args.output, refresh=args.watch)
+            builder.save_state(state_path)
+            print(f"レポートを更新しました: {args.output} (ログ {len(logs)} 件、新しいレコード {records} 件、"
+                  f"{time.perf_counter() - start:.1f} 秒)")
+            if args.watch is None:
+                break
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        pass
+    if not logs:
+        print("警告: JSONLログが見つかりません。")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,909 @@
+import argparse
+import glob
+import multiprocessing.util
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from adaptive_timeouts import DEFAULT_HISTORY_FILE, AdaptiveTimeouts
+from checkpoint import (DEFAULT_CHECKPOINT_DIR, RERUN_FAILED, RESUME, RunCheckpoint, checkpoint_path, file_fingerprint,
+                        load_checkpoint, remove_shard_checkpoints, shard_checkpoint_path)
+from driver_profiles import DEFAULT_PROFILE, load_profiles, resolve_profile
+from gen_scenario import TemplateError, build_iteration_units, open_template, parse_data_sources
+from scenario_compiler import ScenarioCompileError, compile_row, compile_rows, compile_scenario, parse_directives
+from screenshot_store import DEFAULT_STORE_DIR, ENCODERS, ScreenshotStore
+
+@dataclass
+class RunOptions:
+    """
+    シナリオの実行方法のオプション。build_run_options でコマンドライン引数から作成し、
+    run_scenario / run_scenarios_parallel / run_shard / run_iterations_sharded / run_template_stream に
+    1つの引数として渡します。ワーカープロセスにもそのまま送られます。
+
+    Attributes:
+        browser (str): 使用するブラウザ ('chrome' または 'firefox')。
+        log_echo (bool): ログをコンソールにも出力するかどうか。
+        max_session_uses (int): 各ワーカーが1つのブラウザを再利用するシナリオ (シャード) 数の上限。
+        batch_commands (bool): 連続する input / log_content をまとめて実行するかどうか。
+        profile_format (str): 'json' または 'csv' を指定すると、ログと同じ場所にプロファイルレポートを保存します。
+        timeout_history (AdaptiveTimeouts): 要素の待機時間の記録。指定した場合は記録から算出した待機時間を使用します。
+        time_budget (float): シナリオ (シャード) ごとの制限時間（秒）。
+        checkpoint_dir (str): 行ごとの実行結果を記録するチェックポイントの保存先。Noneの場合は記録しません。
+        rerun (str): checkpoint.RESUME で前回の続きから、checkpoint.RERUN_FAILED で前回失敗した行 (イテレーション) だけを実行します。
+        driver_profile (str または DriverProfile): ブラウザのドライバープロファイル。ヘッダー行の 'profile=' の設定が優先されます。
+        profiles (dict): プロファイル名から DriverProfile へのマップ (load_profiles の戻り値)。Noneの場合は組み込みのプロファイル。
+        screenshot_store (ScreenshotStore): スクリーンショットの保存先のストア。Noneの場合はスクリーンショットディレクトリに保存します。
+        baseline_dir (str): assert_screenshot で比較するベースライン画像のディレクトリ。
+        update_baselines (bool): Trueの場合、assert_screenshot は比較せずにベースライン画像を更新します。
+        log_format (str): ログの形式。'jsonl' の場合は1件のログを1行のJSONとして記録します (log_report.py で集計できます)。
+    """
+    browser: str = 'chrome'
+    log_echo: bool = True
+    max_session_uses: int = 20
+    batch_commands: bool = False
+    profile_format: str = None
+    timeout_history: AdaptiveTimeouts = None
+    time_budget: float = None
+    checkpoint_dir: str = None
+    rerun: str = None
+    driver_profile: object = None
+    profiles: dict = None
+    screenshot_store: ScreenshotStore = None
+    baseline_dir: str = 'baselines'
+    update_baselines: bool = False
+    log_format: str = 'csv'
+
+
+# プロセスごとのセッションプール (open_session_pool で作成する)
+_worker_pool = None
+
+
+def open_session_pool(browser, max_session_uses, profile=None, prewarm=False):
+    """
+    現在のプロセスにブラウザを1つ保持するセッションプールを作成します。
+    以降にこのプロセスで実行する run_scenario / run_shard はプールのブラウザを再利用します。
+
+    Args:
+        browser (str): 使用するブラウザ ('chrome' または 'firefox')。
+        max_session_uses (int): 1つのブラウザを再利用するシナリオ数の上限。
+        profile (str または DriverProfile): ブラウザのドライバープロファイル。
+        prewarm (bool): Trueの場合、作成時にブラウザを起動しておきます。
+
+    Returns:
+        SessionPool: 作成したセッションプール。
+    """
+    global _worker_pool
+    from session_pool import SessionPool
+    _worker_pool = SessionPool(browser, size=1, max_uses=max_session_uses, prewarm=prewarm,
+                               profile=resolve_profile(profile))
+    return _worker_pool
+
+
+def close_session_pool():
+    """open_session_pool で作成したセッションプールのブラウザを終了します。"""
+    global _worker_pool
+    if _worker_pool is not None:
+        _worker_pool.close()
+        _worker_pool = None
+
+
+def _init_worker(browser, max_session_uses, profile=None):
+    """
+    ワーカープロセスの初期化処理。ブラウザを1つ起動したセッションプールを作成し、
+    同じワーカーで実行する後続のシナリオで再利用します。
+    """
+    open_session_pool(browser, max_session_uses, profile)
+    # ワーカープロセスの終了時にブラウザを終了する (atexitはワーカープロセスでは実行されないため)
+    multiprocessing.util.Finalize(None, close_session_pool, exitpriority=10)
+
+
+def _lease_driver(profile=None):
+    """
+    ワーカーのセッションプールからブラウザを借ります。プールがない場合はNoneを返し、都度ブラウザを起動します。
+    プールのブラウザとドライバープロファイルが異なる場合は、ブラウザを終了してプールを作り直します。
+    """
+    if _worker_pool is None:
+        return nullcontext(None)
+    if profile is not None and _worker_pool.profile != profile:
+        browser, max_uses = _worker_pool.browser, _worker_pool.max_uses
+        close_session_pool()
+        open_session_pool(browser, max_uses, profile)
+    return _worker_pool.lease()
+
+
+def _select_profile(header_directives, driver_profile, profiles):
+    """シナリオのヘッダー行の 'profile=' の設定を優先して、使用するドライバープロファイルを返します。"""
+    return resolve_profile(header_directives.get('profile') or driver_profile, profiles)
+
+
+def _save_timeout_history(timeout_history, results):
+    """
+    ワーカーで記録した要素の待機時間 (結果の 'timing_samples') を統合し、記録のファイルに1回だけ保存します。
+    並列に実行したワーカーがそれぞれ保存すると、最後に保存したワーカー以外の記録が失われるためです。
+    """
+    if timeout_history is None:
+        return
+    for result in results:
+        timeout_history.add_samples(result.pop('timing_samples', None))
+    try:
+        timeout_history.save()
+    except Exception as e:
+        print(f"警告: 待機時間の記録の保存中にエラーが発生しました: {e}")
+
+
+def _prepare_checkpoint(source_filepath, fingerprint, checkpoint_dir, rerun):
+    """
+    実行に使用するチェックポイントを用意します。rerun を指定した場合は前回のチェックポイントを読み込み、
+    ない場合 (初回の実行やシナリオが変更された場合) は新しいチェックポイントで最初から実行します。
+
+    Returns:
+        tuple: (RunCheckpoint, 実際に使用する再実行の方法 (前回のチェックポイントがない場合はNone))。
+    """
+    filepath = checkpoint_path(source_filepath, checkpoint_dir)
+    previous = load_checkpoint(filepath, fingerprint) if rerun else None
+    if previous is None:
+        if rerun:
+            print(f"警告: '{source_filepath}' の前回のチェックポイントがないため、最初から実行します。")
+        return RunCheckpoint(filepath, fingerprint), None
+    return previous, rerun
+
+
+def collect_scenarios(patterns):
+    """
+    ディレクトリ・globパターン・ファイルパスの指定からシナリオCSVの一覧を作成します。
+
+    Args:
+        patterns (list): ディレクトリ、globパターン、またはCSVファイルパスのリスト。
+
+    Returns:
+        list: 重複を除いたシナリオCSVファイルパスのリスト (指定順)。
+    """
+    scenarios = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matched = sorted(glob.glob(os.path.join(pattern, '*.csv')))
+        elif os.path.isfile(pattern):
+            matched = [pattern]
+        else:
+            matched = sorted(glob.glob(pattern))
+        for path in matched:
+            if path not in scenarios:
+                scenarios.append(path)
+    return scenarios
+
+
+def validate_scenarios(scenarios, profiles=None):
+    """
+    ブラウザを起動する前にすべてのシナリオCSVを検証します。検証結果はキャッシュされ、ワーカーで再利用されます。
+
+    Args:
+        scenarios (list): シナリオCSVファイルパスのリスト。
+        profiles (dict): 使用できるドライバープロファイル (load_profiles の戻り値)。Noneの場合は組み込みのプロファイル。
+
+    Returns:
+        list: エラーメッセージのリスト。エラーがない場合は空のリスト。
+    """
+    errors = []
+    for path in scenarios:
+        try:
+            plan = compile_scenario(path)
+            if plan.directives.get('profile'):
+                resolve_profile(plan.directives['profile'], profiles)
+        except ScenarioCompileError as e:
+            errors.append(str(e))
+        except ValueError as e:
+            errors.append(f"シナリオ '{path}': {e}")
+        except Exception as e:
+            errors.append(f"シナリオ '{path}' を読み込めません: {e}")
+    return errors
+
+
+def validate_template(template_filepath, var_filepath=None, sources=None, profiles=None, max_errors=100):
+    """
+    テンプレートを展開しながら、展開結果のすべての行を検証します。
+    展開した行は保持しないため、変数定義CSVの行数が多くてもメモリ使用量は増えません。
+
+    Args:
+        template_filepath (str): コマンドテンプレートCSVファイルのパス。
+        var_filepath (str): 変数定義CSVファイルのパス。
+        sources (dict): 'for' の2列目で指定するデータソース名から変数定義CSVファイルのパスへのマップ。
+        profiles (dict): 使用できるドライバープロファイル (load_profiles の戻り値)。Noneの場合は組み込みのプロファイル。
+        max_errors (int): 検証を打ち切るエラーの件数。
+
+    Returns:
+        tuple: (エラーメッセージのリスト, 検証したコマンド行の数)。行番号は展開したCSV上の行番号です。
+    """
+    errors = []
+    count = 0
+    try:
+        header, rows = open_template(template_filepath, var_filepath, sources)
+        directives, _ = parse_directives(header)
+        if directives.get('profile'):
+            resolve_profile(directives['profile'], profiles)
+        for row_number, row in enumerate(rows, 2):
+            if not any(cell.strip() for cell in row):
+                continue
+            count += 1
+            errors.extend(compile_row(row, row_number)[1])
+            if len(errors) >= max_errors:
+                errors.append(f"エラーが {max_errors} 件を超えたため、検証を打ち切りました。")
+                break
+    except FileNotFoundError as e:
+        errors.append(f"ファイル '{e.filename}' が見つかりません。")
+    except (TemplateError, ValueError) as e:
+        errors.append(f"テンプレート '{template_filepath}': {e}")
+    return errors, count
+
+
+def build_profile_path(log_filepath, profile_format):
+    """
+    ログファイルのパスからプロファイルレポートの保存先を生成します。
+
+    Args:
+        log_filepath (str): ログファイルのパス。
+        profile_format (str): 'json' または 'csv'。Noneの場合はレポートを保存しません。
+
+    Returns:
+        str: プロファイルレポートの保存先。profile_format がNoneの場合はNone。
+    """
+    if not profile_format:
+        return None
+    return f"{os.path.splitext(log_filepath)[0]}_profile.{profile_format}"
+
+
+def _create_automation(options, screenshot_dir, log_filepath, profile_report, profile, driver=None, checkpoint=None):
+    """実行オプションに従って WebTestAutomation を作成します。driver を指定しない場合はブラウザを起動します。"""
+    from test_automation import WebTestAutomation # seleniumはシナリオを実行する場合だけ読み込む
+    return WebTestAutomation(browser=options.browser, screenshot_dir=screenshot_dir, log_filepath=log_filepath,
+                             log_echo=options.log_echo, driver=driver, batch_commands=options.batch_commands,
+                             profile_report=profile_report, timeout_history=options.timeout_history,
+                             time_budget=options.time_budget, checkpoint=checkpoint, driver_profile=profile,
+                             screenshot_store=options.screenshot_store, baseline_dir=options.baseline_dir,
+                             update_baselines=options.update_baselines)
+
+
+def run_scenario(csv_filepath, options=None, output_root='.', suffix='', return_timings=False):
+    """
+    1つのシナリオCSVを専用のブラウザ・ログファイル・スクリーンショットディレクトリで実行します。
+    ワーカープロセスから呼び出されるため、例外は送出せず結果に格納して返します。
+
+    Args:
+        csv_filepath (str): シナリオCSVファイルのパス。
+        options (RunOptions): 実行オプション。Noneの場合は既定値。
+        output_root (str): ログとスクリーンショットの出力先ディレクトリ。
+        suffix (str): 出力名の末尾に付ける文字列 (同名シナリオの区別用)。
+        return_timings (bool): Trueの場合、timeout_history に今回の記録を保存せず、結果の 'timing_samples' に格納して返します
+            (ワーカープロセスで実行する場合に、親プロセスでまとめて保存するため)。
+
+    Returns:
+        dict: シナリオの実行結果。前回の実行で完了しているため実行しなかった場合は 'skipped' がTrue。
+    """
+    options = options or RunOptions()
+    from test_automation import build_output_paths
+    screenshot_dir, log_filepath = build_output_paths(csv_filepath, output_root, suffix, options.log_format)
+    profile_report = build_profile_path(log_filepath, options.profile_format)
+    result = {
+        'scenario': csv_filepath,
+        'log_filepath': log_filepath,
+        'profile_report': profile_report,
+        'screenshot_dir': screenshot_dir,
+        'total': 0,
+        'failed_rows': [],
+        'error': None,
+    }
+    checkpoint = None
+    rerun = options.rerun
+    if options.checkpoint_dir:
+        checkpoint, rerun = _prepare_checkpoint(csv_filepath, file_fingerprint(csv_filepath), options.checkpoint_dir,
+                                                rerun)
+        if rerun and not checkpoint.needs_rerun(rerun):
+            result.update({'log_filepath': None, 'profile_report': None, 'screenshot_dir': None,
+                           'failed_rows': checkpoint.failed_rows(), 'skipped': True})
+            result['passed'] = not result['failed_rows']
+            return result
+    try:
+        profile = _select_profile(compile_scenario(csv_filepath).directives, options.driver_profile, options.profiles)
+    except Exception as e:
+        result.update({'error': str(e), 'passed': False})
+        return result
+    automation = None
+    with _lease_driver(profile) as driver:
+        try:
+            automation = _create_automation(options, screenshot_dir, log_filepath, profile_report, profile,
+                                            driver=driver, checkpoint=checkpoint)
+            result.update(automation.execute_commands_from_csv(csv_filepath, rerun))
+            if checkpoint is not None:
+                if not automation.budget_exceeded and rerun != RERUN_FAILED:
+                    checkpoint.mark_complete()
+                # 前回の実行で失敗したまま再実行していない行も結果に含める
+                result['failed_rows'] = sorted(set(result['failed_rows']) | set(checkpoint.failed_rows()))
+        except Exception as e:
+            result['error'] = str(e)
+            if automation is not None:
+                automation._log("CRITICAL", f"テスト実行中に重大なエラーが発生しました: {e}")
+        finally:
+            if return_timings and options.timeout_history is not None:
+                result['timing_samples'] = options.timeout_history.take_new_samples()
+            if automation is not None and automation.driver:
+                automation.close()
+    result['passed'] = result['error'] is None and not result['failed_rows']
+    return result
+
+
+def run_scenarios_parallel(scenarios, options=None, workers=None, output_root='.'):
+    """
+    複数のシナリオCSVをワーカープロセスに分散して並列実行します。
+
+    Args:
+        scenarios (list): シナリオCSVファイルパスのリスト。
+        options (RunOptions): 実行オプション。Noneの場合は既定値。
+        workers (int): ワーカープロセス数。未指定の場合はCPUコア数。
+        output_root (str): ログとスクリーンショットの出力先ディレクトリ。
+
+    Returns:
+        list: 各シナリオの実行結果 (scenariosと同じ順序)。
+    """
+    options = options or RunOptions()
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output_root, exist_ok=True)
+
+    # 同名のシナリオが別ディレクトリにある場合は出力名が衝突しないよう連番を付ける
+    suffixes = []
+    seen_stems = {}
+    for path in scenarios:
+        stem = Path(path).stem
+        seen_stems[stem] = seen_stems.get(stem, 0) + 1
+        suffixes.append(f"_{seen_stems[stem]}" if seen_stems[stem] > 1 else '')
+
+    results = [None] * len(scenarios)
+    profile = resolve_profile(options.driver_profile, options.profiles)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(options.browser, options.max_session_uses, profile)) as executor:
+        futures = {
+            executor.submit(run_scenario, path, options, output_root, suffix, return_timings=True): i
+            for i, (path, suffix) in enumerate(zip(scenarios, suffixes))
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e: # ワーカープロセス自体が異常終了した場合
+                results[i] = {'scenario': scenarios[i], 'log_filepath': None, 'profile_report': None,
+                              'screenshot_dir': None, 'total': 0, 'failed_rows': [], 'error': str(e), 'passed': False}
+            status = "PASS" if results[i]['passed'] else "FAIL"
+            print(f"[{status}] {scenarios[i]}")
+    _save_timeout_history(options.timeout_history, results)
+    return results
+
+
+def print_summary(results):
+    """
+    並列実行した全シナリオの結果をまとめて表示します。
+
+    Args:
+        results (list): run_scenarios_parallelの戻り値。
+    """
+    passed = [r for r in results if r['passed']]
+    print("\n--- 実行結果サマリー ---")
+    for r in results:
+        status = "PASS" if r['passed'] else "FAIL"
+        line = f"[{status}] {r['scenario']} (実行行数: {r['total']}"
+        if r['failed_rows']:
+            line += f", エラー行: {r['failed_rows']}"
+        line += ")"
+        if r['error']:
+            line += f" 重大なエラー: {r['error']}"
+        if r['log_filepath']:
+            line += f" ログ: {r['log_filepath']}"
+        if r['profile_report']:
+            line += f" プロファイル: {r['profile_report']}"
+        if r.get('skipped'):
+            line += " (前回の実行結果)"
+        print(line)
+    print(f"合計: {len(results)} シナリオ / 成功: {len(passed)} / 失敗: {len(results) - len(passed)}")
+
+
+def _merge_failed_rows(result, key, commands, failed_rows):
+    """commands の行のうち failed_rows に含まれる行を result[key] の失敗した行に加えます。"""
+    rows = {command.row_number for command in commands} & failed_rows
+    if rows:
+        result[key] = sorted(set(result[key]) | rows)
+
+
+def run_shard(shard_name, prefix, iterations, suffix, options=None, output_root='.', profile=None, checkpoint=None,
+              return_timings=False):
+    """
+    変数定義CSVの複数行分のイテレーションを1つのブラウザで順に実行します。
+    forブロック外の準備処理 (prefix) は最初に1回だけ実行します。
+
+    Args:
+        shard_name (str): 出力名に使用するシャード名。
+        prefix (list): 'for' より前のコンパイル済みコマンド。
+        iterations (list): (イテレーション番号, コンパイル済みコマンドのリスト) のリスト。
+        suffix (list): 'forend' より後のコンパイル済みコマンド。
+        options (RunOptions): 実行オプション。Noneの場合は既定値。checkpoint_dir と rerun は使用しません。
+        output_root (str): ログとスクリーンショットの出力先ディレクトリ。
+        profile (DriverProfile): ヘッダー行の設定を反映したブラウザのドライバープロファイル。
+        checkpoint (RunCheckpoint): シャードの行ごとの実行結果とイテレーションの完了を記録するチェックポイント。
+        return_timings (bool): Trueの場合、timeout_history に今回の記録を保存せず、結果の 'timing_samples' に格納して返します。
+
+    Returns:
+        dict: シャードの実行結果。'iterations' にイテレーションごとの結果を格納します。
+    """
+    options = options or RunOptions()
+    from test_automation import build_output_paths
+    screenshot_dir, log_filepath = build_output_paths(shard_name, output_root, log_format=options.log_format)
+    profile_report = build_profile_path(log_filepath, options.profile_format)
+    result = {
+        'shard': shard_name,
+        'log_filepath': log_filepath,
+        'profile_report': profile_report,
+        'prefix_failed_rows': [],
+        'suffix_failed_rows': [],
+        'iterations': [],
+        'error': None,
+    }
+    automation = None
+    with _lease_driver(profile) as driver:
+        try:
+            automation = _create_automation(options, screenshot_dir, log_filepath, profile_report, profile,
+                                            driver=driver, checkpoint=checkpoint)
+            automation.scenario = shard_name
+            result['prefix_failed_rows'] = automation.execute_plan(prefix)['failed_rows']
+            for index, commands in iterations:
+                automation._log("INFO", f"=== 変数定義 行 {index + 2} のイテレーションを開始します ===")
+                automation.iteration = index
+                iteration_result = automation.execute_plan(commands)
+                if checkpoint is not None and not automation.budget_exceeded:
+                    checkpoint.end_iteration(index)
+                iteration_result.update({'iteration': index, 'log_filepath': log_filepath, 'error': None})
+                iteration_result['passed'] = not iteration_result['failed_rows']
+                result['iterations'].append(iteration_result)
+            automation.iteration = None
+            result['suffix_failed_rows'] = automation.execute_plan(suffix)['failed_rows']
+            # 保存に失敗したスクリーンショットは、撮影した行を含む準備処理・イテレーション・後処理の失敗として扱う
+            screenshot_failures = set(automation.wait_for_screenshots())
+            _merge_failed_rows(result, 'prefix_failed_rows', prefix, screenshot_failures)
+            for iteration_result, (_, commands) in zip(result['iterations'], iterations):
+                _merge_failed_rows(iteration_result, 'failed_rows', commands, screenshot_failures)
+                iteration_result['passed'] = not iteration_result['failed_rows']
+            _merge_failed_rows(result, 'suffix_failed_rows', suffix, screenshot_failures)
+        except Exception as e:
+            result['error'] = str(e)
+            if automation is not None:
+                automation._log("CRITICAL", f"テスト実行中に重大なエラーが発生しました: {e}")
+        finally:
+            if return_timings and options.timeout_history is not None:
+                result['timing_samples'] = options.timeout_history.take_new_samples()
+            if automation is not None and automation.driver:
+                automation.close()
+
+    # 重大なエラーで実行できなかったイテレーションは失敗として記録する
+    done = {r['iteration'] for r in result['iterations']}
+    for index, _ in iterations:
+        if index not in done:
+            result['iterations'].append({'iteration': index, 'log_filepath': log_filepath, 'total': 0,
+                                         'failed_rows': [], 'error': result['error'], 'passed': False})
+    return result
+
+
+def run_iterations_sharded(var_filepath, template_filepath, options=None, workers=None, output_root='.', sources=None):
+    """
+    テンプレートのforブロックを変数定義CSVの行単位に分割し、複数のブラウザで並列実行します。
+    各シャードは自身のブラウザで準備処理 (forより前の行) を実行した後、割り当てられたイテレーションを実行します。
+    ブラウザを起動する前に全イテレーションのコマンドを検証し、エラーがあれば実行しません。
+
+    Args:
+        var_filepath (str): 変数定義CSVファイルのパス。
+        template_filepath (str): コマンドテンプレートCSVファイルのパス。
+        options (RunOptions): 実行オプション。Noneの場合は既定値。
+        workers (int): ワーカープロセス数 (=ブラウザ数)。未指定の場合はCPUコア数。
+        output_root (str): ログとスクリーンショットの出力先ディレクトリ。
+        sources (dict): 'for' の2列目で指定するデータソース名から変数定義CSVファイルのパスへのマップ。
+
+    Returns:
+        tuple: (変数定義CSVの行順に並べたイテレーションごとの結果のリスト, シャードごとの結果のリスト)。
+            rerun で実行しなかったイテレーションは前回の結果を 'skipped' をTrueとして含めます。
+            テンプレートの読み込みまたは検証に失敗した場合はNone。
+    """
+    options = options or RunOptions()
+    units = build_iteration_units(var_filepath, template_filepath, sources)
+    if units is None:
+        return None
+    directives, warnings = parse_directives(units['header'])
+    for warning in warnings:
+        print(f"警告: {warning}")
+    try:
+        profile = _select_profile(directives, options.driver_profile, options.profiles)
+    except ValueError as e:
+        print(f"エラー: テンプレート '{template_filepath}': {e}")
+        return None
+    if not units['iterations']:
+        print("警告: 変数データがありません。実行するイテレーションはありません。")
+        return [], []
+
+    # 行番号は全イテレーションを展開した場合 (generate_commands_with_vars) のCSV上の行番号に合わせる
+    prefix, errors, _ = compile_rows(units['prefix'])
+    row_number = 2 + len(units['prefix'])
+    iterations = []
+    for index, rows in enumerate(units['iterations']):
+        commands, iteration_errors, _ = compile_rows(rows, row_number)
+        errors.extend(iteration_errors)
+        iterations.append((index, commands))
+        row_number += len(rows)
+    suffix, suffix_errors, _ = compile_rows(units['suffix'], row_number)
+    errors.extend(suffix_errors)
+    if errors:
+        print(f"エラー: テンプレート '{template_filepath}' の展開結果に {len(errors)} 件のエラーがあります:")
+        for error in errors:
+            print(error)
+        return None
+
+    all_iterations = [index for index, _ in iterations]
+    skipped_results = []
+    checkpoint_file = fingerprint = None
+    if options.checkpoint_dir:
+        fingerprint = file_fingerprint(template_filepath, var_filepath, *(sources or {}).values())
+        checkpoint, rerun = _prepare_checkpoint(template_filepath, fingerprint, options.checkpoint_dir, options.rerun)
+        checkpoint_file = checkpoint.filepath
+        # 前回のシャードごとのチェックポイントを1つのファイルに統合してから実行する
+        checkpoint.save()
+        remove_shard_checkpoints(checkpoint_file)
+        if rerun:
+            if rerun == RESUME:
+                targets = {index for index, _ in iterations if index not in checkpoint.iterations}
+            else:
+                targets = set(checkpoint.failed_iterations())
+            failed_rows = checkpoint.failed_rows()
+            for index, commands in iterations:
+                if index in targets:
+                    continue
+                rows = {command.row_number for command in commands}
+                iteration_failed_rows = [row_number for row_number in failed_rows if row_number in rows]
+                skipped_results.append({'iteration': index, 'log_filepath': None, 'total': 0,
+                                        'failed_rows': iteration_failed_rows, 'error': None,
+                                        'passed': not iteration_failed_rows, 'skipped': True})
+            iterations = [(index, commands) for index, commands in iterations if index in targets]
+            if not iterations:
+                print("前回の実行のチェックポイントを基に実行するイテレーションはありません。")
+                return skipped_results, []
+
+    workers = min(workers or os.cpu_count() or 1, len(iterations))
+    os.makedirs(output_root, exist_ok=True)
+    stem = Path(template_filepath).stem
+
+    shard_results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(options.browser, options.max_session_uses, profile)) as executor:
+        futures = [
+            executor.submit(run_shard, f"{stem}_shard{n + 1}", prefix, iterations[n::workers], suffix, options,
+                            output_root, profile,
+                            RunCheckpoint(shard_checkpoint_path(checkpoint_file, n + 1), fingerprint)
+                            if checkpoint_file else None, return_timings=True)
+            for n in range(workers)
+        ]
+        for n, future in enumerate(futures):
+            try:
+                shard_results.append(future.result())
+            except Exception as e: # ワーカープロセス自体が異常終了した場合
+                shard_results.append({
+                    'shard': f"{stem}_shard{n + 1}", 'log_filepath': None, 'profile_report': None, 'prefix_failed_rows': [],
+                    'suffix_failed_rows': [], 'error': str(e),
+                    'iterations': [{'iteration': index, 'log_filepath': None, 'total': 0, 'failed_rows': [],
+                                    'error': str(e), 'passed': False} for index, _ in iterations[n::workers]],
+                })
+    _save_timeout_history(options.timeout_history, shard_results)
+
+    if checkpoint_file:
+        merged = load_checkpoint(checkpoint_file, fingerprint)
+        if merged is not None:
+            if all(index in merged.iterations for index in all_iterations):
+                merged.mark_complete()
+            merged.save()
+            remove_shard_checkpoints(checkpoint_file)
+
+    iteration_results = sorted([r for shard in shard_results for r in shard['iterations']] + skipped_results,
+                               key=lambda r: r['iteration'])
+    return iteration_results, shard_results
+
+
+def run_template_stream(var_filepath, template_filepath, options=None, output_root='.', sources=None):
+    """
+    テンプレートを展開しながら1つのブラウザで実行します。中間のCSVファイルを作成せず、
+    展開した行を順に実行するため、変数定義CSVが大きくても最初のイテレーションからすぐに実行を開始します。
+
+    Args:
+        var_filepath (str): 変数定義CSVファイルのパス。
+        template_filepath (str): コマンドテンプレートCSVファイルのパス。
+        options (RunOptions): 実行オプション。Noneの場合は既定値。
+        output_root (str): ログとスクリーンショットの出力先ディレクトリ。
+        sources (dict): 'for' の2列目で指定するデータソース名から変数定義CSVファイルのパスへのマップ。
+
+    Returns:
+        dict: 実行結果 (run_scenario と同じ形式)。テンプレートを読み込めない場合はNone。
+    """
+    options = options or RunOptions()
+    try:
+        command_header, groups = open_template(template_filepath, var_filepath, sources, by_iteration=True)
+        directives, warnings = parse_directives(command_header)
+        profile = _select_profile(directives, options.driver_profile, options.profiles)
+    except FileNotFoundError as e:
+        print(f"エラー: ファイル '{e.filename}' が見つかりません。")
+        return None
+    except (TemplateError, StopIteration, ValueError) as e:
+        print(f"エラー: テンプレート '{template_filepath}' を読み込めません: {e}")
+        return None
+    for warning in warnings:
+        print(f"警告: {warning}")
+
+    os.makedirs(output_root, exist_ok=True)
+    from test_automation import build_output_paths
+    screenshot_dir, log_filepath = build_output_paths(template_filepath, output_root, log_format=options.log_format)
+    profile_report = build_profile_path(log_filepath, options.profile_format)
+    result = {
+        'scenario': template_filepath,
+        'log_filepath': log_filepath,
+        'profile_report': profile_report,
+        'screenshot_dir': screenshot_dir,
+        'total': 0,
+        'failed_rows': [],
+        'error': None,
+    }
+    checkpoint = None
+    rerun = options.rerun
+    if options.checkpoint_dir:
+        fingerprint = file_fingerprint(template_filepath, var_filepath, *(sources or {}).values())
+        checkpoint, rerun = _prepare_checkpoint(template_filepath, fingerprint, options.checkpoint_dir, rerun)
+        if rerun and not checkpoint.needs_rerun(rerun):
+            print("前回の実行のチェックポイントを基に実行する行はありません。")
+            result.update({'log_filepath': None, 'profile_report': None, 'screenshot_dir': None,
+                           'failed_rows': checkpoint.failed_rows(), 'skipped': True})
+            result['passed'] = not result['failed_rows']
+            return result
+    automation = None
+    try:
+        automation = _create_automation(options, screenshot_dir, log_filepath, profile_report, profile,
+                                        checkpoint=checkpoint)
+        automation.scenario = template_filepath
+        result.update(automation.execute_iterations(groups, rerun=rerun))
+        if checkpoint is not None:
+            if not automation.budget_exceeded and rerun != RERUN_FAILED:
+                checkpoint.mark_complete()
+            result['failed_rows'] = sorted(set(result['failed_rows']) | set(checkpoint.failed_rows()))
+    except Exception as e:
+        result['error'] = str(e)
+        if automation is not None:
+            automation._log("CRITICAL", f"テスト実行中に重大なエラーが発生しました: {e}")
+    finally:
+        if automation is not None and automation.driver:
+            automation.close()
+    result['passed'] = result['error'] is None and not result['failed_rows']
+    return result
+
+
+def print_iteration_summary(iteration_results, shard_results):
+    """
+    分割実行した全イテレーションの結果を変数定義CSVの行ごとに表示します。
+
+    Args:
+        iteration_results (list): イテレーションごとの結果のリスト。
+        shard_results (list): シャードごとの結果のリスト。
+    """
+    print("\n--- 実行結果サマリー (変数定義CSVの行ごと) ---")
+    for shard in shard_results:
+        if shard['prefix_failed_rows'] or shard['suffix_failed_rows'] or shard['error']:
+            print(f"[WARN] {shard['shard']}: 準備処理のエラー行: {shard['prefix_failed_rows']}, "
+                  f"終了処理のエラー行: {shard['suffix_failed_rows']}, 重大なエラー: {shard['error']}")
+    for r in iteration_results:
+        status = "PASS" if r['passed'] else "FAIL"
+        line = f"[{status}] 変数定義 行 {r['iteration'] + 2} (実行行数: {r['total']}"
+        if r['failed_rows']:
+            line += f", エラー行: {r['failed_rows']}"
+        line += ")"
+        if r['error']:
+            line += f" 重大なエラー: {r['error']}"
+        if r['log_filepath']:
+            line += f" ログ: {r['log_filepath']}"
+        if r.get('skipped'):
+            line += " (前回の実行結果)"
+        print(line)
+    passed = [r for r in iteration_results if r['passed']]
+    print(f"合計: {len(iteration_results)} イテレーション / 成功: {len(passed)} / 失敗: {len(iteration_results) - len(passed)}")
+
+
+def add_run_arguments(parser):
+    """
+    シナリオの実行方法のオプション (ブラウザ・出力先・ログ・チェックポイント・スクリーンショットなど) を parser に追加します。
+    parallel_runner.py と常駐モード (run_daemon.py) で共通のオプションです。
+    """
+    parser.add_argument('-b', '--browser', default='chrome', choices=['chrome', 'firefox'], help="使用するブラウザ")
+    parser.add_argument('-o', '--output-dir', default=None, help="ログとスクリーンショットの出力先ディレクトリ")
+    parser.add_argument('-q', '--quiet', action='store_true', help="ログをコンソールに出力しない (ログファイルのみ)")
+    parser.add_argument('--max-session-uses', type=int, default=20,
+                        help="各ワーカーが1つのブラウザを再利用するシナリオ数の上限 (1の場合は毎回起動)")
+    parser.add_argument('--batch', action='store_true',
+                        help="連続する input / log_content を1回のスクリプト実行でまとめて実行する")
+    parser.add_argument('--profile', choices=['json', 'csv'],
+                        help="コマンドごとの処理時間を集計したプロファイルレポートをログと同じ場所に保存する")
+    parser.add_argument('--adaptive-timeouts', nargs='?', const=DEFAULT_HISTORY_FILE, metavar='PATH',
+                        help="要素が表示されるまでの時間を記録し、記録から要素ごとの待機時間を算出する "
+                             f"(PATH 省略時: {DEFAULT_HISTORY_FILE})")
+    parser.add_argument('--timeout-floor', type=float, default=2.0,
+                        help="--adaptive-timeouts で算出する待機時間の下限（秒） (デフォルト: 2.0)")
+    parser.add_argument('--timeout-ceiling', type=float, default=30.0,
+                        help="--adaptive-timeouts で算出する待機時間の上限（秒） (デフォルト: 30.0)")
+    parser.add_argument('--timeout-factor', type=float, default=3.0,
+                        help="--adaptive-timeouts で記録の95パーセンタイルに掛ける安全係数 (デフォルト: 3.0)")
+    parser.add_argument('--time-budget', type=float, metavar='SECONDS',
+                        help="シナリオ (シャード) ごとの制限時間。超えた場合は残りの行を失敗として終了する")
+    rerun_group = parser.add_mutually_exclusive_group()
+    rerun_group.add_argument('--resume', action='store_const', const=RESUME, dest='rerun',
+                             help="前回のチェックポイントの続きから実行する (setup=True の行は再度実行する)")
+    rerun_group.add_argument('--rerun-failed', action='store_const', const=RERUN_FAILED, dest='rerun',
+                             help="前回失敗したイテレーション (シナリオCSVの場合は失敗した行) だけを実行する")
+    parser.add_argument('--checkpoint-dir', default=DEFAULT_CHECKPOINT_DIR,
+                        help=f"チェックポイントの保存先 (デフォルト: {DEFAULT_CHECKPOINT_DIR})")
+    parser.add_argument('--no-checkpoint', action='store_true', help="チェックポイントを記録しない")
+    parser.add_argument('--driver-profile', default=DEFAULT_PROFILE, metavar='NAME',
+                        help="ブラウザのドライバープロファイル (組み込み: default / headless / fast)。"
+                             "シナリオのヘッダー行の 'profile=' の設定が優先されます")
+    parser.add_argument('--driver-profiles', metavar='PATH', help="ドライバープロファイルを追加定義するJSONファイル")
+    parser.add_argument('--screenshot-store', nargs='?', const=DEFAULT_STORE_DIR, metavar='DIR',
+                        help="スクリーンショットを内容のハッシュで保存し、同じ画像を1回だけ保存するストアのディレクトリ "
+                             f"(DIR省略時: {DEFAULT_STORE_DIR})")
+    parser.add_argument('--screenshot-format', choices=list(ENCODERS),
+                        help="ストアに保存する画像の形式 (デフォルト: png。webpは可逆圧縮)")
+    parser.add_argument('--screenshot-compress-level', type=int, metavar='N',
+                        help="ストアに保存する画像の圧縮レベル (png: 0-9、webp: 0-6。低いほど速い)")
+    parser.add_argument('--skip-similar-screenshots', type=float, metavar='THRESHOLD',
+                        help="同じステップの前回の画像との差分 (0-1) がこの値以下の場合は保存しない (例: 0.005)")
+    parser.add_argument('--baseline-dir', default='baselines', metavar='DIR',
+                        help="assert_screenshot で比較するベースライン画像のディレクトリ (デフォルト: baselines)")
+    parser.add_argument('--update-baselines', action='store_true',
+                        help="assert_screenshot で比較せず、撮影した画像でベースライン画像を更新する")
+    parser.add_argument('--log-format', choices=['csv', 'jsonl'], default='csv',
+                        help="ログの形式。jsonl の場合はコマンドごとの結果を1行のJSONで記録し、サイズごとにファイルを分割する "
+                             "(log_report.py でHTMLレポートを作成できます)")
+
+
+def build_run_options(parser, args):
+    """
+    add_run_arguments で追加したオプションを検証し、run_scenario などに渡す実行オプションを作成します。
+
+    Args:
+        parser (argparse.ArgumentParser): オプションが不正な場合にエラーを表示するパーサー。
+        args (argparse.Namespace): 解析したコマンドライン引数。
+
+    Returns:
+        RunOptions: run_scenario / run_scenarios_parallel / run_iterations_sharded / run_template_stream の実行オプション。
+    """
+    if args.no_checkpoint and args.rerun:
+        parser.error("--resume / --rerun-failed は --no-checkpoint と同時に指定できません。")
+    timeout_history = None
+    if args.adaptive_timeouts:
+        if args.timeout_floor > args.timeout_ceiling:
+            parser.error("--timeout-floor は --timeout-ceiling 以下の値を指定してください。")
+        timeout_history = AdaptiveTimeouts(args.adaptive_timeouts, safety_factor=args.timeout_factor,
+                                           floor=args.timeout_floor, ceiling=args.timeout_ceiling)
+    try:
+        profiles = load_profiles(args.driver_profiles)
+        resolve_profile(args.driver_profile, profiles)
+    except (OSError, ValueError) as e:
+        parser.error(f"ドライバープロファイルを読み込めません: {e}")
+    screenshot_store = None
+    if args.screenshot_store:
+        try:
+            screenshot_store = ScreenshotStore(args.screenshot_store, encoder=args.screenshot_format or 'png',
+                                               compress_level=args.screenshot_compress_level,
+                                               similarity_threshold=args.skip_similar_screenshots)
+        except ValueError as e:
+            parser.error(str(e))
+    elif (args.screenshot_format or args.screenshot_compress_level is not None
+          or args.skip_similar_screenshots is not None):
+        parser.error("--screenshot-format / --screenshot-compress-level / --skip-similar-screenshots は "
+                     "--screenshot-store と組み合わせて指定してください。")
+    return RunOptions(browser=args.browser, log_echo=not args.quiet, max_session_uses=args.max_session_uses,
+                      batch_commands=args.batch, profile_format=args.profile, timeout_history=timeout_history,
+                      time_budget=args.time_budget, checkpoint_dir=None if args.no_checkpoint else args.checkpoint_dir,
+                      rerun=args.rerun, driver_profile=args.driver_profile, profiles=profiles,
+                      screenshot_store=screenshot_store, baseline_dir=args.baseline_dir,
+                      update_baselines=args.update_baselines, log_format=args.log_format)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="複数のシナリオCSVを並列で実行します。")
+    parser.add_argument('scenarios', nargs='*', help="シナリオCSVのディレクトリ、globパターン、またはファイルパス")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help="ワーカープロセス数 (デフォルト: CPUコア数)")
+    parser.add_argument('--template', help="forブロックを変数定義CSVの行単位で分割実行するコマンドテンプレートCSV")
+    parser.add_argument('--vars', help="--template と組み合わせて使用する変数定義CSV")
+    parser.add_argument('--data', action='append', metavar='NAME=PATH',
+                        help="テンプレートの 'for,NAME' で使用する名前付きデータソース (複数指定可)")
+    parser.add_argument('--stream', action='store_true',
+                        help="--template を分割せず、展開しながら1つのブラウザで順に実行する (中間CSVを作成しない)")
+    add_run_arguments(parser)
+    args = parser.parse_args(argv)
+    output_root = args.output_dir or f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    run_options = build_run_options(parser, args)
+
+    if args.template or args.vars:
+        if not args.template:
+            parser.error("--vars は --template と組み合わせて指定してください。")
+        try:
+            sources = parse_data_sources(args.data)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.stream:
+            print(f"'{args.template}' を展開しながら実行します。出力先: {output_root}")
+            result = run_template_stream(args.vars, args.template, run_options, output_root, sources)
+            if result is None:
+                return 1
+            print_summary([result])
+            return 0 if result['passed'] else 1
+        print(f"'{args.template}' のイテレーションを {args.workers} ワーカーで分割実行します。出力先: {output_root}")
+        sharded = run_iterations_sharded(args.vars, args.template, run_options, args.workers, output_root, sources)
+        if sharded is None:
+            return 1
+        iteration_results, shard_results = sharded
+        print_iteration_summary(iteration_results, shard_results)
+        return 0 if all(r['passed'] for r in iteration_results) else 1
+
+    scenarios = collect_scenarios(args.scenarios)
+    if not scenarios:
+        print("エラー: 実行対象のシナリオCSVが見つかりません。")
+        return 1
+
+    errors = validate_scenarios(scenarios, run_options.profiles)
+    if errors:
+        for error in errors:
+            print(f"エラー: {error}")
+        return 1
+
+    print(f"{len(scenarios)} 件のシナリオを {args.workers} ワーカーで実行します。出力先: {output_root}")
+    results = run_scenarios_parallel(scenarios, run_options, args.workers, output_root)
+    print_summary(results)
+    return 0 if all(r['passed'] for r in results) else 1
+
+
+def validate_main(argv=None):
+    parser = argparse.ArgumentParser(description="ブラウザを起動せずに、シナリオCSVとテンプレートの展開結果を検証します。")
+    parser.add_argument('scenarios', nargs='*', help="シナリオCSVのディレクトリ、globパターン、またはファイルパス")
+    parser.add_argument('--template', help="検証するコマンドテンプレートCSV (展開したすべての行を検証します)")
+    parser.add_argument('--vars', help="--template と組み合わせて使用する変数定義CSV")
+    parser.add_argument('--data', action='append', metavar='NAME=PATH',
+                        help="テンプレートの 'for,NAME' で使用する名前付きデータソース (複数指定可)")
+    parser.add_argument('--driver-profiles', metavar='PATH', help="ドライバープロファイルを追加定義するJSONファイル")
+    args = parser.parse_args(argv)
+    if not (args.scenarios or args.template):
+        parser.error("検証するシナリオCSVまたは --template を指定してください。")
+    if args.vars and not args.template:
+        parser.error("--vars は --template と組み合わせて指定してください。")
+    try:
+        sources = parse_data_sources(args.data)
+        profiles = load_profiles(args.driver_profiles)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    errors = []
+    checked = 0
+    if args.scenarios:
+        scenarios = collect_scenarios(args.scenarios)
+        if not scenarios:
+            errors.append("検証対象のシナリオCSVが見つかりません。")
+        errors.extend(validate_scenarios(scenarios, profiles))
+        checked += len(scenarios)
+    if args.template:
+        template_errors, rows = validate_template(args.template, args.vars, sources, profiles)
+        errors.extend(template_errors)
+        checked += 1
+        print(f"テンプレート '{args.template}': 展開した {rows} 行を検証しました。")
+    for error in errors:
+        print(f"エラー: {error}")
+    print(f"検証したファイル: {checked} 件 / エラー: {len(errors)} 件")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,287 @@
+import csv
+import json
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+# プロファイルレポートに出力するパーセンタイル
+REPORT_PERCENTILES = (50, 90, 95, 99)
+
+# プロファイルレポートに出力する処理時間の長い行の件数
+DEFAULT_SLOWEST_ROWS = 20
+
+
+@dataclass
+class CommandMetrics:
+    """1つのコマンドの計測結果。時間の単位は秒です。"""
+    row_number: int
+    command: str
+    duration: float = 0.0 # コマンド全体の処理時間
+    wait_time: float = 0.0 # 要素やページの準備を待機した時間
+    round_trips: int = 0 # WebDriverへのリクエスト数
+    bytes_written: int = 0 # スクリーンショットなどで書き込んだバイト数
+    failed: bool = False
+    phases: dict = field(default_factory=dict) # 内部処理 (フェーズ) ごとの処理時間
+
+
+def install_round_trip_counter(driver):
+    """
+    WebDriverへのリクエスト数を数えられるよう、driver.execute を計数する関数に置き換えます。
+    セッションプールで再利用されるWebDriverに重複して設定しないよう、設定済みの場合は何もしません。
+
+    Args:
+        driver (WebDriver): 対象のWebDriver。
+
+    Returns:
+        bool: 計数できる場合はTrue。
+    """
+    if hasattr(driver, '_round_trips'):
+        return True
+    execute = getattr(driver, 'execute', None)
+    if execute is None:
+        return False
+    driver._round_trips = 0
+
+    def counting_execute(*args, **kwargs):
+        driver._round_trips += 1
+        return execute(*args, **kwargs)
+
+    driver.execute = counting_execute
+    return True
+
+
+def percentile(sorted_values, p):
+    """
+    昇順に並んだ値のパーセンタイルを線形補間で求めます。
+
+    Args:
+        sorted_values (list): 昇順に並んだ数値のリスト。
+        p (float): パーセンタイル (0-100)。
+
+    Returns:
+        float: パーセンタイル値。値がない場合は0.0。
+    """
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class RunProfiler:
+    """
+    コマンドごとの処理時間・待機時間・WebDriverへのリクエスト数・書き込みバイト数を計測し、
+    実行終了時にコマンド種別ごとのパーセンタイルと処理時間の長い行をレポートにまとめます。
+
+    hooks には CommandMetrics を1つ受け取る関数を指定でき、各コマンドの終了時に呼び出されます
+    (独自の収集基盤への送信などに使用します)。スクリーンショットはバックグラウンドで保存されるため、
+    フックの呼び出し時点では bytes_written に含まれていないことがあります。レポートには含まれます。
+    """
+
+    def __init__(self, driver=None, hooks=None, warn=print):
+        """
+        Args:
+            driver (WebDriver): リクエスト数を計測するWebDriver。
+            hooks (list): 各コマンドの終了時に CommandMetrics を渡して呼び出す関数のリスト。
+            warn (callable): フックで初めてエラーが発生した場合にメッセージを渡す関数。
+        """
+        self.driver = driver
+        self.hooks = list(hooks or [])
+        self.metrics = [] # 実行したコマンドの CommandMetrics (実行順)
+        self._warn = warn
+        self._failed_hooks = set() # エラーを報告済みのフック (同じエラーを繰り返し出力しない)
+        self._current = None
+        self._started = None
+        self._round_trips_at_start = 0
+        self._lock = threading.Lock()
+        self._by_row = {} # 行番号 -> 最後に実行した CommandMetrics (書き込みバイト数の加算用)
+        if driver is not None:
+            install_round_trip_counter(driver)
+
+    def add_hook(self, hook):
+        """各コマンドの終了時に CommandMetrics を渡して呼び出す関数を追加します。"""
+        self.hooks.append(hook)
+
+    def round_trips(self):
+        """これまでのWebDriverへのリクエスト数を返します (計数できない場合は0)。"""
+        return getattr(self.driver, '_round_trips', 0)
+
+    def start_command(self, row_number, command):
+        """
+        コマンドの計測を開始します。
+
+        Args:
+            row_number (int): コマンドの行番号。
+            command (str): コマンド名。
+        """
+        self._current = CommandMetrics(row_number, command)
+        self._started = time.monotonic()
+        self._round_trips_at_start = self.round_trips()
+
+    def finish_command(self, wait_time=0.0, failed=False):
+        """
+        実行中のコマンドの計測を終了し、フックを呼び出します。
+
+        Args:
+            wait_time (float): コマンドで待機した合計時間（秒）。
+            failed (bool): コマンドが失敗したかどうか。
+
+        Returns:
+            CommandMetrics: 計測結果。計測中のコマンドがない場合はNone。
+        """
+        metrics = self._current
+        if metrics is None:
+            return None
+        metrics.duration = time.monotonic() - self._started
+        metrics.wait_time = wait_time
+        metrics.round_trips = self.round_trips() - self._round_trips_at_start
+        metrics.failed = failed
+        self._current = None
+        self._record(metrics)
+        return metrics
+
+    def record_batch(self, commands, duration, round_trips):
+        """
+        まとめて実行したコマンドを記録します。処理時間は件数で等分し、リクエスト数は先頭のコマンドに計上します。
+
+        Args:
+            commands (list): まとめて実行した Command のリスト。
+            duration (float): まとめて実行した処理時間（秒）。
+            round_trips (int): まとめて実行したWebDriverへのリクエスト数。
+        """
+        for i, command in enumerate(commands):
+            metrics = CommandMetrics(command.row_number, command.name, duration=duration / len(commands),
+                                     round_trips=round_trips if i == 0 else 0, phases={'batch': duration / len(commands)})
+            self._record(metrics)
+
+    def _record(self, metrics):
+        with self._lock:
+            self.metrics.append(metrics)
+            self._by_row[metrics.row_number] = metrics
+        for hook in self.hooks:
+            try:
+                hook(metrics)
+            except Exception as e:
+                if id(hook) not in self._failed_hooks:
+                    self._failed_hooks.add(id(hook))
+                    self._warn(f"計測結果の送信中にエラーが発生しました (以降のエラーは出力しません): {e}")
+
+    @contextmanager
+    def phase(self, name):
+        """
+        with ブロックの処理時間を実行中のコマンドのフェーズとして記録します。同じ名前のフェーズは合算します。
+
+        Args:
+            name (str): フェーズ名 (例: 'navigate.get')。
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            if self._current is not None:
+                phases = self._current.phases
+                phases[name] = phases.get(name, 0.0) + time.monotonic() - start
+
+    def add_bytes(self, row_number, nbytes):
+        """
+        コマンドで書き込んだバイト数を加算します。バックグラウンドの保存処理から呼び出されます。
+
+        Args:
+            row_number (int): 書き込みを行ったコマンドの行番号。
+            nbytes (int): 書き込んだバイト数。
+        """
+        with self._lock:
+            if self._current is not None and self._current.row_number == row_number:
+                self._current.bytes_written += nbytes
+            elif row_number in self._by_row:
+                self._by_row[row_number].bytes_written += nbytes
+
+    def summary(self, slowest=DEFAULT_SLOWEST_ROWS):
+        """
+        計測結果を集計します。
+
+        Args:
+            slowest (int): 処理時間の長い行として出力する件数。
+
+        Returns:
+            dict: 全体の集計 ('totals')、コマンド種別ごとの集計 ('by_command')、
+                処理時間の長い行 ('slowest') を含む辞書。
+        """
+        with self._lock:
+            metrics = list(self.metrics)
+
+        by_command = {}
+        for name in sorted({m.command for m in metrics}):
+            items = [m for m in metrics if m.command == name]
+            durations = sorted(m.duration for m in items)
+            phases = {}
+            for m in items:
+                for phase, seconds in m.phases.items():
+                    phases[phase] = phases.get(phase, 0.0) + seconds
+            stats = {
+                'count': len(items),
+                'failed': sum(1 for m in items if m.failed),
+                'total': sum(durations),
+                'mean': sum(durations) / len(durations),
+                'max': durations[-1],
+            }
+            for p in REPORT_PERCENTILES:
+                stats[f'p{p}'] = percentile(durations, p)
+            stats.update({
+                'wait_time': sum(m.wait_time for m in items),
+                'round_trips': sum(m.round_trips for m in items),
+                'bytes_written': sum(m.bytes_written for m in items),
+                'phases': phases,
+            })
+            by_command[name] = stats
+
+        return {
+            'totals': {
+                'commands': len(metrics),
+                'failed': sum(1 for m in metrics if m.failed),
+                'duration': sum(m.duration for m in metrics),
+                'wait_time': sum(m.wait_time for m in metrics),
+                'round_trips': sum(m.round_trips for m in metrics),
+                'bytes_written': sum(m.bytes_written for m in metrics),
+            },
+            'by_command': by_command,
+            'slowest': [asdict(m) for m in sorted(metrics, key=lambda m: m.duration, reverse=True)[:slowest]],
+        }
+
+    def write_report(self, filepath, slowest=DEFAULT_SLOWEST_ROWS):
+        """
+        プロファイルレポートを保存します。拡張子が .csv の場合はCSV、それ以外はJSONで保存します。
+        CSVでは1列目 (section) が 'command' の行にコマンド種別ごとの集計、'slowest' の行に処理時間の長い行を出力します。
+
+        Args:
+            filepath (str): 保存先のパス。
+            slowest (int): 処理時間の長い行として出力する件数。
+
+        Returns:
+            dict: 保存した集計結果 (summary() の戻り値)。
+        """
+        report = self.summary(slowest)
+        if not filepath.lower().endswith('.csv'):
+            with open(filepath, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            return report
+
+        stat_columns = ['count', 'failed', 'total', 'mean'] + [f'p{p}' for p in REPORT_PERCENTILES] + ['max']
+        columns = (['section', 'command', 'row_number'] + stat_columns
+                   + ['duration', 'wait_time', 'round_trips', 'bytes_written', 'phases'])
+        with open(filepath, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=columns, restval='')
+            writer.writeheader()
+            for name, stats in report['by_command'].items():
+                row = {key: value for key, value in stats.items() if key in columns}
+                row.update({'section': 'command', 'command': name,
+                            'phases': json.dumps(stats['phases'], ensure_ascii=False)})
+                writer.writerow(row)
+            for item in report['slowest']:
+                row = {key: value for key, value in item.items() if key in columns}
+                row.update({'section': 'slowest', 'failed': int(item['failed']),
+                            'phases': json.dumps(item['phases'], ensure_ascii=False)})
+                writer.writerow(row)
+        return report
@@ -0,0 +1,308 @@
+import argparse
+import hmac
+import json
+import os
+import secrets
+import socket
+import socketserver
+import time
+from datetime import datetime
+
+from driver_profiles import resolve_profile
+from parallel_runner import (RunOptions, add_run_arguments, build_run_options, close_session_pool, collect_scenarios,
+                             open_session_pool, print_summary, run_scenario, validate_scenarios)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# 常駐プロセスの接続先とトークンを記録するファイル (submit はこのファイルから接続先を読み込む)
+DEFAULT_INFO_FILE = '.scenario_daemon.json'
+
+# 1件のリクエスト (1行のJSON) の最大サイズ（バイト）
+MAX_REQUEST_BYTES = 1024 * 1024
+
+
+class ScenarioDaemon:
+    """
+    ブラウザを起動したまま常駐し、ローカルのソケットで受け付けたシナリオを1件ずつ順に実行します。
+    Pythonの起動・モジュールの読み込み・ブラウザの起動はプロセスの開始時に1回だけ行い、
+    各シナリオの間は SessionPool がブラウザの状態 (Cookie・ストレージなど) をリセットします。
+
+    リクエストと応答は1行に1つのJSON (UTF-8) です。1つの接続で複数のリクエストを順に送れます。
+        {"action": "run", "token": ..., "scenario": "シナリオCSVの絶対パス", "output_dir": "出力先 (省略可)"}
+            -> run_scenario の結果に 'job' (ジョブ番号) と 'elapsed' (秒) を加えたもの
+        {"action": "ping", "token": ...} -> {"status": "ok", "pid": ..., "jobs": 実行したジョブ数}
+        {"action": "shutdown", "token": ...} -> {"status": "ok"} (応答後に終了する)
+    """
+
+    def __init__(self, output_root='.', run_options=None, token=None):
+        """
+        Args:
+            output_root (str): リクエストで出力先を指定しない場合のログとスクリーンショットの出力先。
+            run_options (RunOptions): run_scenario に渡す実行オプション (parallel_runner.build_run_options の戻り値)。
+                ブラウザ・ドライバープロファイル・ブラウザを再利用するシナリオ数の上限もこの値を使用します。
+            token (str): リクエストに含める必要があるトークン。Noneの場合は作成します。
+        """
+        self.output_root = output_root
+        self.run_options = run_options or RunOptions()
+        self.token = token or secrets.token_hex(16)
+        self.jobs = 0
+        self.stopping = False
+
+    def start(self):
+        """ブラウザを起動し、最初のシナリオを受け付ける前に準備を済ませます。"""
+        options = self.run_options
+        profile = resolve_profile(options.driver_profile, options.profiles)
+        open_session_pool(options.browser, options.max_session_uses, profile, prewarm=True)
+
+    def close(self):
+        """ブラウザを終了します。"""
+        close_session_pool()
+
+    def handle(self, request):
+        """
+        1件のリクエストを処理し、応答を返します。
+
+        Args:
+            request (dict): 受け付けたリクエスト。
+
+        Returns:
+            dict: 応答。リクエストが不正な場合は 'error' にメッセージを格納します。
+        """
+        if not isinstance(request, dict) or not hmac.compare_digest(str(request.get('token', '')), self.token):
+            return {'error': "トークンが一致しません。"}
+        action = request.get('action', 'run')
+        if action == 'ping':
+            return {'status': 'ok', 'pid': os.getpid(), 'jobs': self.jobs}
+        if action == 'shutdown':
+            self.stopping = True
+            return {'status': 'ok'}
+        if action == 'run':
+            return self.run_job(request)
+        return {'error': f"不明なリクエストです: '{action}'"}
+
+    def run_job(self, request):
+        """シナリオを検証して実行し、結果を返します。"""
+        scenario = request.get('scenario')
+        if not scenario or not os.path.isfile(scenario):
+            return _rejected(scenario, f"シナリオCSVが見つかりません: {scenario}")
+        errors = validate_scenarios([scenario], self.run_options.profiles)
+        if errors:
+            return _rejected(scenario, ' / '.join(errors))
+
+        self.jobs += 1
+        start = time.perf_counter()
+        output_root = request.get('output_dir') or self.output_root
+        os.makedirs(output_root, exist_ok=True)
+        # 同じシナリオを1秒以内に続けて実行しても出力先が重ならないよう、ジョブ番号を付ける
+        result = run_scenario(scenario, self.run_options, output_root, f"_job{self.jobs}")
+        result['job'] = self.jobs
+        result['elapsed'] = round(time.perf_counter() - start, 3)
+        status = "PASS" if result['passed'] else "FAIL"
+        print(f"[{status}] ジョブ {self.jobs}: {scenario} ({result['elapsed']:.1f} 秒)")
+        return result
+
+    def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, info_file=DEFAULT_INFO_FILE):
+        """
+        リクエストの受け付けを開始し、shutdown のリクエストまたは Ctrl+C で終了するまで処理します。
+
+        Args:
+            host (str): 待ち受けるアドレス。他のマシンから接続できないよう、通常はループバックアドレスを指定します。
+            port (int): 待ち受けるポート。0の場合は空いているポートを使用します。
+            info_file (str): 接続先とトークンを書き込むファイル。終了時に削除します。
+        """
+        with _DaemonServer((host, port), _RequestHandler) as server:
+            server.scenario_daemon = self
+            host, port = server.server_address[:2]
+            _write_info_file(info_file, {'host': host, 'port': port, 'token': self.token, 'pid': os.getpid()})
+            print(f"シナリオの受け付けを開始しました: {host}:{port} (接続情報: {info_file})")
+            try:
+                while not self.stopping:
+                    server.handle_request()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                if os.path.exists(info_file):
+                    os.remove(info_file)
+        print(f"常駐プロセスを終了します (実行したジョブ: {self.jobs} 件)。")
+
+
+def _rejected(scenario, message):
+    """実行しなかったシナリオの結果 (run_scenario の結果と同じ形式)。"""
+    return {'scenario': scenario, 'log_filepath': None, 'profile_report': None, 'screenshot_dir': None, 'total': 0,
+            'failed_rows': [], 'error': message, 'passed': False}
+
+
+class _DaemonServer(socketserver.TCPServer):
+    allow_reuse_address = True
+    request_queue_size = 128 # 実行中に接続してきたクライアントを待たせておく数
+    timeout = 1 # shutdown の確認と Ctrl+C を受け付ける間隔（秒）
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        daemon = self.server.scenario_daemon
+        while not daemon.stopping:
+            line = self.rfile.readline(MAX_REQUEST_BYTES + 1)
+            if not line:
+                break
+            if len(line) > MAX_REQUEST_BYTES:
+                self._respond({'error': "リクエストが大きすぎます。"})
+                break
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {'error': f"リクエストをJSONとして読み込めません: {e}"}
+            else:
+                response = daemon.handle(request)
+            self._respond(response)
+
+    def _respond(self, response):
+        self.wfile.write((json.dumps(response, ensure_ascii=False, default=str) + '\n').encode('utf-8'))
+        self.wfile.flush()
+
+
+def _write_info_file(filepath, info):
+    # トークンを他のユーザーが読めないよう、所有者だけが読み書きできるファイルとして作成する
+    fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(info, f)
+
+
+def load_info_file(filepath=DEFAULT_INFO_FILE):
+    """
+    常駐プロセスの接続情報を読み込みます。
+
+    Returns:
+        dict: 'host'、'port'、'token'、'pid' を含む接続情報。
+
+    Raises:
+        OSError: ファイルがない場合 (常駐プロセスが起動していない場合)。
+    """
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class DaemonClient:
+    """常駐プロセスにリクエストを送るクライアントです。1つの接続で複数のリクエストを順に送れます。"""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, token='', timeout=None):
+        """
+        Args:
+            host (str): 常駐プロセスのアドレス。
+            port (int): 常駐プロセスのポート。
+            token (str): 常駐プロセスのトークン (接続情報のファイルに記録されています)。
+            timeout (float): 応答を待つ最大時間（秒）。Noneの場合はシナリオの実行が終わるまで待ちます。
+        """
+        self.token = token
+        self._socket = socket.create_connection((host, port), timeout=timeout)
+        self._file = self._socket.makefile('rwb')
+
+    @classmethod
+    def from_info_file(cls, filepath=DEFAULT_INFO_FILE, timeout=None):
+        """接続情報のファイルを読み込んで接続します。"""
+        info = load_info_file(filepath)
+        return cls(info['host'], info['port'], info['token'], timeout)
+
+    def request(self, action, **fields):
+        """リクエストを送り、応答を返します。"""
+        request = dict(fields, action=action, token=self.token)
+        self._file.write((json.dumps(request, ensure_ascii=False) + '\n').encode('utf-8'))
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("常駐プロセスが応答せずに接続を閉じました。")
+        return json.loads(line)
+
+    def run(self, scenario, output_dir=None):
+        """シナリオを実行し、実行結果を返します。相対パスは現在のディレクトリからの絶対パスに変換して送ります。"""
+        return self.request('run', scenario=os.path.abspath(scenario),
+                            output_dir=os.path.abspath(output_dir) if output_dir else None)
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ブラウザを起動したまま常駐し、submit で送られたシナリオを順に実行します。")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"待ち受けるアドレス (デフォルト: {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f"待ち受けるポート。0の場合は空いているポート (デフォルト: {DEFAULT_PORT})")
+    parser.add_argument('--info-file', default=DEFAULT_INFO_FILE,
+                        help=f"接続先とトークンを書き込むファイル (デフォルト: {DEFAULT_INFO_FILE})")
+    add_run_arguments(parser)
+    args = parser.parse_args(argv)
+    # 結果のログのパスを submit を実行したディレクトリからも参照できるよう、絶対パスにする
+    output_root = os.path.abspath(args.output_dir or f"daemon_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    run_options = build_run_options(parser, args)
+
+    daemon = ScenarioDaemon(output_root, run_options)
+    try:
+        daemon.start()
+        daemon.serve(args.host, args.port, args.info_file)
+    except OSError as e:
+        print(f"エラー: 常駐プロセスを開始できません: {e}")
+        return 1
+    finally:
+        daemon.close()
+    return 0
+
+
+def submit_main(argv=None):
+    parser = argparse.ArgumentParser(description="常駐プロセス (run_daemon.py) にシナリオを送って実行します。")
+    parser.add_argument('scenarios', nargs='*', help="シナリオCSVのディレクトリ、globパターン、またはファイルパス")
+    parser.add_argument('-o', '--output-dir', help="ログとスクリーンショットの出力先 (省略時は常駐プロセスの出力先)")
+    parser.add_argument('--info-file', default=DEFAULT_INFO_FILE,
+                        help=f"常駐プロセスの接続情報のファイル (デフォルト: {DEFAULT_INFO_FILE})")
+    parser.add_argument('--timeout', type=float, help="1件のシナリオの応答を待つ最大時間（秒）")
+    parser.add_argument('--ping', action='store_true', help="常駐プロセスの状態を表示する")
+    parser.add_argument('--shutdown', action='store_true', help="常駐プロセスを終了する")
+    args = parser.parse_args(argv)
+    if not (args.scenarios or args.ping or args.shutdown):
+        parser.error("実行するシナリオ、--ping または --shutdown を指定してください。")
+
+    scenarios = collect_scenarios(args.scenarios)
+    if args.scenarios and not scenarios:
+        print("エラー: 実行対象のシナリオCSVが見つかりません。")
+        return 1
+    try:
+        client = DaemonClient.from_info_file(args.info_file, args.timeout)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"エラー: 常駐プロセスに接続できません ({args.info_file}): {e}")
+        return 1
+    results = []
+    try:
+        with client:
+            if args.ping:
+                response = client.request('ping')
+                print(response.get('error') or f"常駐プロセスは稼働中です (PID: {response['pid']}, "
+                                                f"実行したジョブ: {response['jobs']} 件)")
+            for scenario in scenarios:
+                result = client.run(scenario, args.output_dir)
+                if 'job' not in result and 'scenario' not in result: # トークンの不一致など
+                    print(f"エラー: {result.get('error')}")
+                    return 1
+                results.append(result)
+            if args.shutdown:
+                client.request('shutdown')
+                print("常駐プロセスを終了しました。")
+    except (OSError, ValueError) as e:
+        print(f"エラー: 常駐プロセスとの通信中にエラーが発生しました: {e}")
+        return 1
+    if results:
+        print_summary(results)
+    return 0 if all(r['passed'] for r in results) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
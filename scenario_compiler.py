@@ -0,0 +1,264 @@
+import csv
+import hashlib
+import io
+import json
+import os
+from dataclasses import asdict, dataclass, field
+
+# 実行計画の形式を変更した場合はキャッシュを無効化するため値を上げる
+PLAN_FORMAT_VERSION = 7
+
+DEFAULT_CACHE_DIR = '.scenario_cache'
+
+# _get_element がサポートするセレクタタイプ (seleniumを読み込まずに検証するため名前のみ保持する)
+SELECTOR_TYPES = ('id', 'name', 'class_name', 'xpath', 'css_selector', 'link_text', 'partial_link_text', 'tag_name')
+
+# コマンドごとの必須項目とオプションの型
+# 'selector': セレクタタイプ・セレクタ値が必要, 'value': 値／ファイルパスが必要
+# 'optional' に 'selector' を含むコマンドは、セレクタを指定した場合だけセレクタタイプを検証する
+COMMAND_SPECS = {
+    'navigate': {'requires': ('value',), 'options': {'wait_time': int}},
+    'input': {'requires': ('selector',), 'options': {'timeout': float}},
+    'click': {'requires': ('selector',), 'options': {'wait_time': int, 'timeout': float}},
+    'screenshot': {'requires': ('value',), 'options': {'remark': str, 'full_page': bool, 'step': str}},
+    'log_content': {'requires': ('selector',), 'options': {'remark': str, 'timeout': float}},
+    'log_remark': {'requires': (), 'options': {'remark': str}},
+    'assert_screenshot': {'requires': ('value',), 'optional': ('selector',),
+                          'options': {'tolerance': float, 'mask': str, 'full_page': bool, 'remark': str}},
+}
+
+# すべてのコマンドで使用できるオプション
+# setup: 前回の続きから実行する場合 (--resume など) に、実行済みでも再度実行する準備処理の行 (ログインなど)
+COMMON_OPTIONS = {'setup': bool}
+
+# ヘッダー行に 'key=value' の形式で記述できるシナリオ全体の設定
+# profile: 使用するドライバープロファイル (driver_profiles.py)
+HEADER_DIRECTIVES = ('profile',)
+
+
+class ScenarioCompileError(Exception):
+    """シナリオの検証でエラーが見つかった場合に発生します。すべてのエラーを errors に保持します。"""
+
+    def __init__(self, source, errors):
+        self.source = source
+        self.errors = errors
+        super().__init__(f"シナリオ '{source}' に {len(errors)} 件のエラーがあります:\n" + "\n".join(errors))
+
+
+@dataclass(frozen=True)
+class Command:
+    """型変換済みのオプションを持つ1行分のコマンド。"""
+    row_number: int # CSVファイル上の行番号
+    name: str
+    selector_type: str = ''
+    selector_value: str = ''
+    value: str = '' # 入力値、URL、ファイル名、またはlog_contentの取得内容
+    options: dict = field(default_factory=dict)
+    detail: str = '' # ログ出力用のコマンド説明
+
+
+@dataclass
+class ExecutionPlan:
+    """コンパイル済みのシナリオ。"""
+    source: str
+    file_hash: str
+    commands: list
+    warnings: list
+    directives: dict = field(default_factory=dict) # ヘッダー行の設定 (parse_directives の戻り値)
+
+    def to_json(self):
+        """キャッシュに保存するJSONの文字列に変換します。source はキャッシュには保存しません。"""
+        return json.dumps({'file_hash': self.file_hash, 'commands': [asdict(command) for command in self.commands],
+                           'warnings': self.warnings, 'directives': self.directives}, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, source, text):
+        """to_json() で保存したJSONの文字列から実行計画を復元します。"""
+        data = json.loads(text)
+        commands = [Command(**command) for command in data['commands']]
+        return cls(source, data['file_hash'], commands, data['warnings'], data['directives'])
+
+
+def _convert_option(key, raw, option_type):
+    """オプション値を指定された型に変換します。変換できない場合はValueErrorを発生させます。"""
+    if option_type is int:
+        return int(raw)
+    if option_type is float:
+        value = float(raw)
+        if not value >= 0:
+            raise ValueError(f"'{key}' には0以上の数値を指定してください: {raw}")
+        return value
+    if option_type is bool:
+        if raw.lower() not in ('true', 'false'):
+            raise ValueError(f"'{key}' には True または False を指定してください: {raw}")
+        return raw.lower() == 'true'
+    return raw
+
+
+def parse_directives(header):
+    """
+    ヘッダー行から 'key=value' の形式の設定を読み込みます (例: 7列目に 'profile=fast')。
+
+    Args:
+        header (list): シナリオCSVまたはコマンドテンプレートCSVのヘッダー行。
+
+    Returns:
+        tuple: (設定名から値へのマップ, 警告メッセージのリスト)。
+    """
+    directives = {}
+    warnings = []
+    for cell in header:
+        if '=' not in cell:
+            continue
+        key, value = (part.strip() for part in cell.split('=', 1))
+        if key.lower() not in HEADER_DIRECTIVES:
+            warnings.append(f"行 1: 不明なヘッダーの設定です: '{key}' (使用可能: {', '.join(HEADER_DIRECTIVES)})")
+            continue
+        directives[key.lower()] = value
+    return directives, warnings
+
+
+def compile_row(row, row_number):
+    """
+    CSVの1行を検証し、Commandに変換します。
+
+    Args:
+        row (list): コマンド行。
+        row_number (int): CSVファイル上の行番号。
+
+    Returns:
+        tuple: (Command または None, エラーメッセージのリスト, 警告メッセージのリスト)。
+    """
+    errors = []
+    warnings = []
+    cells = [cell.strip() for cell in row] + [''] * (6 - len(row))
+    command, selector_type, selector_value, value_or_path, option1, option2 = cells[:6]
+    command = command.lower()
+
+    raw_options = {}
+    for opt_str in [option1, option2]:
+        if '=' in opt_str:
+            key, val = opt_str.split('=', 1)
+            raw_options[key.strip()] = val.strip()
+
+    command_detail = f"コマンド: {command}"
+    if selector_type: command_detail += f", セレクタタイプ: {selector_type}"
+    if selector_value: command_detail += f", セレクタ値: {selector_value}"
+    if value_or_path: command_detail += f", 内容/ファイルパス/属性: {value_or_path}"
+    if raw_options: command_detail += f", オプション: {raw_options}"
+
+    spec = COMMAND_SPECS.get(command)
+    if spec is None:
+        errors.append(f"行 {row_number}: 不明なコマンドです: '{command}'")
+        return None, errors, warnings
+
+    if 'selector' in spec['requires']:
+        if selector_type.lower() not in SELECTOR_TYPES:
+            errors.append(f"行 {row_number}: 無効なセレクタタイプです: '{selector_type}' (使用可能: {', '.join(SELECTOR_TYPES)})")
+        if not selector_value or selector_value == '-':
+            errors.append(f"行 {row_number}: '{command}' にはセレクタ値が必要です。")
+    elif 'selector' in spec.get('optional', ()) and selector_type and selector_type != '-':
+        if selector_type.lower() not in SELECTOR_TYPES:
+            errors.append(f"行 {row_number}: 無効なセレクタタイプです: '{selector_type}' (使用可能: {', '.join(SELECTOR_TYPES)})")
+        if not selector_value or selector_value == '-':
+            errors.append(f"行 {row_number}: '{command}' にはセレクタ値が必要です。")
+    if 'value' in spec['requires'] and (not value_or_path or value_or_path == '-'):
+        errors.append(f"行 {row_number}: '{command}' には値／ファイルパスが必要です。")
+
+    options = {}
+    for key, raw in raw_options.items():
+        option_type = spec['options'].get(key, COMMON_OPTIONS.get(key))
+        if option_type is None:
+            warnings.append(f"行 {row_number}: '{command}' では使用されないオプションです: '{key}'")
+            options[key] = raw
+            continue
+        try:
+            options[key] = _convert_option(key, raw, option_type)
+        except ValueError as e:
+            errors.append(f"行 {row_number}: オプション '{key}' の値が不正です: {e}")
+
+    if errors:
+        return None, errors, warnings
+    return Command(row_number, command, selector_type, selector_value, value_or_path, options, command_detail), errors, warnings
+
+
+def compile_rows(rows, first_row_number=2):
+    """
+    コマンド行をまとめて検証し、Commandのリストに変換します。空行は無視します。
+
+    Args:
+        rows (iterable): コマンド行 (ヘッダーを除いたCSVの行)。
+        first_row_number (int): 最初の行のCSVファイル上の行番号。
+
+    Returns:
+        tuple: (Commandのリスト, エラーメッセージのリスト, 警告メッセージのリスト)。
+    """
+    commands = []
+    errors = []
+    warnings = []
+    for i, row in enumerate(rows):
+        if not any(cell.strip() for cell in row):
+            continue
+        command, row_errors, row_warnings = compile_row(row, first_row_number + i)
+        errors.extend(row_errors)
+        warnings.extend(row_warnings)
+        if command is not None:
+            commands.append(command)
+    return commands, errors, warnings
+
+
+def compile_scenario(csv_filepath, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    シナリオCSVを検証して実行計画に変換します。
+    結果はファイル内容のハッシュをキーとしてJSONでキャッシュされ、同じ内容のファイルは再解析しません。
+
+    Args:
+        csv_filepath (str): シナリオCSVファイルのパス。
+        cache_dir (str): 実行計画のキャッシュディレクトリ。Noneの場合はキャッシュを使用しません。
+
+    Returns:
+        ExecutionPlan: コンパイル済みの実行計画。
+
+    Raises:
+        ScenarioCompileError: シナリオにエラーがある場合 (すべてのエラーを含みます)。
+    """
+    with open(csv_filepath, 'rb') as f:
+        data = f.read()
+    file_hash = hashlib.sha256(data).hexdigest()
+
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, f"{file_hash}.v{PLAN_FORMAT_VERSION}.json")
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                plan = ExecutionPlan.from_json(csv_filepath, f.read())
+            if plan.file_hash == file_hash:
+                return plan
+            print(f"警告: 実行計画のキャッシュがファイルの内容と一致しません。再解析します: {cache_path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"警告: 実行計画のキャッシュを読み込めませんでした。再解析します: {e}")
+
+    try:
+        text = data.decode('sjis')
+    except UnicodeDecodeError as e:
+        raise ScenarioCompileError(csv_filepath, [f"ファイルをShift-JISとして読み込めません: {e}"])
+    reader = csv.reader(io.StringIO(text, newline=''))
+    directives, warnings = parse_directives(next(reader, None) or [])
+    commands, errors, row_warnings = compile_rows(reader)
+    warnings.extend(row_warnings)
+    if errors:
+        raise ScenarioCompileError(csv_filepath, errors)
+
+    plan = ExecutionPlan(csv_filepath, file_hash, commands, warnings, directives)
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(plan.to_json())
+            os.replace(tmp_path, cache_path) # 並列実行時に読み込み途中のファイルを参照しないよう置き換える
+        except Exception as e:
+            print(f"警告: 実行計画のキャッシュを保存できませんでした: {e}")
+    return plan
@@ -0,0 +1,119 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fullpage_capture import save_captured_page
+
+
+def write_png_bytes(png_bytes, filepath):
+    """撮影したPNGのバイト列をそのままファイルに書き込み、書き込んだバイト数を返します。"""
+    with open(filepath, 'wb') as f:
+        f.write(png_bytes)
+    return len(png_bytes)
+
+
+class ScreenshotWriter:
+    """
+    撮影した画像のデコード・結合・圧縮・保存をバックグラウンドで行います。
+    未処理の画像が max_pending 件に達すると、空きができるまで submit() が待機します (バックプレッシャー)。
+    """
+
+    def __init__(self, max_workers=2, max_pending=8, use_processes=False, on_saved=None):
+        """
+        Args:
+            max_workers (int): 保存処理を行うワーカー数。
+            max_pending (int): 保存待ちにできる画像の最大件数。
+            use_processes (bool): Trueの場合はスレッドではなくプロセスプールで保存処理を行います。
+            on_saved (callable): 保存が成功するたびに (行番号, 書き込んだバイト数) を渡して呼び出す関数。
+        """
+        self._on_saved = on_saved
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self._executor = executor_class(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._failures = []
+
+    def _submit(self, func, filepath, row_number, *args):
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(func, *args, filepath)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._pending.append(future)
+        future.add_done_callback(lambda f: self._on_done(f, filepath, row_number))
+        return future
+
+    def _on_done(self, future, filepath, row_number):
+        self._slots.release()
+        error = future.exception()
+        with self._lock:
+            self._pending.remove(future)
+            if error is not None:
+                self._failures.append((filepath, row_number, error))
+        if error is None and self._on_saved is not None:
+            self._on_saved(row_number, future.result() or 0)
+
+    def submit_png(self, png_bytes, filepath, row_number=None):
+        """
+        PNGのバイト列の保存を予約します。
+
+        Args:
+            png_bytes (bytes): 撮影したPNGのバイト列。
+            filepath (str): 保存先のパス。
+            row_number (int): 撮影したコマンドの行番号 (失敗時の報告用)。
+        """
+        return self._submit(write_png_bytes, filepath, row_number, png_bytes)
+
+    def submit_capture(self, captured, filepath, row_number=None):
+        """
+        フルページ撮影した画像の結合と保存を予約します。
+
+        Args:
+            captured (CapturedPage): 撮影した画像。
+            filepath (str): 保存先のパス。
+            row_number (int): 撮影したコマンドの行番号 (失敗時の報告用)。
+        """
+        return self._submit(save_captured_page, filepath, row_number, captured)
+
+    def submit_to_store(self, store, data, filepath, row_number=None):
+        """
+        スクリーンショットストアへの画像の変換と保存を予約します。
+
+        Args:
+            store (ScreenshotStore): 保存先のストア。
+            data (bytes または CapturedPage): 撮影した画像。
+            filepath (str): ScreenshotStore.add が返したストア内のパス。
+            row_number (int): 撮影したコマンドの行番号 (失敗時の報告用)。
+        """
+        return self._submit(store.write, filepath, row_number, data)
+
+    def wait(self):
+        """
+        予約済みの保存処理がすべて終わるまで待機し、失敗した保存を返します。
+
+        Returns:
+            list: (保存先のパス, 行番号, 例外) のリスト。返した失敗は記録から削除されます。
+        """
+        while True:
+            with self._lock:
+                pending = list(self._pending)
+            if not pending:
+                break
+            for future in pending:
+                future.exception() # 完了まで待機する (例外は _on_done で記録済み)
+        with self._lock:
+            failures, self._failures = self._failures, []
+        return failures
+
+    def close(self):
+        """
+        すべての保存処理の完了を待ってワーカーを終了します。
+
+        Returns:
+            list: 未報告の失敗した保存 (wait() と同じ形式)。
+        """
+        failures = self.wait()
+        self._executor.shutdown(wait=True)
+        return failures
@@ -0,0 +1,214 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+
+from fullpage_capture import CapturedPage, save_captured_page
+
+DEFAULT_STORE_DIR = 'screenshot_store'
+
+# 保存形式ごとの拡張子と圧縮レベルの既定値・範囲
+# original: 撮影したPNGをそのまま保存する (分割撮影した画像は結合してPNGで保存する)
+# png: zlibの圧縮レベル (0-9) を指定してPNGで再圧縮する。低いレベルほど速い
+# webp: 可逆圧縮のWebPで保存する。圧縮レベルは圧縮方法 (0-6)。低いレベルほど速い
+ENCODERS = {
+    'original': {'extension': 'png', 'default_level': 6, 'levels': range(10)},
+    'png': {'extension': 'png', 'default_level': 1, 'levels': range(10)},
+    'webp': {'extension': 'webp', 'default_level': 1, 'levels': range(7)},
+}
+
+# 類似判定に使用する縮小画像のサイズ
+THUMBNAIL_SIZE = (32, 32)
+
+
+@dataclass
+class StoredScreenshot:
+    """ScreenshotStore.add の結果。"""
+    path: str # ストア内の保存先のパス (ログに出力するパス)
+    new: bool # Trueの場合は保存が必要 (ScreenshotStore.write で書き込む)
+    skipped: bool = False # 前回の撮影と類似しているため、前回の画像を参照する場合はTrue
+    difference: float = None # 前回の撮影との差分 (0-1)。類似判定を行わなかった場合はNone
+
+
+def content_hash(data):
+    """撮影した画像 (PNGのバイト列または CapturedPage) の内容のSHA-256を返します。"""
+    digest = hashlib.sha256()
+    if isinstance(data, CapturedPage):
+        digest.update(f"{data.total_height}".encode())
+        for png_bytes, top, height in data.parts:
+            digest.update(f"|{top},{height},{len(png_bytes)}|".encode())
+            digest.update(png_bytes)
+    else:
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def _thumbnail(png_bytes):
+    from PIL import Image
+    with Image.open(io.BytesIO(png_bytes)) as image:
+        return image.size, image.convert('L').resize(THUMBNAIL_SIZE, Image.Resampling.BOX)
+
+
+def image_fingerprint(data):
+    """
+    類似判定用に、撮影した画像を縮小したグレースケール画像を作成します。
+
+    Returns:
+        tuple: (ページ全体の高さ, (画像サイズ, 縮小画像) のリスト)。分割撮影した画像は分割ごとに縮小します。
+    """
+    if isinstance(data, CapturedPage):
+        return data.total_height, [_thumbnail(png_bytes) for png_bytes, _, _ in data.parts]
+    return None, [_thumbnail(data)]
+
+
+def fingerprint_difference(a, b):
+    """
+    2つの image_fingerprint の差分を 0 (同一) から 1 の値で返します。画像のサイズや分割数が異なる場合は1を返します。
+    """
+    from PIL import ImageChops, ImageStat
+    if a[0] != b[0] or len(a[1]) != len(b[1]):
+        return 1.0
+    total = 0.0
+    for (size_a, thumb_a), (size_b, thumb_b) in zip(a[1], b[1]):
+        if size_a != size_b:
+            return 1.0
+        total += ImageStat.Stat(ImageChops.difference(thumb_a, thumb_b)).mean[0] / 255
+    return total / len(a[1])
+
+
+class ScreenshotStore:
+    """
+    スクリーンショットを内容のハッシュをファイル名として保存し、同じ内容の画像を1回だけ保存するストアです。
+    画像は root/objects/<ハッシュの先頭2文字>/<ハッシュ>.<拡張子> に保存され、複数の実行・シナリオで共有されます。
+
+    similarity_threshold を指定すると、同じステップ (スクリーンショットのファイル名または step オプション) の
+    前回保存した画像との差分が閾値以下の場合は保存せず、前回の画像を参照します。
+    比較の基準は最後に保存した画像のため、少しずつの変化が積み重なった場合も保存されます。
+    類似判定では撮影した画像をデコードするため、撮影ごとに数十ミリ秒程度かかります。
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR, encoder='png', compress_level=None, similarity_threshold=None):
+        """
+        Args:
+            root (str): ストアのディレクトリ。
+            encoder (str): 保存形式 ('original'、'png' または 'webp')。
+            compress_level (int): 圧縮レベル。Noneの場合は保存形式ごとの既定値 (ENCODERS を参照)。
+            similarity_threshold (float): 前回の撮影と同じとみなす差分の閾値 (0-1、例: 0.005)。Noneの場合は類似判定を行いません。
+
+        Raises:
+            ValueError: 保存形式・圧縮レベル・閾値が不正な場合、またはWebPが使用できない場合。
+        """
+        if encoder not in ENCODERS:
+            raise ValueError(f"サポートされていない保存形式です: '{encoder}' (使用可能: {', '.join(ENCODERS)})")
+        if encoder == 'webp':
+            from PIL import features
+            if not features.check('webp'):
+                raise ValueError("インストールされているPillowはWebPの保存に対応していません。")
+        spec = ENCODERS[encoder]
+        if compress_level is None:
+            compress_level = spec['default_level']
+        if compress_level not in spec['levels']:
+            raise ValueError(f"保存形式 '{encoder}' の圧縮レベルは {spec['levels'][0]}-{spec['levels'][-1]} で指定してください。")
+        if similarity_threshold is not None and not 0 <= similarity_threshold < 1:
+            raise ValueError("類似判定の閾値は 0 以上 1 未満で指定してください。")
+        self.root = root
+        self.encoder = encoder
+        self.compress_level = compress_level
+        self.similarity_threshold = similarity_threshold
+        self._init_state()
+
+    def _init_state(self):
+        self._lock = threading.Lock()
+        self._reserved = set() # 保存済みまたは保存を予約したパス
+        self._previous = {} # ステップ -> (最後に保存した画像の image_fingerprint, ストア内のパス)
+
+    def __getstate__(self):
+        # ワーカープロセスには設定だけを渡し、撮影の記録は引き継がない
+        return {key: value for key, value in self.__dict__.items() if not key.startswith('_')}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_state()
+
+    def object_path(self, key):
+        """ハッシュに対応するストア内のパスを返します。"""
+        return os.path.join(self.root, 'objects', key[:2], f"{key}.{ENCODERS[self.encoder]['extension']}")
+
+    def add(self, data, step=None):
+        """
+        撮影した画像をストアに登録し、保存先を返します。書き込みは行わず、new がTrueの場合に write() で書き込みます。
+
+        Args:
+            data (bytes または CapturedPage): 撮影したPNGのバイト列、またはフルページ撮影した画像。
+            step (str): 類似判定で前回の撮影と比較するためのステップ名。Noneの場合は類似判定を行いません。
+
+        Returns:
+            StoredScreenshot: ストア内の保存先と、保存が必要かどうか。
+        """
+        fingerprint = difference = None
+        if self.similarity_threshold is not None and step is not None:
+            fingerprint = image_fingerprint(data)
+            previous = self._previous.get(step)
+            if previous is not None:
+                difference = fingerprint_difference(previous[0], fingerprint)
+                if difference <= self.similarity_threshold:
+                    return StoredScreenshot(previous[1], new=False, skipped=True, difference=difference)
+
+        path = self.object_path(content_hash(data))
+        with self._lock:
+            new = path not in self._reserved and not os.path.exists(path)
+            self._reserved.add(path)
+        if fingerprint is not None:
+            self._previous[step] = (fingerprint, path)
+        return StoredScreenshot(path, new=new, difference=difference)
+
+    def write(self, data, path):
+        """
+        画像を保存形式に変換してストアに書き込み、書き込んだバイト数を返します。
+        書き込み途中のファイルを読まれないよう、一時ファイルに書き込んでから置き換えます。
+
+        Args:
+            data (bytes または CapturedPage): add() に渡した画像。
+            path (str): add() が返したストア内のパス。
+        """
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            self._encode(data, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self._lock:
+                self._reserved.discard(path) # 次回の撮影で再度保存する
+            raise
+        return os.path.getsize(path)
+
+    def _encode(self, data, filepath):
+        if isinstance(data, CapturedPage) and len(data.parts) == 1:
+            data = data.parts[0][0]
+        if self.encoder == 'original':
+            if isinstance(data, CapturedPage):
+                save_captured_page(data, filepath, self.compress_level)
+            else:
+                with open(filepath, 'wb') as f:
+                    f.write(data)
+            return
+        if isinstance(data, CapturedPage):
+            if self.encoder == 'png':
+                save_captured_page(data, filepath, self.compress_level)
+                return
+            # WebPは全体を一度にエンコードするため、結合した画像 (無圧縮のPNG) を経由する
+            save_captured_page(data, filepath, 0)
+            with open(filepath, 'rb') as f:
+                data = f.read()
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as image:
+            if self.encoder == 'png':
+                image.save(filepath, 'PNG', compress_level=self.compress_level)
+            else:
+                image.save(filepath, 'WEBP', lossless=True, method=self.compress_level)
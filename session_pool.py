@@ -0,0 +1,225 @@
+import queue
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from test_automation import create_driver
+
+# リース間でlocalStorageとsessionStorageを消去するスクリプト
+CLEAR_STORAGE_JS = """
+try { window.localStorage.clear(); } catch (e) {}
+try { window.sessionStorage.clear(); } catch (e) {}
+"""
+
+
+def url_origin(url):
+    """URLのオリジン (例: 'https://example.com:8443') を返します。http/https以外のURL (about:blankなど) はNone。"""
+    parts = urlsplit(url or '')
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        return None
+    return f"{parts.scheme}://{parts.netloc.rpartition('@')[2].lower()}"
+
+
+class BrowserSession:
+    """
+    セッションプールが管理する1つのブラウザ。
+    貸し出し中に driver.get で表示したページのオリジンを記録し、返却時にオリジンごとにストレージを消去します。
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0 # 貸し出した回数
+        size = driver.get_window_size()
+        self.window_size = (size['width'], size['height']) # 起動直後のウィンドウサイズ (リセット時に復元する)
+        self.origins = set() # 前回のリセット以降に表示したページのオリジン
+        get = driver.get
+
+        def get_and_record(url):
+            self.visit(url)
+            return get(url)
+        driver.get = get_and_record
+
+    def visit(self, url):
+        """表示したページのURLを記録します。http/https以外のURLは無視します。"""
+        origin = url_origin(url)
+        if origin is not None:
+            self.origins.add(origin)
+
+
+class SessionPool:
+    """
+    起動済みのブラウザを保持し、シナリオに貸し出すセッションプールです。
+    返却時にCookie・localStorage・sessionStorage・タブ・ウィンドウサイズをリセットし、
+    規定回数使用したブラウザや異常終了したブラウザは新しいブラウザに入れ替えます。
+
+    使用例:
+        with SessionPool('chrome', size=2) as pool:
+            with pool.lease() as driver:
+                automation = WebTestAutomation(driver=driver, ...)
+    """
+
+    def __init__(self, browser='chrome', size=1, max_uses=20, prewarm=True, driver_factory=None, profile=None):
+        """
+        Args:
+            browser (str): 使用するブラウザ ('chrome' または 'firefox')。
+            size (int): 同時に貸し出せるブラウザの最大数。
+            max_uses (int): 1つのブラウザを貸し出す最大回数。超えた場合は再起動します。
+            prewarm (bool): Trueの場合、作成時に size 個のブラウザを起動しておきます。
+            driver_factory (callable): WebDriverを生成する関数。未指定の場合は create_driver(browser, profile)。
+            profile (DriverProfile): ブラウザを起動するときのドライバープロファイル。Noneの場合は 'default'。
+        """
+        self.browser = browser
+        self.profile = profile
+        self.size = size
+        self.max_uses = max_uses
+        self._driver_factory = driver_factory or (lambda: create_driver(browser, profile))
+        self._idle = queue.LifoQueue() # 直近に使ったブラウザから貸し出す
+        self._capacity = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._sessions = [] # 起動中のすべてのセッション
+        self._closed = False
+        if prewarm:
+            for _ in range(size):
+                self._idle.put(self._start_session())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _start_session(self):
+        session = BrowserSession(self._driver_factory())
+        with self._lock:
+            self._sessions.append(session)
+        return session
+
+    def _discard_session(self, session):
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+        try:
+            session.driver.quit()
+        except Exception as e:
+            print(f"警告: ブラウザの終了中にエラーが発生しました: {e}")
+
+    def acquire(self, timeout=None):
+        """
+        ブラウザを借ります。空きがない場合は返却されるまで待機します。
+
+        Args:
+            timeout (float): 待機の上限時間（秒）。Noneの場合は無期限。
+
+        Returns:
+            BrowserSession: 借りたセッション。
+
+        Raises:
+            TimeoutError: 上限時間内にブラウザを借りられなかった場合。
+        """
+        if self._closed:
+            raise RuntimeError("セッションプールは既に閉じられています。")
+        if not self._capacity.acquire(timeout=timeout):
+            raise TimeoutError(f"{timeout} 秒以内にブラウザを借りられませんでした。")
+        try:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                session = self._start_session()
+        except Exception:
+            self._capacity.release()
+            raise
+        session.uses += 1
+        return session
+
+    def release(self, session, broken=False):
+        """
+        ブラウザを返却します。状態をリセットし、再利用できない場合は終了します。
+
+        Args:
+            session (BrowserSession): 返却するセッション。
+            broken (bool): Trueの場合、ブラウザを再利用せずに終了します。
+        """
+        try:
+            if self._closed or broken or session.uses >= self.max_uses or not self._reset(session):
+                self._discard_session(session)
+            else:
+                self._idle.put(session)
+        finally:
+            self._capacity.release()
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """
+        with文でブラウザを借り、ブロックを抜けるときに返却します。
+
+        Args:
+            timeout (float): 借りるまでの待機の上限時間（秒）。
+
+        Yields:
+            WebDriver: 借りたブラウザのWebDriver。ブロック内で WebDriverException が送出された場合は、
+                ブラウザを再利用せずに終了します。
+        """
+        from selenium.common.exceptions import WebDriverException
+        session = self.acquire(timeout)
+        broken = False
+        try:
+            yield session.driver
+        except WebDriverException:
+            broken = True # 応答しなくなったなど、状態がわからないブラウザは次のシナリオに貸し出さない
+            raise
+        finally:
+            self.release(session, broken)
+
+    def _reset(self, session):
+        """
+        次のシナリオに影響しないよう、ブラウザの状態をリセットします。
+        Chrome (DevTools Protocolを使用できるブラウザ) では、すべてのcookieと、貸し出し中に表示した
+        オリジンごとのストレージを消去します。それ以外のブラウザでは表示中のオリジンのストレージとcookieを消去し、
+        ほかのオリジンも表示していた場合はそのストレージを消去できないため、リセットできないものとして扱います。
+
+        Returns:
+            bool: リセットできた場合はTrue。ブラウザが応答しない場合や消去に失敗した場合はFalse。
+        """
+        driver = session.driver
+        cdp = hasattr(driver, 'execute_cdp_cmd')
+        try:
+            # 各タブで表示したオリジンを記録し、最初のタブ以外を閉じる
+            handles = driver.window_handles
+            for handle in reversed(handles):
+                driver.switch_to.window(handle)
+                session.visit(driver.current_url)
+                if cdp:
+                    # リンクやリダイレクトで移動したページはタブの履歴から取得する
+                    history = driver.execute_cdp_cmd('Page.getNavigationHistory', {})
+                    for entry in history.get('entries', []):
+                        session.visit(entry['url'])
+                if handle != handles[0]:
+                    driver.close()
+
+            if cdp:
+                driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+                for origin in sorted(session.origins):
+                    driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+            elif session.origins - {url_origin(driver.current_url)}:
+                print("警告: 表示中ではないオリジンのストレージを消去できないため、ブラウザを再起動します。")
+                return False
+            else:
+                driver.execute_script(CLEAR_STORAGE_JS)
+                driver.delete_all_cookies()
+            session.origins.clear()
+            driver.get('about:blank')
+            driver.set_window_size(*session.window_size)
+            return True
+        except Exception as e:
+            print(f"警告: ブラウザの状態をリセットできないため、再起動します: {e}")
+            return False
+
+    def close(self):
+        """すべてのブラウザを終了します。貸出中のブラウザは返却時に終了します。"""
+        self._closed = True
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard_session(session)
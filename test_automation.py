@@ -1,77 +1,216 @@
-import csv
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
+# seleniumはブラウザを操作する関数・メソッドの中で読み込む (--help や --validate-only では読み込まない)
+import argparse
+import itertools
 import time
 import os
-from PIL import Image # Pillowをインポート (フルページスクリーンショット結合用)
 from datetime import datetime # タイムスタンプ用
 from pathlib import Path
 
+from batch_commands import BATCH_JS, batch_steps, collect_batch
+from buffered_logger import BufferedCsvLogger, BufferedJsonlLogger
+from checkpoint import RESUME, select_commands
+from driver_profiles import apply_profile, chrome_options, firefox_options, resolve_profile
+from fullpage_capture import capture_full_page_cdp, capture_full_page_scrolling, captured_page_to_png
+from profiler import RunProfiler
+from scenario_compiler import ScenarioCompileError, compile_rows, compile_scenario
+from screenshot_pipeline import ScreenshotWriter
+from wait_engine import SmartWait
+
+SUPPORTED_BROWSERS = ('chrome', 'firefox')
+
+# マスクするCSSセレクタの要素のページ上の位置 (CSSピクセル) と、スクロール位置・デバイスピクセル比を返す
+MASK_RECTS_JS = """
+const rects = [];
+for (const selector of arguments[0]) {
+    for (const element of document.querySelectorAll(selector)) {
+        const r = element.getBoundingClientRect();
+        rects.push([r.left + window.scrollX, r.top + window.scrollY, r.width, r.height]);
+    }
+}
+return {rects: rects, scrollX: window.scrollX, scrollY: window.scrollY, ratio: window.devicePixelRatio || 1};
+"""
+
+def create_driver(browser='chrome', profile=None):
+    """
+    ブラウザを起動し、ドライバープロファイルの設定 (ヘッドレスモード・ウィンドウサイズ・通信のブロック) を適用したWebDriverを返します。
+
+    Args:
+        browser (str): 使用するブラウザ ('chrome' または 'firefox')。
+        profile (DriverProfile または str): ドライバープロファイルまたは組み込みのプロファイル名。
+            Noneの場合は 'default' (ウィンドウを表示して最大化)。
+
+    Returns:
+        WebDriver: 起動したブラウザのWebDriver。
+
+    Raises:
+        ValueError: サポートされていないブラウザまたは定義されていないプロファイルが指定された場合。
+    """
+    from selenium import webdriver
+    profile = resolve_profile(profile)
+    if browser.lower() == 'chrome':
+        driver = webdriver.Chrome(options=chrome_options(profile))
+    elif browser.lower() == 'firefox':
+        driver = webdriver.Firefox(options=firefox_options(profile))
+    else:
+        raise ValueError(f"サポートされていないブラウザです。'chrome' または 'firefox' を指定してください。")
+    apply_profile(driver, profile)
+    return driver
+
 class WebTestAutomation:
-    def __init__(self, browser='chrome', screenshot_dir='screenshots', log_filepath='test_log.csv'):
+    def __init__(self, browser='chrome', screenshot_dir='screenshots', log_filepath='test_log.csv', log_echo=True,
+                 driver=None, batch_commands=False, profile_report=None, metrics_hooks=None, timeout_history=None,
+                 time_budget=None, checkpoint=None, driver_profile=None, screenshot_store=None, baseline_dir='baselines',
+                 update_baselines=False):
         """
         WebDriverを初期化します。
 
         Args:
             browser (str): 使用するブラウザ ('chrome' または 'firefox')。
             screenshot_dir (str): スクリーンショットの保存先ディレクトリ。
-            log_filepath (str): ログを保存するCSVファイルのパス。
+            log_filepath (str): ログを保存するファイルのパス (CSV)。拡張子が .jsonl の場合は1件のログを1行のJSONとして記録し、
+                コマンドごとの実行結果 (状態・処理時間・スクリーンショットのパス) もイベントとして記録します。
+            log_echo (bool): ログをコンソールにも出力するかどうか。
+            driver (WebDriver): 起動済みのWebDriver (セッションプールから借りたものなど)。
+                指定した場合はブラウザを起動せず、close() でもブラウザを終了しません。
+            batch_commands (bool): Trueの場合、連続する input / log_content コマンドを
+                1回の execute_script でまとめて実行します。
+            profile_report (str): コマンドごとの計測結果をまとめたプロファイルレポートの保存先。
+                拡張子が .csv の場合はCSV、それ以外はJSONで close() 時に保存します。Noneの場合は保存しません。
+            metrics_hooks (list): 各コマンドの終了時に profiler.CommandMetrics を渡して呼び出す関数のリスト。
+            timeout_history (AdaptiveTimeouts): 要素が表示されるまでの時間の記録。指定した場合は記録から算出した
+                待機時間を使用し、close() 時に今回の記録を保存します。Noneの場合は常に default_timeout 秒待機します。
+            time_budget (float): シナリオ全体の制限時間（秒）。超えた場合は残りのコマンドを実行せずに失敗とします。
+            checkpoint (RunCheckpoint): 行ごとの実行結果を記録するチェックポイント。close() 時にも保存します。
+            driver_profile (DriverProfile): ブラウザを起動する場合のドライバープロファイル。Noneの場合は 'default'。
+            screenshot_store (ScreenshotStore): スクリーンショットの保存先のストア。指定した場合は screenshot_dir に保存せず、
+                同じ内容の画像をストアに1回だけ保存してログにはストア内のパスを出力します。
+            baseline_dir (str): assert_screenshot で比較するベースライン画像のディレクトリ。
+            update_baselines (bool): Trueの場合、assert_screenshot は比較せずに撮影した画像でベースラインを更新します。
         """
         self.log_filepath = log_filepath
+        self.log_echo = log_echo
+        self.batch_commands = batch_commands
+        self.profile_report = profile_report
+        self.error_count = 0 # ERROR/CRITICALログの件数 (実行結果の判定用)
+        self._current_row = None # 実行中のコマンドの行番号 (スクリーンショット保存失敗の報告用)
+        # スクリーンショットの保存を予約した成功した行の行番号 -> イテレーション番号 (保存の失敗を後から行の失敗として報告する)
+        self._screenshot_rows = {}
+        self.iteration = None # 実行中の行を展開したイテレーション番号 (チェックポイントに記録する)
+        self.scenario = None # 構造化ログに記録するシナリオ名 (未設定の場合は実行したCSVファイルのパス)
+        self._run_logged = False # 構造化ログに run_start を記録済みの場合はTrue
+        self._command_errors = [] # 実行中のコマンドで出力したエラーメッセージ (構造化ログ用)
+        self._command_artifacts = [] # 実行中のコマンドで保存した画像のパス (構造化ログ用)
         self._initialize_log_file() # ログファイルを初期化
 
-        if browser.lower() == 'chrome':
-            from selenium.webdriver.chrome.options import Options as ChromeOptions
-            chrome_options = ChromeOptions()
-            chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-            self.driver = webdriver.Chrome(options=chrome_options)
-            
-        elif browser.lower() == 'firefox':
-            self.driver = webdriver.Firefox()
+        self._owns_driver = driver is None
+        if driver is not None:
+            self.driver = driver
+        elif browser.lower() in SUPPORTED_BROWSERS:
+            self.driver = create_driver(browser, driver_profile)
         else:
             self._log("ERROR", f"サポートされていないブラウザです。'chrome' または 'firefox' を指定してください: {browser}")
             raise ValueError(f"サポートされていないブラウザです。'chrome' または 'firefox' を指定してください。")
-        
+
         self.screenshot_dir = screenshot_dir
-        os.makedirs(self.screenshot_dir, exist_ok=True)
-        self.wait = WebDriverWait(self.driver, 10)
-        self.driver.maximize_window()
-        time.sleep(0.5)
+        if screenshot_store is None:
+            os.makedirs(self.screenshot_dir, exist_ok=True)
+        # 撮影した画像の結合・圧縮・保存はバックグラウンドで行い、次のコマンドをすぐに開始する
+        self.profiler = RunProfiler(self.driver, metrics_hooks, warn=lambda message: self._log("WARNING", message))
+        self.screenshot_writer = ScreenshotWriter(on_saved=self.profiler.add_bytes)
+        self.screenshot_store = screenshot_store
+        self._screenshot_step = None # 撮影中のスクリーンショットのステップ名 (ストアの類似判定用)
+        self.baseline_dir = baseline_dir
+        self.update_baselines = update_baselines
+        self.pixel_threshold = 16 # assert_screenshot で異なる画素とみなすチャンネルごとの差 (0-255)
+        self.default_timeout = 10 # 要素の待機時間の既定値（秒）
+        self.timeout_history = timeout_history
+        self.time_budget = time_budget
+        self._budget_deadline = None # 制限時間の期限 (最初のコマンドの実行時に設定する)
+        self._page_url = None # 直前に navigate で遷移したURL (待機時間の記録のキー)
+        self.budget_exceeded = False # 制限時間を超えて実行を打ち切った場合はTrue
+        self.checkpoint = checkpoint
+        self.waiter = SmartWait(self.driver)
+        self.waiter.install()
+        self._command_wait_time = 0.0 # 実行中のコマンドで待機した合計時間（秒）
 
     def _initialize_log_file(self):
-        """ログファイルを初期化し、ヘッダーを書き込みます。"""
-        with open(self.log_filepath, 'w', encoding='sjis', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['タイムスタンプ', 'レベル', 'メッセージ'])
+        """ログファイルを初期化し、ヘッダーを書き込みます。書き込みはバックグラウンドスレッドでまとめて行います。"""
+        if self.log_filepath.lower().endswith('.jsonl'):
+            self._logger = BufferedJsonlLogger(self.log_filepath, echo=self.log_echo)
+        else:
+            self._logger = BufferedCsvLogger(self.log_filepath, encoding='sjis', echo=self.log_echo)
 
-    def _log(self, level, message):
+    def _log(self, level, message, **fields):
         """
         指定されたレベルとメッセージでログを出力します。
 
         Args:
             level (str): ログレベル (例: "INFO", "ERROR")。
             message (str): ログメッセージ。
+            **fields: 構造化ログに追加で記録する項目。row (行番号) を省略した場合は実行中のコマンドの行番号。
+        """
+        if level in ("ERROR", "CRITICAL"):
+            self.error_count += 1
+            self._command_errors.append(message)
+        fields.setdefault('row', self._current_row)
+        fields.setdefault('iteration', self.iteration)
+        self._logger.log(level, message, **fields)
+
+    def _log_run_start(self):
+        """構造化ログに実行の開始を記録します (最初のコマンドの実行前に1回だけ)。"""
+        if not self._run_logged:
+            self._run_logged = True
+            self._logger.event('run_start', scenario=self.scenario, log=self.log_filepath, pid=os.getpid())
+
+    def _wait_for_page_ready(self, timeout, quiet_period=None):
+        """
+        ページが準備完了になるまで、最大 timeout 秒待機します。待機時間はコマンドの待機時間に加算されます。
+
+        Returns:
+            tuple: (実際に待機した秒数, 準備完了になった場合はTrue)。
         """
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3] # ミリ秒まで
-        log_entry = [timestamp, level, message]
-        with open(self.log_filepath, 'a', encoding='sjis', newline='') as f:
-            writer = csv.writer(f)
-            # writer = csv.writer(f, quoting=csv.QUOTE_NONE, escapechar='\\')
-            writer.writerow(log_entry)
-        # コンソールにも出力 (デバッグ用、不要ならコメントアウト)
-        print(f"[{timestamp}] [{level}] {message}")
+        waited, ready = self.waiter.wait_for_page_ready(timeout, quiet_period)
+        self._command_wait_time += waited
+        return waited, ready
 
-    def _get_element(self, selector_type, selector_value, timeout=10):
+    def _wait_until(self, condition, timeout):
+        """
+        条件を満たすまで、最大 timeout 秒待機します。待機時間はコマンドの待機時間に加算されます。
+
+        Returns:
+            tuple: (実際に待機した秒数, 条件を満たした場合はTrue)。
+        """
+        waited, satisfied = self.waiter.wait_until(condition, timeout)
+        self._command_wait_time += waited
+        return waited, satisfied
+
+    def _remaining_budget(self):
+        """シナリオの制限時間の残り（秒）を返します。制限時間がない場合はNone。"""
+        if self._budget_deadline is None:
+            return None
+        return max(self._budget_deadline - time.monotonic(), 0.0)
+
+    def _element_timeout(self, selector_type, selector_value, timeout=None):
+        """
+        要素の待機時間を決定します。コマンドの timeout オプション、記録から算出した値、既定値の順に使用し、
+        シナリオの制限時間の残りを超えないようにします。
+        """
+        if timeout is None and self.timeout_history is not None:
+            timeout = self.timeout_history.timeout_for(self._page_url, selector_type, selector_value,
+                                                       self.default_timeout)
+        if timeout is None:
+            timeout = self.default_timeout
+        remaining = self._remaining_budget()
+        return timeout if remaining is None else min(timeout, remaining)
+
+    def _get_element(self, selector_type, selector_value, timeout=None):
         """
         指定したセレクタで要素を取得します。見つからない場合はエラーを発生させます。
         
         Args:
             selector_type (str): セレクタのタイプ (id, name, class_name, xpath, css_selector, link_text, partial_link_text, tag_name)。
             selector_value (str): セレクタの値。
-            timeout (int): 要素が見つかるまでの最大待機時間（秒）。
+            timeout (float): 要素が見つかるまでの最大待機時間（秒）。Noneの場合は記録から算出した値または既定値。
 
         Returns:
             WebElement: 見つかった要素。
@@ -79,6 +218,10 @@ class WebTestAutomation:
         Raises:
             NoSuchElementException: 指定された要素が見つからない場合。
         """
+        from selenium.common.exceptions import NoSuchElementException, TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
         by_strategy = {
             'id': By.ID,
             'name': By.NAME,
@@ -94,15 +237,22 @@ class WebTestAutomation:
             self._log("ERROR", f"無効なセレクタタイプです: {selector_type}")
             raise ValueError(f"無効なセレクタタイプです: {selector_type}")
 
+        timeout = self._element_timeout(selector_type, selector_value, timeout)
+        start = time.monotonic()
         try:
-            element = self.wait.until(
-                EC.visibility_of_element_located((by_strategy[selector_type.lower()], selector_value))
-            )
+            with self.profiler.phase('find_element'):
+                element = WebDriverWait(self.driver, timeout).until(
+                    EC.visibility_of_element_located((by_strategy[selector_type.lower()], selector_value))
+                )
+            if self.timeout_history is not None:
+                self.timeout_history.record(self._page_url, selector_type, selector_value, time.monotonic() - start)
             return element
         except TimeoutException:
-            msg = f"指定された要素が見つかりません: タイプ='{selector_type}', 値='{selector_value}' (タイムアウト)"
+            msg = f"指定された要素が見つかりません: タイプ='{selector_type}', 値='{selector_value}' (タイムアウト: {timeout:.1f} 秒)"
             self._log("ERROR", msg)
             raise NoSuchElementException(msg)
+        finally:
+            self._command_wait_time += time.monotonic() - start
 
     def navigate_to_url(self, url, wait_time=0):
         """
@@ -110,15 +260,26 @@ class WebTestAutomation:
 
         Args:
             url (str): 遷移先のURL。
-            wait_time (int): ページ遷移後に待機する時間（秒）。
+            wait_time (int): ページ遷移後にページの準備完了を待機する上限時間（秒）。
+                読み込み・通信・DOM変更・画像とフォントの読み込みが完了した時点で待機を終了します。
         """
         self._log("INFO", f"URLに遷移中: {url}")
-        self.driver.get(url)
+        with self.profiler.phase('navigate.get'):
+            self.driver.get(url)
+        self._page_url = url
+        remaining = self._remaining_budget()
+        if remaining is not None:
+            wait_time = min(wait_time, remaining)
         if wait_time > 0:
-            self._log("INFO", f"ページ遷移後 {wait_time} 秒待機中...")
-            time.sleep(wait_time)
+            self._log("INFO", f"ページ遷移後、準備完了まで最大 {wait_time} 秒待機中...")
+            with self.profiler.phase('navigate.wait'):
+                waited, ready = self._wait_for_page_ready(wait_time)
+            if ready:
+                self._log("INFO", f"ページの準備が完了しました (待機: {waited:.3f} 秒)")
+            else:
+                self._log("INFO", f"待機の上限 {wait_time} 秒に達しました (待機: {waited:.3f} 秒)")
 
-    def input_value(self, selector_type, selector_value, value):
+    def input_value(self, selector_type, selector_value, value, timeout=None):
         """
         指定した場所（要素）に値を入力します。
 
@@ -126,111 +287,202 @@ class WebTestAutomation:
             selector_type (str): セレクタのタイプ。
             selector_value (str): セレクタの値。
             value (str): 入力する値。
+            timeout (float): 要素が表示されるまでの最大待機時間（秒）。Noneの場合は記録から算出した値または既定値。
 
         Raises:
             NoSuchElementException: 指定された要素が見つからない場合。
         """
-        element = self._get_element(selector_type, selector_value)
-        self._log("INFO", f"'{selector_value}' に値 '{value}' を入力中 (タイプ: {selector_type})")
+        element = self._get_element(selector_type, selector_value, timeout)
+        self._log_input(selector_type, selector_value, value)
         element.clear()
         element.send_keys(value)
 
-    def click_element(self, selector_type, selector_value):
+    def _log_input(self, selector_type, selector_value, value):
+        """input コマンドのログを出力します。"""
+        self._log("INFO", f"'{selector_value}' に値 '{value}' を入力中 (タイプ: {selector_type})")
+
+    def click_element(self, selector_type, selector_value, timeout=None, wait_time=0):
         """
         指定した場所（要素）をクリックします。
 
         Args:
             selector_type (str): セレクタのタイプ。
             selector_value (str): セレクタの値。
+            timeout (float): 要素が表示されるまでの最大待機時間（秒）。Noneの場合は記録から算出した値または既定値。
+            wait_time (int): クリック後にページの準備完了を待機する上限時間（秒）。navigate の wait_time と同じく、
+                準備が整った時点で待機を終了します。
 
         Raises:
             NoSuchElementException: 指定された要素が見つからない場合。
         """
-        element = self._get_element(selector_type, selector_value)
+        element = self._get_element(selector_type, selector_value, timeout)
         self._log("INFO", f"'{selector_value}' をクリック中 (タイプ: {selector_type})")
         element.click()
+        remaining = self._remaining_budget()
+        if remaining is not None:
+            wait_time = min(wait_time, remaining)
+        if wait_time > 0:
+            self._log("INFO", f"クリック後、準備完了まで最大 {wait_time} 秒待機中...")
+            with self.profiler.phase('click.wait'):
+                waited, ready = self._wait_for_page_ready(wait_time)
+            if ready:
+                self._log("INFO", f"ページの準備が完了しました (待機: {waited:.3f} 秒)")
+            else:
+                self._log("INFO", f"待機の上限 {wait_time} 秒に達しました (待機: {waited:.3f} 秒)")
 
-    def take_screenshot(self, filename, remark="", full_page=False):
+    def take_screenshot(self, filename, remark="", full_page=False, step=None):
         """
         画面のスクリーンショットを撮影します。
+        撮影した画像の保存はバックグラウンドで行われます。保存の失敗は wait_for_screenshots() で撮影した行の失敗として報告されます。
 
         Args:
             filename (str): 保存するファイル名 (例: "login_page.png")。
             remark (str): スクリーンショットに関する備考。
             full_page (bool): 画面全体を撮影するかどうか (True: 全体, False: 表示領域のみ)。
+            step (str): スクリーンショットストアの類似判定で前回の撮影と比較するステップ名。Noneの場合はファイル名。
         """
         filepath = os.path.join(self.screenshot_dir, filename)
+        self._screenshot_step = f"{step or filename}|{full_page}"
         
         log_msg = f"スクリーンショットを保存中: {filepath} (備考: {remark}, 全画面: {full_page})"
         self._log("INFO", log_msg)
-        self._log("IMG", f"![{filepath}]({filepath})")  # Markdown形式で画像リンクをログに出力
-        self._log("IMG", f'<a src="{filepath}" alt="{filepath}"')  # Markdown形式で画像リンクをログに出力
 
         if full_page:
             if self.driver.name == 'firefox':
-                self.driver.save_full_page_screenshot(filepath)
+                with self.profiler.phase('screenshot.capture'):
+                    png_bytes = self.driver.get_full_page_screenshot_as_png()
+                self._submit_png(png_bytes, filepath)
             elif self.driver.name == 'chrome':
                 try:
-                    original_window_size = self.driver.get_window_size()
-                    original_scroll_position = self.driver.execute_script("return window.pageYOffset;")
-
-                    total_width = max(self.driver.execute_script("return document.body.scrollWidth"),
-                                      self.driver.execute_script("return document.documentElement.scrollWidth"))
-                    total_height = max(self.driver.execute_script("return document.body.scrollHeight"),
-                                       self.driver.execute_script("return document.documentElement.scrollHeight"))
-
-                    viewport_width = self.driver.execute_script("return document.body.clientWidth")
-                    viewport_height = self.driver.execute_script("return window.innerHeight")
-
-                    # self.driver.set_window_size(total_width, viewport_height)
-                    time.sleep(1) 
-
-                    screenshots = []
-                    current_scroll_y = 0
-
-                    while current_scroll_y < total_height:
-                        temp_screenshot_path = os.path.join(self.screenshot_dir, f"temp_screenshot_{current_scroll_y}.png")
-                        self.driver.save_screenshot(temp_screenshot_path)
-                        screenshots.append((temp_screenshot_path, current_scroll_y))
-
-                        scroll_amount = viewport_height - 10 # 10ピクセル重複させる例
-
-                        current_scroll_y += scroll_amount
-                        
-                        if current_scroll_y < total_height:
-                            self.driver.execute_script(f"window.scrollTo(0, {current_scroll_y});")
-                            time.sleep(1.0) 
-
-                    stitched_image = Image.new('RGB', (total_width, total_height))
-                    for img_path, scroll_y in screenshots:
-                        try:
-                            img = Image.open(img_path)
-                            stitched_image.paste(img, (0, scroll_y)) 
-                        except Exception as e:
-                            self._log("ERROR", f"画像ファイルの読み込みまたは結合中にエラーが発生しました: {e}")
-                        finally:
-                            if os.path.exists(img_path):
-                                os.remove(img_path)
-
-                    stitched_image.save(filepath)
-                    self._log("INFO", f"フルページスクリーンショットを結合して保存しました: {filepath}")
-
+                    # DevTools Protocolでスクロールせずにページ全体を撮影する
+                    with self.profiler.phase('screenshot.capture'):
+                        captured = capture_full_page_cdp(self.driver)
+                    self._submit_capture(captured, filepath)
+                    self._log("INFO", f"フルページスクリーンショットを撮影しました (DevTools, {len(captured.parts)} 分割): {filepath}")
                 except Exception as e:
-                    self._log("ERROR", f"フルページスクリーンショット（JavaScriptスクロール）の撮影中にエラーが発生しました: {e}")
-                    self._log("INFO", "表示領域のみのスクリーンショットを保存します。")
-                    self.driver.save_screenshot(filepath)
-                finally:
-                    self.driver.set_window_size(original_window_size['width'], original_window_size['height'])
-                    self.driver.execute_script(f"window.scrollTo(0, {original_scroll_position});")
-                    time.sleep(0.5)
+                    self._log("INFO", f"DevToolsでのフルページ撮影ができないため、スクロールして撮影します: {e}")
+                    self._take_scrolling_full_page_screenshot(filepath)
 
             else:
                 self._log("INFO", f"フルページスクリーンショットは現在のブラウザではサポートされていません。表示領域のみを保存します。")
-                self.driver.save_screenshot(filepath)
+                self._take_viewport_screenshot(filepath)
         else:
-            self.driver.save_screenshot(filepath)
+            self._take_viewport_screenshot(filepath)
+
+    def _take_viewport_screenshot(self, filepath):
+        """表示領域のスクリーンショットを撮影し、保存を予約します。"""
+        with self.profiler.phase('screenshot.capture'):
+            png_bytes = self.driver.get_screenshot_as_png()
+        self._submit_png(png_bytes, filepath)
+
+    def _submit_png(self, png_bytes, filepath):
+        """撮影したPNGのバイト列の保存を予約します。保存待ちが上限に達している場合は空きができるまで待機します。"""
+        if self.screenshot_store is not None:
+            self._submit_to_store(png_bytes, filepath)
+            return
+        self._log_image(filepath, filepath)
+        with self.profiler.phase('screenshot.queue'):
+            self.screenshot_writer.submit_png(png_bytes, filepath, self._screenshot_row())
 
-    def log_content(self, selector_type, selector_value, content_type, remark=""):
+    def _submit_capture(self, captured, filepath):
+        """フルページ撮影した画像の結合と保存を予約します。"""
+        if self.screenshot_store is not None:
+            self._submit_to_store(captured, filepath)
+            return
+        self._log_image(filepath, filepath)
+        with self.profiler.phase('screenshot.queue'):
+            self.screenshot_writer.submit_capture(captured, filepath, self._screenshot_row())
+
+    def _submit_to_store(self, data, filepath):
+        """
+        撮影した画像をスクリーンショットストアに登録し、ストアにない画像だけ保存を予約します。
+        ログには撮影したファイル名とストア内のパスを出力します。
+        """
+        with self.profiler.phase('screenshot.store'):
+            stored = self.screenshot_store.add(data, self._screenshot_step)
+        if stored.skipped:
+            self._log("INFO", f"前回の撮影との差分 ({stored.difference:.2%}) が閾値以下のため保存せず、前回の画像を参照します: {stored.path}")
+        elif not stored.new:
+            self._log("INFO", f"同じ内容の画像がストアにあるため保存しません: {stored.path}")
+        self._log_image(filepath, stored.path)
+        if stored.new:
+            with self.profiler.phase('screenshot.queue'):
+                self.screenshot_writer.submit_to_store(self.screenshot_store, data, stored.path,
+                                                       self._screenshot_row())
+
+    def _screenshot_row(self):
+        """保存を予約するスクリーンショットを撮影した行番号を返し、保存失敗の報告用に行のイテレーション番号を記録します。"""
+        if self._current_row is not None:
+            self._screenshot_rows[self._current_row] = self.iteration
+        return self._current_row
+
+    def _log_image(self, filepath, image_path):
+        """スクリーンショットの保存先をログに出力します。構造化ログでは画像のパスを artifact に記録します。"""
+        self._command_artifacts.append(image_path)
+        if isinstance(self._logger, BufferedJsonlLogger):
+            self._log("IMG", filepath, artifact=image_path)
+            return
+        self._log("IMG", f"![{filepath}]({image_path})")  # Markdown形式で画像リンクをログに出力
+        self._log("IMG", f'<a src="{image_path}" alt="{filepath}"')  # Markdown形式で画像リンクをログに出力
+
+    def _take_scrolling_full_page_screenshot(self, filepath):
+        """
+        表示領域ずつスクロールして撮影し、結合したフルページスクリーンショットの保存を予約します。
+        撮影した画像はメモリ上で扱い、保存時に帯ごとにデコードしてファイルへ逐次書き込みます。
+
+        Args:
+            filepath (str): 保存先のパス。
+        """
+        original_scroll_position = self.driver.execute_script("return window.pageYOffset;")
+        try:
+            with self.profiler.phase('screenshot.capture'):
+                captured = capture_full_page_scrolling(
+                    self.driver, settle=lambda: self._wait_for_page_ready(1.0, quiet_period=0.1))
+            self._submit_capture(captured, filepath)
+            self._log("INFO", f"フルページスクリーンショットを撮影しました (スクロール, {len(captured.parts)} 枚を結合): {filepath}")
+        except Exception as e:
+            self._log("ERROR", f"フルページスクリーンショット（JavaScriptスクロール）の撮影中にエラーが発生しました: {e}")
+            self._log("INFO", "表示領域のみのスクリーンショットを保存します。")
+            self._take_viewport_screenshot(filepath)
+        finally:
+            self.driver.execute_script(f"window.scrollTo(0, {original_scroll_position});")
+            self._wait_until(
+                lambda: self.driver.execute_script("return window.pageYOffset;") == original_scroll_position, 0.5)
+
+    def wait_for_screenshots(self):
+        """
+        バックグラウンドで保存中のスクリーンショットがすべて保存されるまで待機し、失敗をログに出力します。
+        実行時には成功した行のうち保存に失敗した行は、撮影したイテレーションごとに構造化ログと checkpoint に失敗として記録します。
+
+        Returns:
+            list: 保存に失敗したスクリーンショットを撮影したコマンドの行番号のリスト。
+        """
+        failed_rows = []
+        late_failures = {} # イテレーション番号 -> 実行時には成功した行番号のリスト
+        for filepath, row_number, error in self.screenshot_writer.wait():
+            location = f" (行 {row_number})" if row_number is not None else ""
+            self._log("ERROR", f"スクリーンショットの保存に失敗しました{location}: {filepath} - {error}", row=row_number,
+                      iteration=self._screenshot_rows.get(row_number))
+            if row_number is None or row_number in failed_rows:
+                continue
+            failed_rows.append(row_number)
+            if row_number in self._screenshot_rows:
+                late_failures.setdefault(self._screenshot_rows[row_number], []).append(row_number)
+        self._screenshot_rows.clear()
+        for iteration, rows in late_failures.items():
+            self._logger.event('rows_failed', rows=sorted(rows), iteration=iteration, reason='screenshot')
+            if self.checkpoint is not None:
+                self.checkpoint.mark_failed(rows)
+        return sorted(failed_rows)
+
+    def _merge_screenshot_failures(self, result):
+        """保存中のスクリーンショットの完了を待ち、保存に失敗した行を実行結果の失敗した行に加えます。"""
+        failed_rows = self.wait_for_screenshots()
+        if failed_rows:
+            result['failed_rows'] = sorted(set(result['failed_rows']) | set(failed_rows))
+        return result
+
+    def log_content(self, selector_type, selector_value, content_type, remark="", timeout=None):
         """
         指定されたセレクタの要素のテキスト内容または属性値をログに出力します。
 
@@ -239,27 +491,35 @@ class WebTestAutomation:
             selector_value (str): セレクタの値。
             content_type (str): 取得したい内容の種類 (text, value, または属性名)。
             remark (str): ログに対する備考。
+            timeout (float): 要素が表示されるまでの最大待機時間（秒）。Noneの場合は記録から算出した値または既定値。
         """
+        from selenium.common.exceptions import NoSuchElementException
         try:
-            element = self._get_element(selector_type, selector_value)
+            element = self._get_element(selector_type, selector_value, timeout)
             content = None
-            if content_type.lower() == 'text':
-                content = element.text
-            elif content_type.lower() == 'value':
-                content = element.get_attribute('value')
-            else:
-                content = element.get_attribute('text')
+            with self.profiler.phase('log_content.read'):
+                if content_type.lower() == 'text':
+                    content = element.text
+                elif content_type.lower() == 'value':
+                    content = element.get_attribute('value')
+                else:
+                    content = element.get_attribute('text')
             
-            log_msgs = [f"要素内容ログ: タイプ='{selector_type}'", f"値='{selector_value}'", f"取得内容='{content_type}'", f"結果='{content}'"]
-            if remark:
-                log_msgs.append(f"備考: {remark}")
-            for log_msg in log_msgs:
-                self._log("INFO", log_msg)
+            self._log_content_result(selector_type, selector_value, content_type, content, remark)
 
         except NoSuchElementException:
             self._log("ERROR", f"要素内容ログ失敗: 指定された要素が見つかりません - タイプ='{selector_type}', 値='{selector_value}'")
         except Exception as e:
             self._log("ERROR", f"要素内容ログ中に予期せぬエラーが発生しました: {e} (タイプ='{selector_type}', 値='{selector_value}')")
+
+    def _log_content_result(self, selector_type, selector_value, content_type, content, remark=""):
+        """log_content コマンドで取得した内容をログに出力します。"""
+        log_msgs = [f"要素内容ログ: タイプ='{selector_type}'", f"値='{selector_value}'", f"取得内容='{content_type}'", f"結果='{content}'"]
+        if remark:
+            log_msgs.append(f"備考: {remark}")
+        for log_msg in log_msgs:
+            self._log("INFO", log_msg)
+
     def log_remark(self, remark=""):
         """
         指定されたテキスト内容をログに出力します。
@@ -267,96 +527,516 @@ class WebTestAutomation:
         """
         self._log("TXT", remark)
 
+    def assert_screenshot(self, baseline_name, selector_type=None, selector_value=None, tolerance=0.0, mask='',
+                          full_page=False, remark=""):
+        """
+        スクリーンショットを撮影し、ベースライン画像と画素単位で比較します。
+        異なる画素の割合が tolerance を超える場合はエラーとし、差分を赤で示したdiff画像を保存します。
+        撮影した画像は通常のスクリーンショットと同じく保存されます。
+        ベースライン画像がない場合、または update_baselines がTrueの場合は、撮影した画像をベースラインとして保存します。
+
+        Args:
+            baseline_name (str): ベースライン画像のファイル名 (baseline_dir からの相対パス)。撮影した画像もこの名前で保存します。
+            selector_type (str): 要素だけを撮影する場合のセレクタのタイプ。Noneの場合は表示領域 (または画面全体)。
+            selector_value (str): 要素だけを撮影する場合のセレクタの値。
+            tolerance (float): 一致とみなす異なる画素の割合の上限 (0-1)。
+            mask (str): 比較しない領域。'x,y,幅,高さ' (画像のピクセル単位) またはCSSセレクタを ';' で区切って指定します。
+            full_page (bool): 画面全体を撮影するかどうか。
+            remark (str): 比較に関する備考。
+        """
+        from visual_compare import compare_images, parse_mask_spec # numpyは画像を比較する場合だけ必要
+
+        filepath = os.path.join(self.screenshot_dir, baseline_name)
+        baseline_path = os.path.join(self.baseline_dir, baseline_name)
+        self._log("INFO", f"スクリーンショットを比較中: {baseline_path} (備考: {remark}, 許容率: {tolerance:.3%}, 全画面: {full_page})")
+        self._screenshot_step = None
+        element = None
+        if selector_type and selector_type != '-':
+            element = self._get_element(selector_type, selector_value)
+        with self.profiler.phase('screenshot.capture'):
+            png_bytes = self._capture_png(element, full_page)
+        rects, selectors = parse_mask_spec(mask)
+        if selectors:
+            rects += self._mask_rects(selectors, element, full_page)
+        self._submit_png(png_bytes, filepath)
+
+        if self.update_baselines or not os.path.exists(baseline_path):
+            os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+            with open(baseline_path, 'wb') as f:
+                f.write(png_bytes)
+            level = "INFO" if self.update_baselines else "WARNING"
+            self._log(level, f"ベースライン画像を保存しました (比較は行いません): {baseline_path}")
+            return
+
+        diff_filepath = f"{os.path.splitext(filepath)[0]}_diff.png"
+        with self.profiler.phase('screenshot.compare'):
+            result = compare_images(baseline_path, png_bytes, name=baseline_name, pixel_threshold=self.pixel_threshold,
+                                    tolerance=tolerance, masks=rects, diff_filepath=diff_filepath)
+        if result.error:
+            self._log("ERROR", f"スクリーンショットがベースラインと一致しません: {baseline_path} - {result.error}")
+        elif not result.passed:
+            self._log("ERROR", f"スクリーンショットがベースラインと一致しません: {baseline_path} - 差分 {result.diff_ratio:.3%} "
+                               f"({result.diff_pixels} 画素, 範囲: {result.diff_bbox}, 許容率: {tolerance:.3%})")
+            self._log_image(diff_filepath, diff_filepath)
+        else:
+            self._log("INFO", f"スクリーンショットはベースラインと一致しました: {baseline_path} (差分 {result.diff_ratio:.3%})")
+
+    def _capture_png(self, element=None, full_page=False):
+        """比較用のスクリーンショットをPNGのバイト列で撮影します。フルページ撮影した画像はファイルを作成せずにメモリ上で結合します。"""
+        if element is not None:
+            return element.screenshot_as_png
+        if not full_page:
+            return self.driver.get_screenshot_as_png()
+        if self.driver.name == 'firefox':
+            return self.driver.get_full_page_screenshot_as_png()
+        if self.driver.name == 'chrome':
+            return captured_page_to_png(capture_full_page_cdp(self.driver), compress_level=1)
+        self._log("INFO", f"フルページスクリーンショットは現在のブラウザではサポートされていません。表示領域のみを比較します。")
+        return self.driver.get_screenshot_as_png()
+
+    def _mask_rects(self, selectors, element=None, full_page=False):
+        """
+        CSSセレクタに一致する要素の位置を、撮影した画像のピクセル単位の領域 (左, 上, 幅, 高さ) に変換します。
+
+        Args:
+            selectors (list): マスクする要素のCSSセレクタのリスト。
+            element (WebElement): 要素だけを撮影した場合の要素。
+            full_page (bool): 画面全体を撮影した場合はTrue。
+        """
+        page = self.driver.execute_script(MASK_RECTS_JS, selectors)
+        if element is not None:
+            origin_x, origin_y = element.rect['x'], element.rect['y']
+        elif full_page:
+            origin_x = origin_y = 0
+        else:
+            origin_x, origin_y = page['scrollX'], page['scrollY']
+        ratio = page['ratio']
+        rects = []
+        for x, y, width, height in page['rects']:
+            left = round((x - origin_x) * ratio)
+            top = round((y - origin_y) * ratio)
+            right = round((x - origin_x + width) * ratio)
+            bottom = round((y - origin_y + height) * ratio)
+            if right > 0 and bottom > 0:
+                rects.append((max(left, 0), max(top, 0), right - max(left, 0), bottom - max(top, 0)))
+        return rects
+
+
+    def _run_navigate(self, command):
+        self.navigate_to_url(command.value, wait_time=command.options.get('wait_time', 0))
+
+    def _run_input(self, command):
+        self.input_value(command.selector_type, command.selector_value, command.value,
+                         timeout=command.options.get('timeout'))
 
-    def execute_commands_from_csv(self, csv_filepath):
+    def _run_click(self, command):
+        self.click_element(command.selector_type, command.selector_value, timeout=command.options.get('timeout'),
+                           wait_time=command.options.get('wait_time', 0))
+
+    def _run_screenshot(self, command):
+        self.take_screenshot(command.value, remark=command.options.get('remark', ''),
+                             full_page=command.options.get('full_page', False), step=command.options.get('step'))
+
+    def _run_assert_screenshot(self, command):
+        self.assert_screenshot(command.value, command.selector_type, command.selector_value,
+                               tolerance=command.options.get('tolerance', 0.0), mask=command.options.get('mask', ''),
+                               full_page=command.options.get('full_page', False), remark=command.options.get('remark', ''))
+
+    def _run_log_content(self, command):
+        # 値/ファイルパスの列をcontent_typeとして使用
+        self.log_content(command.selector_type, command.selector_value, command.value,
+                         remark=command.options.get('remark', ''), timeout=command.options.get('timeout'))
+
+    def _run_log_remark(self, command):
+        self.log_remark(command.options.get('remark', ''))
+
+    # コマンド名から実行メソッドへのディスパッチテーブル
+    COMMAND_HANDLERS = {
+        'navigate': _run_navigate,
+        'input': _run_input,
+        'click': _run_click,
+        'screenshot': _run_screenshot,
+        'log_content': _run_log_content,
+        'log_remark': _run_log_remark,
+        'assert_screenshot': _run_assert_screenshot,
+    }
+
+    def execute_commands_from_csv(self, csv_filepath, rerun=None):
         """
         CSVファイルからコマンドを読み込み、実行します。
+        コマンドは実行前にすべて検証され、検証結果はファイル内容ごとにキャッシュされます。
 
         Args:
             csv_filepath (str): コマンドが記述されたCSVファイルのパス。
+            rerun (str): checkpoint.RESUME または checkpoint.RERUN_FAILED を指定すると、
+                checkpoint の記録を基に前回の続きの行または失敗した行 (と準備処理の行) だけを実行します。
+
+        Returns:
+            dict: 実行結果の集計 ('total': 実行した行数, 'failed_rows': エラーが発生した行番号のリスト)。
+
+        Raises:
+            ScenarioCompileError: シナリオにエラーがある場合。コマンドは1つも実行されません。
         """
         self._log("INFO", f"CSVファイル '{csv_filepath}' からコマンドの実行を開始します。")
-        with open(csv_filepath, 'r', encoding='sjis') as f:
-            reader = csv.reader(f)
-            header = next(reader) # ヘッダーを読み飛ばす
-
-            for i, row in enumerate(reader):
-                command = row[0].strip().lower()
-                selector_type = row[1].strip() if len(row) > 1 else ''
-                selector_value = row[2].strip() if len(row) > 2 else ''
-                value_or_path = row[3].strip() if len(row) > 3 else '' # log_contentではcontent_typeとして使用
-                option1 = row[4].strip() if len(row) > 4 else ''
-                option2 = row[5].strip() if len(row) > 5 else ''
-
-                options = {}
-                for opt_str in [option1, option2]:
-                    if '=' in opt_str:
-                        key, val = opt_str.split('=', 1)
-                        options[key.strip()] = val.strip()
-                
-                command_detail = f"コマンド: {command}"
-                if selector_type: command_detail += f", セレクタタイプ: {selector_type}"
-                if selector_value: command_detail += f", セレクタ値: {selector_value}"
-                if value_or_path: command_detail += f", 内容/ファイルパス/属性: {value_or_path}" # 表示を更新
-                if options: command_detail += f", オプション: {options}"
-                
-                self._log("INFO", f"--- コマンド実行中 (行 {i+2}) --- {command_detail}")
+        if self.scenario is None:
+            self.scenario = csv_filepath
+        try:
+            plan = compile_scenario(csv_filepath)
+        except ScenarioCompileError as e:
+            for error in e.errors:
+                self._log("ERROR", error)
+            raise
+        for warning in plan.warnings:
+            self._log("WARNING", warning)
+        return self._merge_screenshot_failures(self.execute_plan(self._select_for_rerun(plan.commands, rerun)))
+
+    def _select_for_rerun(self, commands, rerun):
+        """チェックポイントを基に再実行するコマンドを選択し、実行する行をログに出力します。"""
+        if rerun is None or self.checkpoint is None or not commands:
+            return commands
+        selected = select_commands(commands, self.checkpoint, rerun)
+        if not selected:
+            self._log("INFO", f"行 {commands[0].row_number}-{commands[-1].row_number} は前回の実行で完了しているため実行しません。")
+        else:
+            self._log("INFO", f"前回の実行のチェックポイントを基に {len(selected)} 行を実行します: "
+                              f"{', '.join(str(command.row_number) for command in selected[:20])}"
+                              f"{' ...' if len(selected) > 20 else ''}")
+        return selected
+
+    def execute_commands(self, rows, first_row_number=2, rerun=None):
+        """
+        コマンド行を検証してから順に実行します。検証エラーのある行はERRORログを出力して失敗として扱います。
+
+        Args:
+            rows (iterable): コマンド行 (ヘッダーを除いたCSVの行) のリスト。
+            first_row_number (int): 最初の行のログ上の行番号 (CSVファイル上の行番号に合わせる)。
+            rerun (str): checkpoint.RESUME または checkpoint.RERUN_FAILED (execute_commands_from_csv と同じ)。
+
+        Returns:
+            dict: 実行結果の集計 ('total': 実行した行数, 'failed_rows': エラーが発生した行番号のリスト)。
+        """
+        rows = list(rows)
+        commands, errors, warnings = compile_rows(rows, first_row_number)
+        for message in errors:
+            self._log("ERROR", message)
+        for message in warnings:
+            self._log("WARNING", message)
+        valid_rows = {command.row_number for command in commands}
+        result = self.execute_plan(self._select_for_rerun(commands, rerun))
+        if errors:
+            invalid_rows = [first_row_number + i for i, row in enumerate(rows)
+                            if any(cell.strip() for cell in row) and first_row_number + i not in valid_rows]
+            result['failed_rows'] = sorted(result['failed_rows'] + invalid_rows)
+            self._logger.event('rows_failed', rows=invalid_rows, iteration=self.iteration, reason='invalid')
+            if self.checkpoint is not None:
+                for row_number in invalid_rows:
+                    self.checkpoint.record(row_number, False, self.iteration)
+        return result
+
+    def execute_iterations(self, groups, first_row_number=2, rerun=None):
+        """
+        イテレーション (変数定義CSVの1行) ごとに分けたコマンド行を順に実行し、イテレーションの完了を checkpoint に記録します。
+        rerun を指定した場合、RESUME では完了していないイテレーション (途中で中断したものは続きの行から)、
+        RERUN_FAILED では失敗したイテレーションだけを実行します。イテレーションの外側の行 (準備処理) は常に実行します。
+
+        Args:
+            groups (iterable): (イテレーション番号, コマンド行のイテラブル) のイテレーター
+                (gen_scenario.iter_template_iterations の戻り値)。外側の行のイテレーション番号はNone。
+            first_row_number (int): 最初の行のログ上の行番号。
+            rerun (str): checkpoint.RESUME または checkpoint.RERUN_FAILED。
+
+        Returns:
+            dict: 実行結果の集計 ('total': 実行した行数, 'failed_rows': エラーが発生した行番号のリスト)。
+        """
+        result = {'total': 0, 'failed_rows': []}
+        row_number = first_row_number
+        checkpoint = self.checkpoint
+        failed_iterations = set(checkpoint.failed_iterations()) if checkpoint is not None else set()
+        for iteration, rows in groups:
+            rows = list(rows)
+            group_rerun = None
+            if iteration is not None and rerun is not None and checkpoint is not None:
+                if rerun == RESUME:
+                    done = iteration in checkpoint.iterations
+                else:
+                    done = iteration not in failed_iterations
+                if done:
+                    row_number += len(rows) # 完了済み (RERUN_FAILEDでは失敗していない) イテレーションは実行しない
+                    continue
+                if rerun == RESUME:
+                    group_rerun = RESUME # 途中で中断したイテレーションは続きの行から実行する
+            if self.budget_exceeded:
+                break
+            self.iteration = iteration
+            if iteration is not None:
+                # イテレーション番号は外側の全 'for' ブロックを通した番号のため、変数定義CSVの行番号には換算しない
+                self._log("INFO", f"=== イテレーション {iteration} を開始します ===")
+                if checkpoint is not None and group_rerun is None:
+                    checkpoint.start_iteration(iteration)
+            group_result = self.execute_commands(rows, row_number, group_rerun)
+            result['total'] += group_result['total']
+            result['failed_rows'].extend(group_result['failed_rows'])
+            if iteration is not None and checkpoint is not None and not self.budget_exceeded:
+                checkpoint.end_iteration(iteration)
+            row_number += len(rows)
+        self.iteration = None
+        return self._merge_screenshot_failures(result)
+
+    def execute_stream(self, rows, first_row_number=2, chunk_size=100):
+        """
+        コマンド行をイテレーター (テンプレートの展開結果など) から読み込みながら実行します。
+        全体を事前に検証せず、chunk_size 行ずつ検証して実行するため、行数が多くても最初の行からすぐに実行を開始します。
+        検証エラーのある行はERRORログを出力して失敗として扱います。
+
+        Args:
+            rows (iterable): コマンド行 (ヘッダーを除いたCSVの行) のイテレーター。
+            first_row_number (int): 最初の行のログ上の行番号。
+            chunk_size (int): まとめて検証・実行する行数。
+
+        Returns:
+            dict: 実行結果の集計 ('total': 実行した行数, 'failed_rows': エラーが発生した行番号のリスト)。
+        """
+        result = {'total': 0, 'failed_rows': []}
+        rows = iter(rows)
+        row_number = first_row_number
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            chunk_result = self.execute_commands(chunk, row_number)
+            result['total'] += chunk_result['total']
+            result['failed_rows'].extend(chunk_result['failed_rows'])
+            row_number += len(chunk)
+        return self._merge_screenshot_failures(result)
+
+    def execute_plan(self, commands):
+        """
+        コンパイル済みのコマンドを順に実行します。
+        batch_commands が有効な場合、連続する input / log_content はページ内でまとめて実行し、
+        まとめて実行できなかったコマンドは通常の方法で実行します。ログは1行ごとに従来と同じ内容を出力します。
+        time_budget を超えた場合は残りのコマンドを実行せず、失敗した行として集計します。
+        制限時間はまとめて実行する前と、まとめて実行できなかったコマンドを実行する前にも確認します。
+        スクリーンショットの保存の完了は待ちません。保存の失敗は wait_for_screenshots() (close() でも呼び出されます) で
+        撮影した行の失敗として報告されます。
+
+        Args:
+            commands (list): scenario_compiler.Command のリスト。
+
+        Returns:
+            dict: 実行結果の集計 ('total': 実行した行数, 'failed_rows': エラーが発生した行番号のリスト)。
+        """
+        result = {'total': 0, 'failed_rows': []}
+        self._log_run_start()
+        if self.time_budget is not None and self._budget_deadline is None:
+            self._budget_deadline = time.monotonic() + self.time_budget
+        i = 0
+        unbatched = None # ページ内で実行できなかったコマンドの位置 (通常の方法で実行する)
+        while i < len(commands):
+            if self._remaining_budget() == 0:
+                skipped = [command.row_number for command in commands[i:]]
+                self._log("ERROR", f"制限時間 {self.time_budget} 秒を超えたため、残りの {len(skipped)} 行を実行せずに終了します。")
+                result['failed_rows'].extend(skipped)
+                self._logger.event('rows_failed', rows=skipped, iteration=self.iteration, reason='time_budget')
+                self.budget_exceeded = True
+                break
+            if self.batch_commands and i != unbatched:
+                batch = collect_batch(commands, i)
+                if len(batch) >= 2:
+                    done = self._execute_batch(batch)
+                    result['total'] += done
+                    i += done
+                    # ページ内で実行できなかったコマンドは、制限時間を確認してから要素の出現を待つ通常の方法で実行する
+                    unbatched = i
+                    continue
+            self._execute_command(commands[i], result)
+            i += 1
+
+        self._current_row = None
+        return result
+
+    def _execute_command(self, command, result):
+        """
+        1つのコマンドを実行し、結果を result に集計します。
+
+        Args:
+            command (Command): 実行するコマンド。
+            result (dict): 実行結果の集計。
+        """
+        from selenium.common.exceptions import NoSuchElementException
+        start = time.perf_counter()
+        self._current_row = command.row_number
+        self._command_errors = []
+        self._command_artifacts = []
+        self._log("INFO", f"--- コマンド実行中 (行 {command.row_number}) --- {command.detail}")
+        errors_before = self.error_count
+        self._command_wait_time = 0.0
+        self.profiler.start_command(command.row_number, command.name)
+
+        try:
+            self.COMMAND_HANDLERS[command.name](self, command)
+        except NoSuchElementException as e:
+            self._log("ERROR", f"エラー: 要素が見つかりません - {e}")
+        except Exception as e:
+            self._log("ERROR", f"コマンド実行中に予期せぬエラーが発生しました: {e}")
+
+        failed = self.error_count > errors_before
+        self.profiler.finish_command(self._command_wait_time, failed)
+        if self._command_wait_time > 0:
+            self._log("INFO", f"行 {command.row_number} の待機時間: {self._command_wait_time:.3f} 秒")
+        result['total'] += 1
+        if failed:
+            result['failed_rows'].append(command.row_number)
+            self._screenshot_rows.pop(command.row_number, None) # 失敗として記録済みのため保存の失敗は報告のみ
+        if self.checkpoint is not None:
+            self.checkpoint.record(command.row_number, not failed, self.iteration)
+        self._logger.event('command', row=command.row_number, iteration=self.iteration, command=command.name,
+                           status='failed' if failed else 'passed', duration=round(time.perf_counter() - start, 4),
+                           wait_time=round(self._command_wait_time, 4), errors=self._command_errors,
+                           artifacts=self._command_artifacts)
+
+    def _execute_batch(self, commands):
+        """
+        連続する input / log_content コマンドを1回の execute_script でまとめて実行します。
+        要素が見つからない・表示されていない・入力できないコマンドに達した時点で停止します。
+        timeout_history がある場合は、実行できたコマンドの要素の所要時間 (まとめて実行した時間を件数で割った値) を記録します。
+
+        Args:
+            commands (list): input / log_content の Command のリスト。
+
+        Returns:
+            int: ページ内で実行できたコマンドの数 (先頭から数えた件数)。
+        """
+        start = time.monotonic()
+        round_trips_before = self.profiler.round_trips()
+        try:
+            contents = self.driver.execute_script(BATCH_JS, batch_steps(commands))
+        except Exception as e:
+            self._log("INFO", f"コマンドをまとめて実行できないため、1行ずつ実行します: {e}")
+            return 0
+        if not isinstance(contents, list):
+            return 0
+        duration = time.monotonic() - start
+        self.profiler.record_batch(commands[:len(contents)], duration,
+                                   self.profiler.round_trips() - round_trips_before)
+
+        for command, content in zip(commands, contents):
+            self._current_row = command.row_number
+            if self.timeout_history is not None:
+                # ページ内で待機せずに見つかった要素として記録する
+                self.timeout_history.record(self._page_url, command.selector_type, command.selector_value,
+                                            duration / len(contents))
+            self._log("INFO", f"--- コマンド実行中 (行 {command.row_number}) --- {command.detail}")
+            if command.name == 'input':
+                self._log_input(command.selector_type, command.selector_value, command.value)
+            else:
+                self._log_content_result(command.selector_type, command.selector_value, command.value, content,
+                                         command.options.get('remark', ''))
+            if self.checkpoint is not None:
+                self.checkpoint.record(command.row_number, True, self.iteration)
+            self._logger.event('command', row=command.row_number, iteration=self.iteration, command=command.name,
+                               status='passed', duration=round(duration / len(contents), 4), wait_time=0.0,
+                               errors=[], artifacts=[], batch=True)
+        return len(contents)
 
-                try:
-                    if command == 'navigate':
-                        wait_time = int(options.get('wait_time', 0))
-                        self.navigate_to_url(value_or_path, wait_time=wait_time)
-                    elif command == 'input':
-                        self.input_value(selector_type, selector_value, value_or_path)
-                    elif command == 'click':
-                        self.click_element(selector_type, selector_value)
-                    elif command == 'screenshot':
-                        remark = options.get('remark', '')
-                        full_page = options.get('full_page', '').lower() == 'true'
-                        self.take_screenshot(value_or_path, remark=remark, full_page=full_page)
-                    elif command == 'log_content':
-                        content_type = value_or_path # 値/ファイルパスの列をcontent_typeとして使用
-                        remark = options.get('remark', '')
-                        self.log_content(selector_type, selector_value, content_type, remark=remark)
-                    elif command == 'log_remark':
-                        remark = options.get('remark', '')
-                        self.log_remark(remark)
-                    else:
-                        self._log("WARNING", f"不明なコマンドをスキップしました: {command}")
-                except NoSuchElementException as e:
-                    self._log("ERROR", f"エラー: 要素が見つかりません - {e}")
-                except Exception as e:
-                    self._log("ERROR", f"コマンド実行中に予期せぬエラーが発生しました: {e}")
-                
     def close(self):
-        """WebDriverを閉じます。"""
-        self._log("INFO", "ブラウザを閉じます。")
-        self.driver.quit()
+        """
+        保存中のスクリーンショットの完了を待ち、WebDriverを閉じます。
+        外部から渡されたWebDriverの場合はブラウザを終了せず、呼び出し元 (セッションプールなど) に返します。
+        """
+        self.wait_for_screenshots()
+        self.screenshot_writer.close()
+        if self.profile_report:
+            try:
+                self.profiler.write_report(self.profile_report)
+                self._log("INFO", f"プロファイルレポートを保存しました: {self.profile_report}")
+            except Exception as e:
+                self._log("WARNING", f"プロファイルレポートの保存中にエラーが発生しました: {e}")
+        if self.timeout_history is not None:
+            try:
+                self.timeout_history.save()
+            except Exception as e:
+                self._log("WARNING", f"待機時間の記録の保存中にエラーが発生しました: {e}")
+        if self.checkpoint is not None:
+            try:
+                self.checkpoint.save()
+            except Exception as e:
+                self._log("WARNING", f"チェックポイントの保存中にエラーが発生しました: {e}")
+        if self._owns_driver:
+            self._log("INFO", "ブラウザを閉じます。")
+            self.driver.quit()
+        else:
+            self._log("INFO", "ブラウザのセッションを返却します。")
         self._log("INFO", "テスト実行が完了しました。") # 終了ログ
+        if self._run_logged:
+            self._logger.event('run_end', scenario=self.scenario, errors=self.error_count,
+                               budget_exceeded=self.budget_exceeded)
+        self._logger.close()
+        if self._logger.write_error:
+            print(f"ログファイルの書き込み中にエラーが発生しました: {self._logger.write_error}")
 
-# --- 使用例 ---
-if __name__ == "__main__":
-    # CSVファイルのパス
-    csv_filename = input("テストに使用するCSVファイルのパスを入力してください (例: 'test_scenario.csv'): ")
-    # csv_filename = 'test_scenario.csv'
-    # CSVファイルが存在するか確認
-    if not os.path.exists(csv_filename):
-        print(f"エラー: 指定されたCSVファイルが存在しません: {csv_filename}")
-        exit(1)
-    # スクリーンショットの保存先ディレクトリとログファイルのパス
-    output_dir_name = f"{Path(csv_filename).stem}_{datetime.now().strftime("%Y%m%d_%H%M%S")}"
-    screenshot_dir= f'.\\{output_dir_name}_screenshots'
-    log_filepath=f'{output_dir_name}.csv'
-    # テスト実行
+def build_output_paths(csv_filename, output_root='.', suffix='', log_format='csv'):
+    """
+    シナリオCSVに対応するスクリーンショット保存先とログファイルのパスを生成します。
+
+    Args:
+        csv_filename (str): シナリオCSVファイルのパス。
+        output_root (str): 出力先のディレクトリ。
+        suffix (str): 出力名の末尾に付ける文字列 (同名シナリオの区別用)。
+        log_format (str): ログの形式 ('csv' または 'jsonl')。ログファイルの拡張子になります。
+
+    Returns:
+        tuple: (スクリーンショットの保存先ディレクトリ, ログファイルのパス)。
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_dir_name = f"{Path(csv_filename).stem}_{timestamp}{suffix}"
+    screenshot_dir = os.path.join(output_root, f"{output_dir_name}_screenshots")
+    log_filepath = os.path.join(output_root, f"{output_dir_name}.{log_format}")
+    return screenshot_dir, log_filepath
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="シナリオCSVのコマンドを1つのブラウザで順に実行します。")
+    parser.add_argument('scenario', help="シナリオCSVファイルのパス (例: test_scenario.csv)")
+    parser.add_argument('-b', '--browser', default='chrome', choices=SUPPORTED_BROWSERS, help="使用するブラウザ")
+    parser.add_argument('-o', '--output-dir', default='.', help="ログとスクリーンショットの出力先ディレクトリ")
+    parser.add_argument('-q', '--quiet', action='store_true', help="ログをコンソールに出力しない (ログファイルのみ)")
+    parser.add_argument('--driver-profile', metavar='NAME', help="ブラウザのドライバープロファイル (default / headless / fast)")
+    parser.add_argument('--log-format', choices=['csv', 'jsonl'], default='csv', help="ログの形式")
+    parser.add_argument('--validate-only', action='store_true', help="ブラウザを起動せずにシナリオを検証して終了する")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.scenario):
+        print(f"エラー: 指定されたCSVファイルが存在しません: {args.scenario}")
+        return 1
+    # ブラウザを起動する前にシナリオ全体とドライバープロファイルを検証する
     try:
-        automation = WebTestAutomation(browser='chrome', screenshot_dir=screenshot_dir, log_filepath=log_filepath)
-        
-        automation.execute_commands_from_csv(csv_filename)
+        plan = compile_scenario(args.scenario)
+        # ヘッダー行の 'profile=' の設定を --driver-profile より優先する (parallel_runner と同じ)
+        driver_profile = resolve_profile(plan.directives.get('profile') or args.driver_profile)
+    except (ScenarioCompileError, ValueError) as e:
+        print(f"エラー: {e}")
+        return 1
+    if args.validate_only:
+        print(f"シナリオ '{args.scenario}' にエラーはありません。")
+        return 0
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    screenshot_dir, log_filepath = build_output_paths(args.scenario, args.output_dir, log_format=args.log_format)
+    automation = None
+    try:
+        automation = WebTestAutomation(browser=args.browser, screenshot_dir=screenshot_dir, log_filepath=log_filepath,
+                                       log_echo=not args.quiet, driver_profile=driver_profile)
+        result = automation.execute_commands_from_csv(args.scenario)
+        passed = not result['failed_rows'] and automation.error_count == 0
     except Exception as e:
-        if 'automation' in locals():
+        passed = False
+        if automation is not None:
             automation._log("CRITICAL", f"テスト実行中に重大なエラーが発生しました: {e}")
         else:
             print(f"テスト実行開始前に重大なエラーが発生しました: {e}")
     finally:
-        if 'automation' in locals() and automation.driver:
-            automation.close()
\ No newline at end of file
+        if automation is not None and automation.driver:
+            automation.close()
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,19 @@
+import csv
+import os
+import sys
+
+import pytest
+
+# テスト対象のモジュールはリポジトリ直下に置かれているため、パッケージとしてではなく直接読み込む
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    """行のリストをShift-JISのCSVファイルとして tmp_path に書き込み、パスを返す関数。"""
+    def write(name, rows):
+        filepath = tmp_path / name
+        with open(filepath, 'w', newline='', encoding='sjis') as f:
+            csv.writer(f).writerows(rows)
+        return str(filepath)
+    return write
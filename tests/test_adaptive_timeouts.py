@@ -0,0 +1,54 @@
+import json
+
+from adaptive_timeouts import AdaptiveTimeouts, url_pattern
+
+
+def test_url_pattern_replaces_variable_segments():
+    assert url_pattern('https://example.com/users/123/orders/0f8fad5b-d9cb-469f-a165-70867728950e?x=1') == \
+        url_pattern('https://example.com/users/456/orders/7c9e6679-7425-40de-944b-e07fc1f90ae7?x=2')
+    assert url_pattern('https://example.com/users/123') != url_pattern('https://example.com/items/123')
+
+
+def test_timeout_uses_default_until_enough_samples(tmp_path):
+    history = AdaptiveTimeouts(str(tmp_path / 'history.json'), min_samples=3, safety_factor=2.0, floor=0.5, ceiling=5.0)
+    for seconds in (0.4, 0.5):
+        history.record('https://example.com/a', 'id', 'q', seconds)
+    assert history.timeout_for('https://example.com/a', 'id', 'q', 10) == 10
+    history.record('https://example.com/a', 'id', 'q', 0.6)
+    assert 0.5 <= history.timeout_for('https://example.com/a', 'id', 'q', 10) <= 1.2
+    for _ in range(5):
+        history.record('https://example.com/a', 'id', 'q', 60)
+    assert history.timeout_for('https://example.com/a', 'id', 'q', 10) == 5.0
+
+
+def test_parent_merges_worker_samples(tmp_path):
+    filepath = str(tmp_path / 'history.json')
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump({'existing': [1.0]}, f)
+
+    workers = []
+    for seconds in (0.1, 0.2):
+        worker = AdaptiveTimeouts(filepath)
+        worker.record('https://example.com/a', 'id', 'q', seconds)
+        workers.append(worker.take_new_samples())
+        worker.save() # 取り出した記録は保存しない
+    with open(filepath, 'r', encoding='utf-8') as f:
+        assert json.load(f) == {'existing': [1.0]}
+
+    parent = AdaptiveTimeouts(filepath)
+    for samples in workers:
+        parent.add_samples(samples)
+    parent.save()
+    key = AdaptiveTimeouts.make_key('https://example.com/a', 'id', 'q')
+    with open(filepath, 'r', encoding='utf-8') as f:
+        assert json.load(f) == {'existing': [1.0], key: [0.1, 0.2]}
+
+
+def test_save_keeps_latest_samples(tmp_path):
+    filepath = str(tmp_path / 'history.json')
+    history = AdaptiveTimeouts(filepath, max_samples=3)
+    for i in range(5):
+        history.record('https://example.com/a', 'id', 'q', i)
+    history.save()
+    with open(filepath, 'r', encoding='utf-8') as f:
+        assert list(json.load(f).values()) == [[2, 3, 4]]
@@ -0,0 +1,51 @@
+import base64
+import io
+
+from PIL import Image
+
+from batch_commands import BATCH_JS
+from benchmark import BENCHMARKS, FakeDriver, compare_results, run_benchmark
+from fullpage_capture import capture_full_page_cdp, capture_full_page_scrolling
+from wait_engine import PAGE_STATE_JS
+
+
+def test_fake_driver_reports_ready_page_and_batch_results():
+    driver = FakeDriver()
+    assert driver.execute_script(PAGE_STATE_JS)['readyState'] == 'complete'
+    steps = [{'command': 'input', 'selector_value': 'a'}, {'command': 'log_content', 'selector_value': 'b'}]
+    assert driver.execute_script(BATCH_JS, steps) == [None, 'fixture:b']
+    assert driver.find_element('id', 'title').text == 'fixture:title'
+    assert driver.calls == ['execute_script', 'execute_script', 'find_element']
+
+
+def test_fake_driver_full_page_capture():
+    driver = FakeDriver(page_height=5000, viewport=(320, 200))
+    captured = capture_full_page_cdp(driver, band_height=4096)
+    assert captured.total_height == 5000
+    assert [(top, height) for _, top, height in captured.parts] == [(0, 4096), (4096, 904)]
+    with Image.open(io.BytesIO(captured.parts[1][0])) as image:
+        assert image.size == (320, 904)
+
+    scrolled = capture_full_page_scrolling(driver, overlap=10)
+    assert [top for _, top, _ in scrolled.parts][:3] == [0, 190, 380]
+    assert scrolled.parts[-1][1] == 4800 # 末尾ではスクロール位置がページの高さで止まる
+    assert base64.b64decode(base64.b64encode(scrolled.parts[0][0])) == driver.get_screenshot_as_png()
+
+
+def test_run_benchmark_summarises_times(tmp_path):
+    result = run_benchmark('compile_rows', BENCHMARKS['compile_rows'], str(tmp_path), 0.01, 3)
+    assert result['params'] == {'items': 200}
+    assert len(result['times']) == 3
+    assert result['min'] <= result['median'] <= max(result['times'])
+    assert result['items_per_second'] > 0
+
+
+def test_compare_results_reports_regressions(capsys):
+    baseline = {'commit': 'abc', 'results': {'a': {'params': {'items': 1}, 'median': 1.0},
+                                             'b': {'params': {'items': 1}, 'median': 1.0},
+                                             'c': {'params': {'items': 2}, 'median': 1.0}}}
+    results = {'a': {'params': {'items': 1}, 'median': 1.5}, 'b': {'params': {'items': 1}, 'median': 0.5},
+               'c': {'params': {'items': 1}, 'median': 1.0}, 'd': {'params': {}, 'median': 1.0}}
+    assert compare_results(results, baseline, threshold=0.1) == ['a']
+    output = capsys.readouterr().out
+    assert "(改善)" in output and "パラメーターが異なる" in output and "ベースラインに結果がありません" in output
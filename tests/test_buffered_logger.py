@@ -0,0 +1,80 @@
+import csv
+import json
+
+from buffered_logger import BufferedCsvLogger, BufferedJsonlLogger, jsonl_segment_path
+
+
+def _read_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def _read_csv(path):
+    with open(path, 'r', newline='', encoding='sjis') as f:
+        return list(csv.reader(f))
+
+
+def test_csv_logger_writes_header_and_rows(tmp_path):
+    filepath = str(tmp_path / 'log.csv')
+    logger = BufferedCsvLogger(filepath, echo=False, batch_size=3)
+    for i in range(10):
+        logger.log("INFO", f"メッセージ{i}")
+    logger.close()
+    logger.close() # 複数回呼び出しても安全
+    logger.log("ERROR", "close後")
+
+    rows = _read_csv(filepath)
+    assert rows[0] == ['タイムスタンプ', 'レベル', 'メッセージ']
+    assert [row[2] for row in rows[1:]] == [f"メッセージ{i}" for i in range(10)] + ["close後"]
+    assert rows[-1][1] == "ERROR"
+
+
+def test_csv_logger_replaces_unencodable_characters(tmp_path):
+    filepath = str(tmp_path / 'log.csv')
+    logger = BufferedCsvLogger(filepath, echo=False)
+    logger.log("INFO", "絵文字 \U0001F600")
+    logger.close()
+    assert logger.write_error is None
+    assert _read_csv(filepath)[1][2] == "絵文字 ?"
+
+
+def test_flush_waits_for_queued_logs(tmp_path):
+    filepath = str(tmp_path / 'log.csv')
+    logger = BufferedCsvLogger(filepath, echo=False, flush_interval=0.1)
+    logger.log("INFO", "a")
+    logger.flush()
+    assert [row[2] for row in _read_csv(filepath)[1:]] == ["a"]
+    logger.close()
+
+
+def test_jsonl_records_and_events(tmp_path):
+    filepath = str(tmp_path / 'log.jsonl')
+    logger = BufferedJsonlLogger(filepath, echo=False)
+    logger.log("INFO", "入力中", row=3, artifact=None)
+    logger.event('command', command='input', status='passed', duration=0.5)
+    logger.close()
+    log, event = _read_jsonl(filepath)
+    assert log['level'] == "INFO" and log['message'] == "入力中" and log['row'] == 3 and 'artifact' not in log
+    assert event['event'] == 'command' and event['status'] == 'passed' and 'ts' in event
+
+
+def test_jsonl_rotation(tmp_path):
+    filepath = str(tmp_path / 'log.jsonl')
+    logger = BufferedJsonlLogger(filepath, echo=False, batch_size=7, max_bytes=1000)
+    for i in range(100):
+        logger.event('command', row=i)
+    logger.close()
+    assert logger.segment > 1
+
+    records = []
+    for index in range(1, logger.segment + 1):
+        path = jsonl_segment_path(filepath, index)
+        assert (tmp_path / path).stat().st_size <= 1000
+        records += _read_jsonl(path)
+    assert [record['row'] for record in records] == list(range(100))
+    assert logger.current_path == jsonl_segment_path(filepath, logger.segment)
+
+
+def test_jsonl_segment_path():
+    assert jsonl_segment_path('logs/run.jsonl', 1) == 'logs/run.jsonl'
+    assert jsonl_segment_path('logs/run.jsonl', 3) == 'logs/run.3.jsonl'
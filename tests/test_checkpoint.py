@@ -0,0 +1,101 @@
+import os
+
+from checkpoint import RERUN_FAILED, RESUME, RunCheckpoint, load_checkpoint, select_commands, shard_checkpoint_path
+from scenario_compiler import compile_rows
+
+
+def _commands(setup_login=False):
+    rows = [
+        ['navigate', '', '', 'https://example.com/login', '', ''], # 2
+        ['input', 'id', 'user', 'alice', 'setup=True' if setup_login else '', ''], # 3
+        ['click', 'id', 'login', '', '', ''], # 4
+        ['navigate', '', '', 'https://example.com/form', '', ''], # 5
+        ['input', 'id', 'q', 'a', '', ''], # 6
+        ['log_content', 'id', 'result', 'text', '', ''], # 7
+        ['log_remark', '', '', '', 'remark=end', ''], # 8
+    ]
+    commands, errors, _ = compile_rows(rows)
+    assert errors == []
+    return commands
+
+
+def _checkpoint(tmp_path, results):
+    checkpoint = RunCheckpoint(str(tmp_path / 'run.json'))
+    for row_number, passed in results:
+        checkpoint.record(row_number, passed)
+    return checkpoint
+
+
+def _rows(commands):
+    return [command.row_number for command in commands]
+
+
+def test_resume_includes_preceding_navigate(tmp_path):
+    checkpoint = _checkpoint(tmp_path, [(2, True), (3, True), (4, True), (5, True), (6, True)])
+    assert _rows(select_commands(_commands(), checkpoint, RESUME)) == [5, 7, 8]
+
+
+def test_rerun_failed_includes_preceding_navigate(tmp_path):
+    checkpoint = _checkpoint(tmp_path, [(row, row != 6) for row in range(2, 9)])
+    assert _rows(select_commands(_commands(), checkpoint, RERUN_FAILED)) == [5, 6]
+
+
+def test_setup_rows_replace_navigate(tmp_path):
+    checkpoint = _checkpoint(tmp_path, [(row, row != 7) for row in range(2, 9)])
+    assert _rows(select_commands(_commands(setup_login=True), checkpoint, RERUN_FAILED)) == [3, 7]
+
+
+def test_setup_rows_after_last_target_are_not_included(tmp_path):
+    checkpoint = _checkpoint(tmp_path, [(2, False)] + [(row, True) for row in range(3, 9)])
+    assert _rows(select_commands(_commands(setup_login=True), checkpoint, RERUN_FAILED)) == [2]
+
+
+def test_nothing_to_run(tmp_path):
+    checkpoint = _checkpoint(tmp_path, [(row, True) for row in range(2, 9)])
+    assert select_commands(_commands(), checkpoint, RERUN_FAILED) == []
+    assert select_commands(_commands(), checkpoint, RESUME) == []
+    assert not checkpoint.needs_rerun(RERUN_FAILED)
+    assert checkpoint.needs_rerun(RESUME) # mark_complete() していない
+
+
+def test_save_and_load_round_trip(tmp_path):
+    filepath = str(tmp_path / 'run.json')
+    checkpoint = RunCheckpoint(filepath, fingerprint='abc')
+    checkpoint.record(2, True)
+    checkpoint.record(3, True, iteration=0)
+    checkpoint.record(4, False, iteration=0)
+    checkpoint.end_iteration(0)
+    checkpoint.record(5, True, iteration=1)
+    checkpoint.end_iteration(1)
+    checkpoint.mark_complete()
+    checkpoint.save()
+
+    loaded = load_checkpoint(filepath, fingerprint='abc')
+    assert loaded.status == checkpoint.status
+    assert loaded.row_iterations == {3: 0, 4: 0, 5: 1}
+    assert loaded.iterations == {0: False, 1: True}
+    assert loaded.failed_iterations() == [0]
+    assert loaded.last_row == 5 and loaded.complete
+
+
+def test_load_ignores_changed_scenario(tmp_path, capsys):
+    filepath = str(tmp_path / 'run.json')
+    checkpoint = RunCheckpoint(filepath, fingerprint='abc')
+    checkpoint.record(2, True)
+    checkpoint.save()
+    assert load_checkpoint(filepath, fingerprint='changed') is None
+    assert "シナリオが変更されている" in capsys.readouterr().out
+
+
+def test_load_merges_shard_checkpoints(tmp_path):
+    filepath = str(tmp_path / 'run.json')
+    for shard, (row_number, passed) in enumerate([(3, True), (4, False)], start=1):
+        checkpoint = RunCheckpoint(shard_checkpoint_path(filepath, shard))
+        checkpoint.record(row_number, passed, iteration=shard - 1)
+        checkpoint.end_iteration(shard - 1)
+    assert not os.path.exists(filepath)
+
+    merged = load_checkpoint(filepath)
+    assert merged.status == {3: True, 4: False}
+    assert merged.iterations == {0: True, 1: False}
+    assert merged.failed_rows() == [4]
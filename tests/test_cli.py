@@ -0,0 +1,50 @@
+import csv
+import os
+import subprocess
+import sys
+
+import pytest
+
+import test_automation
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADER = ['コマンド', 'セレクタタイプ', 'セレクタ値', '内容/ファイルパス/属性', 'オプション1', 'オプション2']
+
+# 別のプロセスでモジュールを読み込み (引数があれば main() を実行し)、読み込まれた重いモジュールを出力する
+PROBE = """
+import sys
+sys.path.insert(0, {root!r})
+import {module}
+code = {module}.main(sys.argv[1:]) if len(sys.argv) > 1 else 0
+print(sorted(name for name in ('selenium', 'PIL', 'numpy') if name in sys.modules))
+sys.exit(code)
+"""
+
+
+def _write_scenario(directory, profile):
+    filepath = os.path.join(directory, 'scenario.csv')
+    with open(filepath, 'w', newline='', encoding='sjis') as f:
+        csv.writer(f).writerows([HEADER + [f'profile={profile}'], ['navigate', '', '', 'https://example.com', '', '']])
+    return filepath
+
+
+@pytest.mark.parametrize('profile, code', [('fast', 0), ('unknown', 1)])
+def test_validate_only_checks_profile_directive(tmp_path, monkeypatch, profile, code):
+    monkeypatch.chdir(tmp_path) # 実行計画のキャッシュを作業ディレクトリに作成するため
+    assert test_automation.main([_write_scenario(tmp_path, profile), '--validate-only']) == code
+
+
+def _probe(module, args, cwd):
+    completed = subprocess.run([sys.executable, '-c', PROBE.format(root=ROOT, module=module)] + args, cwd=cwd,
+                               capture_output=True, text=True, timeout=60)
+    return completed.returncode, completed.stdout.strip().splitlines()[-1]
+
+
+@pytest.mark.parametrize('module', ['test_automation', 'parallel_runner', 'cli'])
+def test_cli_modules_do_not_load_heavy_dependencies(tmp_path, module):
+    assert _probe(module, [], tmp_path) == (0, '[]')
+
+
+def test_validate_only_does_not_load_selenium(tmp_path):
+    assert _probe('test_automation', [_write_scenario(tmp_path, 'fast'), '--validate-only'], tmp_path) == (0, '[]')
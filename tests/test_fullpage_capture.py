@@ -0,0 +1,61 @@
+import io
+
+import pytest
+from PIL import Image
+
+from fullpage_capture import CapturedPage, captured_page_to_png, save_captured_page
+
+
+def _png(color, size=(40, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_single_part_is_written_as_is(tmp_path):
+    data = _png('white')
+    filepath = str(tmp_path / 'page.png')
+    assert save_captured_page(CapturedPage(30, [(data, 0, 30)]), filepath) == len(data)
+    with open(filepath, 'rb') as f:
+        assert f.read() == data
+
+
+def test_parts_are_stitched_with_overlap_and_gaps(tmp_path):
+    # 2枚目は1枚目と10ピクセル重複し、3枚目の前には撮影できなかった隙間がある
+    captured = CapturedPage(100, [(_png('red'), 0, 30), (_png('green'), 20, 30), (_png('blue'), 60, 30)])
+    filepath = str(tmp_path / 'page.png')
+    save_captured_page(captured, filepath)
+    with Image.open(filepath) as image:
+        assert image.size == (40, 100)
+        assert image.getpixel((0, 25)) == (255, 0, 0) # 重複部分は先の画像
+        assert image.getpixel((0, 30)) == (0, 128, 0)
+        assert image.getpixel((0, 55)) == (0, 0, 0) # 隙間は黒
+        assert image.getpixel((0, 60)) == (0, 0, 255)
+        assert image.getpixel((0, 99)) == (0, 0, 0) # ページの末尾の不足分も黒
+
+
+def test_device_pixel_ratio_is_applied(tmp_path):
+    captured = CapturedPage(30, [(_png('white', (80, 40)), 0, 20), (_png('black', (80, 20)), 20, 10)])
+    filepath = str(tmp_path / 'page.png')
+    save_captured_page(captured, filepath)
+    with Image.open(filepath) as image:
+        assert image.size == (80, 60)
+        assert image.getpixel((0, 45)) == (0, 0, 0)
+
+
+def test_empty_capture_raises_value_error(tmp_path):
+    with pytest.raises(ValueError, match="保存する画像がありません"):
+        save_captured_page(CapturedPage(0), str(tmp_path / 'page.png'))
+    assert not (tmp_path / 'page.png').exists()
+
+
+def test_captured_page_to_png_matches_saved_file(tmp_path):
+    captured = CapturedPage(60, [(_png('red'), 0, 30), (_png('blue'), 30, 30)])
+    filepath = str(tmp_path / 'page.png')
+    save_captured_page(captured, filepath, compress_level=1)
+    with open(filepath, 'rb') as f:
+        assert captured_page_to_png(captured, compress_level=1) == f.read()
+    single = CapturedPage(30, [(_png('red'), 0, 30)])
+    assert captured_page_to_png(single) is single.parts[0][0]
+    with pytest.raises(ValueError):
+        captured_page_to_png(CapturedPage(0))
@@ -0,0 +1,144 @@
+import pytest
+
+from gen_scenario import (TemplateError, TemplateLoop, TemplateVar, build_iteration_units, compile_cell, open_template,
+                          parse_data_sources, parse_template)
+
+HEADER = ['コマンド', 'セレクタタイプ', 'セレクタ値', '内容/ファイルパス/属性', 'オプション1', 'オプション2']
+
+
+@pytest.mark.parametrize('cell, expected', [
+    ('-', ''),
+    ('a-b', 'a-b'),
+    ('$-', '-'),
+    ('$$', '$'),
+    ('price $$100', 'price $100'),
+    ('$', '$'),
+    ('$name', (TemplateVar('name'),)),
+    ('${name}_x', (TemplateVar('name'), '_x')),
+    ('id_$name', ('id_', TemplateVar('name'))),
+    ('$$name', '$name'),
+])
+def test_compile_cell(cell, expected):
+    assert compile_cell(cell, frozenset({'name'})) == expected
+
+
+def test_compile_cell_keeps_undefined_variables():
+    undefined = []
+    assert compile_cell('$other-$name', frozenset({'name'}), undefined) == ('$other-', TemplateVar('name'))
+    assert undefined == ['other']
+
+
+def test_parse_template_nesting():
+    nodes = parse_template([
+        ['navigate', '-', '-', 'https://example.com'],
+        ['for'],
+        ['input', 'id', '$a'],
+        ['for', 'items.csv'],
+        ['click', 'id', '$b'],
+        ['forend'],
+        ['forend'],
+        ['log_remark'],
+    ])
+    assert len(nodes) == 3
+    outer = nodes[1]
+    assert isinstance(outer, TemplateLoop) and outer.source == '' and outer.line == 3
+    inner = outer.body[1]
+    assert isinstance(inner, TemplateLoop) and inner.source == 'items.csv'
+    assert [row.line for row in inner.body] == [6]
+
+
+def test_parse_template_drops_unclosed_block(capsys):
+    nodes = parse_template([['log_remark'], ['for'], ['input', 'id', '$a']])
+    assert len(nodes) == 1
+    assert "閉じられていません" in capsys.readouterr().out
+
+
+def test_nested_for_expansion(write_csv):
+    var_filepath = write_csv('vars.csv', [['user', 'item'], ['alice', 'outer'], ['bob', 'outer']])
+    write_csv('items.csv', [['item'], ['apple'], ['pear']])
+    template = write_csv('template.csv', [
+        HEADER,
+        ['navigate', '-', '-', 'https://example.com/$$', '-', '-'],
+        ['for'],
+        ['input', 'id', 'user', '$user', '-', '-'],
+        ['for', 'items.csv'],
+        ['click', 'id', '${item}_btn', '$-', 'remark=$user', '-'],
+        ['forend'],
+        ['log_remark', '-', '-', '-', 'remark=$item', '-'],
+        ['forend'],
+    ])
+    header, rows = open_template(template, var_filepath)
+    assert header == HEADER
+    assert list(rows) == [
+        ['navigate', '', '', 'https://example.com/$', '', ''],
+        ['input', 'id', 'user', 'alice', '', ''],
+        ['click', 'id', 'apple_btn', '-', 'remark=alice', ''],
+        ['click', 'id', 'pear_btn', '-', 'remark=alice', ''],
+        ['log_remark', '', '', '', 'remark=outer', ''], # 内側のブロックの変数は外側に残らない
+        ['input', 'id', 'user', 'bob', '', ''],
+        ['click', 'id', 'apple_btn', '-', 'remark=bob', ''],
+        ['click', 'id', 'pear_btn', '-', 'remark=bob', ''],
+        ['log_remark', '', '', '', 'remark=outer', ''],
+    ]
+
+
+def test_iterations_are_numbered_across_blocks(write_csv):
+    var_filepath = write_csv('vars.csv', [['v'], ['1'], ['2']])
+    write_csv('other.csv', [['w'], ['x']])
+    template = write_csv('template.csv', [
+        HEADER,
+        ['log_remark', '-', '-', '-', 'remark=start', '-'],
+        ['for'],
+        ['log_remark', '-', '-', '-', 'remark=$v', '-'],
+        ['forend'],
+        ['for', 'other.csv'],
+        ['log_remark', '-', '-', '-', 'remark=$w', '-'],
+        ['forend'],
+    ])
+    _, iterations = open_template(template, var_filepath, by_iteration=True)
+    result = [(iteration, [row[4] for row in rows]) for iteration, rows in iterations]
+    assert result == [(None, ['remark=start']), (0, ['remark=1']), (1, ['remark=2']), (2, ['remark=x'])]
+
+
+def test_missing_values_are_reported_once(write_csv, capsys):
+    var_filepath = write_csv('vars.csv', [['a', 'b'], ['1'], ['2']])
+    template = write_csv('template.csv', [HEADER, ['for'], ['log_remark', '-', '-', '-', 'remark=$a$b', '-'], ['forend']])
+    _, rows = open_template(template, var_filepath)
+    assert [row[4] for row in rows] == ['remark=1', 'remark=2']
+    assert capsys.readouterr().out.count("変数 'b' の値が変数定義CSVの 2 箇所で存在しない") == 1
+
+
+def test_unknown_data_source(write_csv):
+    template = write_csv('template.csv', [HEADER, ['for', 'missing.csv'], ['log_remark'], ['forend']])
+    with pytest.raises(TemplateError):
+        open_template(template)
+
+
+def test_build_iteration_units(write_csv):
+    var_filepath = write_csv('vars.csv', [['v'], ['a'], ['b']])
+    template = write_csv('template.csv', [
+        HEADER,
+        ['navigate', '-', '-', 'https://example.com', '-', '-'],
+        ['for'],
+        ['input', 'id', 'q', '$v', '-', '-'],
+        ['forend'],
+        ['log_remark', '-', '-', '-', 'remark=end', '-'],
+    ])
+    units = build_iteration_units(var_filepath, template)
+    assert units['header'] == HEADER
+    assert units['prefix'] == [['navigate', '', '', 'https://example.com', '', '']]
+    assert units['iterations'] == [[['input', 'id', 'q', 'a', '', '']], [['input', 'id', 'q', 'b', '', '']]]
+    assert units['suffix'] == [['log_remark', '', '', '', 'remark=end', '']]
+
+
+def test_build_iteration_units_requires_one_block(write_csv, capsys):
+    var_filepath = write_csv('vars.csv', [['v'], ['a']])
+    template = write_csv('template.csv', [HEADER, ['for'], ['log_remark'], ['forend'], ['for'], ['log_remark'], ['forend']])
+    assert build_iteration_units(var_filepath, template) is None
+    assert "ちょうど1つ必要" in capsys.readouterr().out
+
+
+def test_parse_data_sources():
+    assert parse_data_sources(['items = data/items.csv']) == {'items': 'data/items.csv'}
+    with pytest.raises(ValueError):
+        parse_data_sources(['items'])
@@ -0,0 +1,116 @@
+import json
+
+from buffered_logger import jsonl_segment_path
+from log_report import ReportBuilder, discover_logs, run_status
+
+
+def _line(record):
+    return (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def _records():
+    records = [{'ts': '2026-01-01 00:00:00.000', 'event': 'run_start', 'scenario': 's.csv'}]
+    for row in range(2, 12):
+        records.append({'ts': f'2026-01-01 00:00:{row:02}.000', 'event': 'command', 'command': 'click', 'row': row,
+                        'status': 'failed' if row % 4 == 0 else 'passed', 'duration': row / 10})
+    records.append({'ts': '2026-01-01 00:00:12.000', 'level': 'ERROR', 'message': 'エラー'})
+    records.append({'ts': '2026-01-01 00:00:13.000', 'event': 'rows_failed', 'rows': [12, 13], 'reason': 'time_budget'})
+    records.append({'ts': '2026-01-01 00:00:14.000', 'event': 'run_end', 'scenario': 's.csv'})
+    return records
+
+
+def _state(builder):
+    state = json.loads(json.dumps(builder.state))
+    for run in state['runs'].values():
+        del run['segment'], run['offset'] # 読み込み位置は読み込み方によって異なる
+    return state
+
+
+def test_incremental_updates_match_full_build(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    data = b''.join(_line(record) for record in _records())
+
+    full = ReportBuilder()
+    with open(path, 'wb') as f:
+        f.write(data)
+    assert full.update([path]) == len(_records())
+
+    incremental = ReportBuilder()
+    state_path = str(tmp_path / 'state.json')
+    with open(path, 'wb') as f:
+        for start in range(0, len(data), 97): # 行の途中で区切って追記する
+            f.write(data[start:start + 97])
+            f.flush()
+            incremental.update([path])
+            incremental.save_state(state_path)
+            incremental = ReportBuilder.load_state(state_path)
+
+    assert _state(incremental) == _state(full)
+    run = full.state['runs'][path]
+    assert run['commands'] == 10 and run['failed'] == 4 and run['errors'] == 1
+    assert run['offset'] == len(data)
+    assert run_status(run) == 'failed'
+
+
+def test_partial_last_line_is_read_later(tmp_path):
+    path = tmp_path / 'run.jsonl'
+    first, second = _line(_records()[0]), _line(_records()[-1])
+    path.write_bytes(first + second[:10])
+    builder = ReportBuilder()
+    assert builder.update([str(path)]) == 1
+    assert builder.state['runs'][str(path)]['offset'] == len(first)
+    path.write_bytes(first + second)
+    assert builder.update([str(path)]) == 1
+    assert run_status(builder.state['runs'][str(path)]) == 'passed'
+
+
+def test_segments_are_read_in_order(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    records = _records()
+    with open(path, 'wb') as f:
+        f.write(b''.join(_line(record) for record in records[:5]))
+    builder = ReportBuilder()
+    builder.update([path])
+    with open(jsonl_segment_path(path, 2), 'wb') as f:
+        f.write(b''.join(_line(record) for record in records[5:]))
+    assert builder.update(discover_logs([str(tmp_path)])) == len(records) - 5
+    run = builder.state['runs'][path]
+    assert run['segment'] == 2 and run['ended'] and run['commands'] == 10
+
+
+def test_recreated_log_is_read_from_start(tmp_path):
+    path = tmp_path / 'run.jsonl'
+    path.write_bytes(b''.join(_line(record) for record in _records()))
+    builder = ReportBuilder()
+    builder.update([str(path)])
+    path.write_bytes(_line(_records()[0]))
+    builder.update([str(path)])
+    run = builder.state['runs'][str(path)]
+    assert run['commands'] == 0 and run_status(run) == 'running'
+
+
+def test_invalid_lines_are_counted(tmp_path):
+    path = tmp_path / 'run.jsonl'
+    path.write_bytes(b'not json\n[1]\n\n' + _line(_records()[0]))
+    builder = ReportBuilder()
+    assert builder.update([str(path)]) == 1
+    assert builder.state['runs'][str(path)]['invalid_lines'] == 2
+
+
+def test_discover_logs_skips_later_segments(tmp_path):
+    (tmp_path / 'a.jsonl').write_bytes(b'')
+    (tmp_path / 'a.2.jsonl').write_bytes(b'')
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / 'b.jsonl').write_bytes(b'')
+    assert discover_logs([str(tmp_path)]) == [str(tmp_path / 'a.jsonl'), str(tmp_path / 'sub' / 'b.jsonl')]
+
+
+def test_write_html(tmp_path):
+    path = tmp_path / 'run.jsonl'
+    path.write_bytes(b''.join(_line(record) for record in _records()))
+    builder = ReportBuilder()
+    builder.update([str(path)])
+    report = tmp_path / 'report.html'
+    builder.write_html(str(report))
+    html = report.read_text(encoding='utf-8')
+    assert 's.csv' in html and '失敗' in html
@@ -0,0 +1,111 @@
+import os
+
+import pytest
+
+from scenario_compiler import (PLAN_FORMAT_VERSION, ScenarioCompileError, compile_row, compile_rows, compile_scenario,
+                               parse_directives)
+
+HEADER = ['コマンド', 'セレクタタイプ', 'セレクタ値', '内容/ファイルパス/属性', 'オプション1', 'オプション2']
+
+
+def test_compile_row_converts_options():
+    command, errors, warnings = compile_row(['Click', 'id', 'submit', '', 'wait_time=3', 'timeout=1.5'], 5)
+    assert errors == [] and warnings == []
+    assert command.row_number == 5
+    assert command.name == 'click'
+    assert command.options == {'wait_time': 3, 'timeout': 1.5}
+
+
+def test_compile_row_setup_option_is_common():
+    command, errors, _ = compile_row(['navigate', '', '', 'https://example.com', 'setup=True', ''], 2)
+    assert errors == []
+    assert command.options == {'setup': True}
+
+
+@pytest.mark.parametrize('row, message', [
+    (['open', '', '', '', '', ''], "不明なコマンド"),
+    (['click', 'label', 'submit', '', '', ''], "無効なセレクタタイプ"),
+    (['input', 'id', '-', 'value', '', ''], "セレクタ値が必要"),
+    (['navigate', '', '', '-', '', ''], "値／ファイルパスが必要"),
+    (['click', 'id', 'submit', '', 'wait_time=abc', ''], "オプション 'wait_time' の値が不正"),
+    (['input', 'id', 'name', 'value', 'timeout=-1', ''], "0以上の数値"),
+    (['screenshot', '', '', 'a.png', 'full_page=yes', ''], "True または False"),
+])
+def test_compile_row_errors(row, message):
+    command, errors, _ = compile_row(row, 7)
+    assert command is None
+    assert len(errors) >= 1
+    assert errors[0].startswith("行 7: ")
+    assert any(message in error for error in errors)
+
+
+def test_compile_row_warns_unknown_option():
+    command, errors, warnings = compile_row(['log_remark', '', '', '', 'remark=memo', 'color=red'], 3)
+    assert errors == []
+    assert command.options == {'remark': 'memo', 'color': 'red'}
+    assert warnings == ["行 3: 'log_remark' では使用されないオプションです: 'color'"]
+
+
+def test_assert_screenshot_selector_is_optional():
+    _, errors, _ = compile_row(['assert_screenshot', '', '', 'top.png', '', ''], 2)
+    assert errors == []
+    _, errors, _ = compile_row(['assert_screenshot', 'label', 'x', 'top.png', '', ''], 2)
+    assert any("無効なセレクタタイプ" in error for error in errors)
+
+
+def test_compile_rows_collects_all_errors_and_skips_blank_rows():
+    rows = [
+        ['navigate', '', '', 'https://example.com', '', ''],
+        ['', '', '', '', '', ''],
+        ['open', '', '', '', '', ''],
+        ['click', 'label', 'x', '', '', ''],
+    ]
+    commands, errors, _ = compile_rows(rows)
+    assert [command.row_number for command in commands] == [2]
+    assert [error.split(':')[0] for error in errors] == ["行 4", "行 5"]
+
+
+def test_parse_directives():
+    directives, warnings = parse_directives(HEADER + ['profile=fast', 'color=red'])
+    assert directives == {'profile': 'fast'}
+    assert len(warnings) == 1 and "'color'" in warnings[0]
+
+
+def test_compile_scenario_raises_with_every_error(write_csv):
+    filepath = write_csv('bad.csv', [HEADER, ['open', '', '', '', '', ''], ['click', '', '', '', '', '']])
+    with pytest.raises(ScenarioCompileError) as info:
+        compile_scenario(filepath, cache_dir=None)
+    assert info.value.source == filepath
+    assert len(info.value.errors) == 3 # 不明なコマンド + セレクタタイプ + セレクタ値
+
+
+def test_compile_scenario_cache_round_trip(write_csv, tmp_path):
+    filepath = write_csv('scenario.csv', [
+        HEADER + ['profile=fast'],
+        ['navigate', '', '', 'https://example.com', 'wait_time=5', 'setup=True'],
+        ['log_content', 'id', 'title', 'text', 'remark=タイトル', 'timeout=2.5'],
+    ])
+    cache_dir = str(tmp_path / 'cache')
+    plan = compile_scenario(filepath, cache_dir=cache_dir)
+    cache_files = os.listdir(cache_dir)
+    assert cache_files == [f"{plan.file_hash}.v{PLAN_FORMAT_VERSION}.json"]
+
+    cached = compile_scenario(filepath, cache_dir=cache_dir)
+    assert cached == plan
+    assert cached.directives == {'profile': 'fast'}
+    assert cached.commands[1].options == {'remark': 'タイトル', 'timeout': 2.5}
+
+
+def test_compile_scenario_ignores_mismatched_cache(write_csv, tmp_path, capsys):
+    filepath = write_csv('scenario.csv', [HEADER, ['navigate', '', '', 'https://example.com', '', '']])
+    cache_dir = str(tmp_path / 'cache')
+    plan = compile_scenario(filepath, cache_dir=cache_dir)
+    cache_path = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+    with open(cache_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        f.write(text.replace(plan.file_hash, '0' * 64).replace('https://example.com', 'https://evil.invalid'))
+
+    reparsed = compile_scenario(filepath, cache_dir=cache_dir)
+    assert reparsed.commands[0].value == 'https://example.com'
+    assert "キャッシュがファイルの内容と一致しません" in capsys.readouterr().out
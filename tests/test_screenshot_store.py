@@ -0,0 +1,88 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from benchmark import FakeDriver
+from fullpage_capture import CapturedPage
+from screenshot_store import ScreenshotStore, content_hash
+from test_automation import WebTestAutomation
+
+
+def _png(color, size=(64, 48)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_same_content_is_stored_once(tmp_path):
+    store = ScreenshotStore(str(tmp_path / 'store'))
+    first = store.add(_png('white'))
+    assert first.new
+    store.write(_png('white'), first.path)
+
+    second = store.add(_png('white'))
+    assert second.path == first.path and not second.new
+    assert store.add(_png('black')).path != first.path
+    assert first.path.startswith(os.path.join(str(tmp_path / 'store'), 'objects', content_hash(_png('white'))[:2]))
+
+
+def test_existing_objects_are_shared_between_stores(tmp_path):
+    root = str(tmp_path / 'store')
+    store = ScreenshotStore(root)
+    stored = store.add(_png('white'))
+    store.write(_png('white'), stored.path)
+    assert not ScreenshotStore(root).add(_png('white')).new
+
+
+def test_reservation_prevents_duplicate_writes(tmp_path):
+    store = ScreenshotStore(str(tmp_path / 'store'))
+    assert store.add(_png('white')).new
+    assert not store.add(_png('white')).new # 書き込み前でも2回目は保存しない
+
+
+def test_captured_page_hash_includes_layout():
+    band = _png('white')
+    a = CapturedPage(96, [(band, 0, 48), (band, 48, 48)])
+    b = CapturedPage(96, [(band, 0, 48), (band, 40, 48)])
+    assert content_hash(a) != content_hash(b)
+
+
+def test_write_stitches_captured_page(tmp_path):
+    store = ScreenshotStore(str(tmp_path / 'store'), encoder='original')
+    captured = CapturedPage(96, [(_png('white'), 0, 48), (_png('black'), 48, 48)])
+    stored = store.add(captured)
+    store.write(captured, stored.path)
+    with Image.open(stored.path) as image:
+        assert image.size == (64, 96)
+        assert image.getpixel((0, 0)) == (255, 255, 255)
+        assert image.getpixel((0, 95)) == (0, 0, 0)
+
+
+def test_similar_screenshots_are_skipped_per_step(tmp_path):
+    store = ScreenshotStore(str(tmp_path / 'store'), similarity_threshold=0.01)
+    first = store.add(_png((200, 200, 200)), step='top')
+    similar = store.add(_png((201, 200, 200)), step='top')
+    assert similar.skipped and similar.path == first.path and similar.difference <= 0.01
+    changed = store.add(_png((0, 0, 0)), step='top')
+    assert not changed.skipped and changed.new
+    other_step = store.add(_png((201, 200, 200)), step='other')
+    assert not other_step.skipped
+
+
+def test_automation_saves_identical_screenshots_once(tmp_path):
+    store = ScreenshotStore(str(tmp_path / 'store'))
+    automation = WebTestAutomation(screenshot_dir=str(tmp_path / 'screenshots'), log_filepath=str(tmp_path / 'log.csv'),
+                                   log_echo=False, driver=FakeDriver(), screenshot_store=store)
+    for i in range(3):
+        automation.take_screenshot(f"page{i}.png")
+    automation.close()
+    assert len([name for _, _, names in os.walk(tmp_path / 'store') for name in names]) == 1
+    assert not os.path.exists(tmp_path / 'screenshots')
+
+
+@pytest.mark.parametrize('kwargs', [{'encoder': 'jpeg'}, {'compress_level': 10}, {'similarity_threshold': 1}])
+def test_invalid_settings(tmp_path, kwargs):
+    with pytest.raises(ValueError):
+        ScreenshotStore(str(tmp_path / 'store'), **kwargs)
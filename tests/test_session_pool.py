@@ -0,0 +1,97 @@
+import pytest
+from selenium.common.exceptions import WebDriverException
+
+from benchmark import FakeDriver
+from session_pool import SessionPool, url_origin
+
+
+class HistoryDriver(FakeDriver):
+    """DevTools Protocolのコマンドと引数を記録し、タブの履歴にリダイレクト先のページを返す FakeDriver。"""
+
+    def __init__(self):
+        super().__init__()
+        self.cdp = []
+        self.history = []
+
+    def execute_cdp_cmd(self, cmd, params):
+        if cmd == 'Page.getNavigationHistory':
+            return {'entries': [{'url': url} for url in self.history]}
+        self.cdp.append((cmd, params))
+        return super().execute_cdp_cmd(cmd, params)
+
+
+class FirefoxDriver:
+    """DevTools Protocolを使用できないブラウザの代替。"""
+
+    name = 'firefox'
+
+    def __init__(self):
+        self.current_url = 'about:blank'
+        self.window_handles = ['main']
+        self.switch_to = FakeDriver().switch_to
+        self.calls = []
+
+    def get(self, url):
+        self.current_url = url
+
+    def get_window_size(self):
+        return {'width': 800, 'height': 600}
+
+    def execute_script(self, script, *args):
+        self.calls.append('execute_script')
+
+    def delete_all_cookies(self):
+        self.calls.append('delete_all_cookies')
+
+    def set_window_size(self, width, height):
+        self.calls.append('set_window_size')
+
+    def quit(self):
+        self.calls.append('quit')
+
+
+def test_url_origin():
+    assert url_origin('https://User@Example.com:8443/a?b#c') == 'https://example.com:8443'
+    assert url_origin('about:blank') is None
+    assert url_origin('data:text/html,x') is None
+
+
+def test_reset_clears_each_visited_origin():
+    with SessionPool(size=1, driver_factory=HistoryDriver) as pool:
+        with pool.lease() as driver:
+            driver.get('https://b.example.com/login')
+            driver.get('http://a.example.com:8080/')
+            driver.history = ['https://b.example.com/login', 'https://c.example.com/redirected']
+        assert driver.cdp == [('Network.clearBrowserCookies', {})] + [
+            ('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+            for origin in ['http://a.example.com:8080', 'https://b.example.com', 'https://c.example.com']]
+        assert driver.current_url == 'about:blank'
+
+        driver.cdp, driver.history = [], []
+        with pool.lease() as reused:
+            assert reused is driver
+        assert driver.cdp == [('Network.clearBrowserCookies', {})] # 前回のオリジンは消去済み
+
+
+def test_reset_without_devtools_restarts_after_other_origins():
+    with SessionPool(size=1, driver_factory=FirefoxDriver) as pool:
+        with pool.lease() as driver:
+            driver.get('https://example.com/a')
+        assert driver.calls == ['execute_script', 'delete_all_cookies', 'set_window_size']
+        with pool.lease() as reused:
+            assert reused is driver
+            reused.get('https://example.com/b')
+            reused.get('https://other.example.com/')
+        assert driver.calls[-1] == 'quit' # other.example.com を表示中のため example.com を消去できない
+        with pool.lease() as restarted:
+            assert restarted is not driver
+
+
+def test_lease_discards_browser_after_webdriver_error():
+    with SessionPool(size=1, driver_factory=FakeDriver) as pool:
+        with pytest.raises(WebDriverException):
+            with pool.lease() as driver:
+                raise WebDriverException("ブラウザが応答しません")
+        assert driver.calls[-1] == 'quit'
+        with pool.lease() as restarted:
+            assert restarted is not driver
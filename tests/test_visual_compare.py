@@ -0,0 +1,108 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from visual_compare import compare_images, diff_pixels, load_masks, masks_for, parse_mask_spec
+
+
+def _pixels(height=40, width=30, value=100):
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+
+def _png(pixels):
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_diff_pixels_threshold():
+    baseline = _pixels()
+    actual = baseline.copy()
+    actual[5, 6] = (100, 116, 100) # 差が閾値と同じ画素は一致とする
+    actual[7, 8] = (100, 100, 83)
+    different = diff_pixels(baseline, actual, pixel_threshold=16)
+    assert different.shape == (40, 30)
+    assert list(zip(*np.nonzero(different))) == [(7, 8)]
+
+
+def test_diff_pixels_is_symmetric_without_overflow():
+    baseline = _pixels(value=250)
+    actual = _pixels(value=5)
+    assert diff_pixels(baseline, actual).all()
+    assert diff_pixels(actual, baseline).all()
+
+
+def test_diff_pixels_applies_masks_relative_to_band():
+    # 画像の 20-29 行目の帯。マスクは画像全体の座標で指定する
+    baseline = _pixels(height=10)
+    actual = _pixels(height=10, value=0)
+    different = diff_pixels(baseline, actual, masks=[(0, 0, 30, 22), (10, 25, 5, 100), (0, 30, 30, 5)], top=20)
+    assert different.shape == (10, 30)
+    assert not different[:2].any()
+    assert not different[5:, 10:15].any()
+    assert int(np.count_nonzero(different)) == 30 * 10 - 30 * 2 - 5 * 5
+
+
+def test_compare_images_identical_bytes():
+    data = _png(_pixels())
+    result = compare_images(data, data, name='same')
+    assert result.passed and result.name == 'same' and result.diff_pixels == 0
+
+
+def test_compare_images_reports_bbox_and_tolerance(tmp_path):
+    baseline = _pixels()
+    actual = baseline.copy()
+    actual[10:12, 3:5] = 255
+    result = compare_images(_png(baseline), _png(actual), name='x', diff_filepath=str(tmp_path / 'diff.png'))
+    assert not result.passed
+    assert result.diff_pixels == 4 and result.total_pixels == 1200
+    assert result.diff_bbox == (3, 10, 5, 12)
+    assert result.diff_path == str(tmp_path / 'diff.png')
+    with Image.open(result.diff_path) as image:
+        assert image.getpixel((3, 10)) == (255, 0, 0)
+
+    assert compare_images(_png(baseline), _png(actual), name='x', tolerance=4 / 1200).passed
+    assert compare_images(_png(baseline), _png(actual), name='x', masks=[(3, 10, 2, 2)]).passed
+
+
+def test_compare_images_across_bands(tmp_path):
+    baseline = _pixels()
+    actual = baseline.copy()
+    actual[3, 20] = 255
+    actual[15:17, 2] = 255
+    actual[30:35, 0:10] = 0 # マスク領域内の差分は数えない
+    result = compare_images(_png(baseline), _png(actual), name='x', masks=[(0, 30, 10, 5)],
+                            diff_filepath=str(tmp_path / 'diff.png'), band_height=7)
+    assert result.diff_pixels == 3
+    assert result.diff_bbox == (2, 3, 21, 17)
+    with Image.open(result.diff_path) as image:
+        assert image.size == (30, 40)
+        assert image.getpixel((20, 3)) == image.getpixel((2, 16)) == (255, 0, 0)
+        red, green, blue = image.getpixel((5, 32))
+        assert blue > red == green # マスク領域は青
+        red, green, blue = image.getpixel((25, 25))
+        assert red == green == blue # 差分のない画素はグレー
+
+
+def test_compare_images_size_mismatch():
+    result = compare_images(_png(_pixels()), _png(_pixels(height=41)), name='x')
+    assert not result.passed and "画像サイズが異なります" in result.error
+
+
+def test_compare_images_missing_file(tmp_path):
+    result = compare_images(str(tmp_path / 'missing.png'), _png(_pixels()))
+    assert not result.passed and "画像を読み込めません" in result.error
+
+
+def test_parse_mask_spec():
+    assert parse_mask_spec('0,0,1920,80; .timestamp ;#ad-banner;') == ([(0, 0, 1920, 80)], ['.timestamp', '#ad-banner'])
+    assert parse_mask_spec(None) == ([], [])
+
+
+def test_masks_for(tmp_path):
+    filepath = tmp_path / 'masks.json'
+    filepath.write_text('{"*/top_*.png": [[0, 0, 10, 10]], "news/*.png": [[1, 2, 3, 4]]}', encoding='utf-8')
+    masks = load_masks(str(filepath))
+    assert masks_for('news/top_1.png', masks) == [(0, 0, 10, 10), (1, 2, 3, 4)]
+    assert masks_for('other.png', masks) == []
@@ -0,0 +1,148 @@
+import json
+import os
+from contextlib import nullcontext
+
+import pytest
+
+import parallel_runner
+
+from adaptive_timeouts import AdaptiveTimeouts
+from batch_commands import BATCH_JS
+from benchmark import FakeDriver
+from checkpoint import RERUN_FAILED, RunCheckpoint
+from parallel_runner import RunOptions, run_shard
+from scenario_compiler import compile_rows
+from test_automation import WebTestAutomation
+
+
+class PartialBatchDriver(FakeDriver):
+    """まとめて実行したコマンドのうち、先頭の limit 件だけを実行できたことにする FakeDriver。"""
+
+    def __init__(self, limit, **kwargs):
+        super().__init__(**kwargs)
+        self.limit = limit
+
+    def execute_script(self, script, *args):
+        result = super().execute_script(script, *args)
+        return result[:self.limit] if script == BATCH_JS else result
+
+
+@pytest.fixture
+def run(tmp_path):
+    """コマンド行を FakeDriver で実行し、(実行結果, JSONLログのレコード, WebTestAutomation) を返す関数。"""
+    def run(rows, driver=None, **kwargs):
+        commands, errors, _ = compile_rows(rows)
+        assert errors == []
+        log_filepath = str(tmp_path / 'log.jsonl')
+        automation = WebTestAutomation(screenshot_dir=str(tmp_path / 'screenshots'), log_filepath=log_filepath,
+                                       log_echo=False, driver=driver or FakeDriver(), **kwargs)
+        result = automation.execute_plan(commands)
+        automation.close()
+        with open(log_filepath, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        return result, records, automation
+    return run
+
+
+def _events(records, event='command'):
+    return [record for record in records if record.get('event') == event]
+
+
+FORM_ROWS = [
+    ['navigate', '', '', 'https://example.com/form/1', '', ''],
+    ['input', 'id', 'field1', 'a', '', ''],
+    ['input', 'name', 'field2', 'b', '', ''],
+    ['log_content', 'id', 'result', 'text', 'remark=結果', ''],
+    ['click', 'id', 'submit', '', 'wait_time=1', ''],
+]
+
+
+def test_execute_plan(run):
+    result, records, _ = run(FORM_ROWS)
+    assert result == {'total': 5, 'failed_rows': []}
+    commands = _events(records)
+    assert [event['row'] for event in commands] == [2, 3, 4, 5, 6]
+    assert all(event['status'] == 'passed' and not event.get('batch') for event in commands)
+    assert any("fixture:result" in record.get('message', '') for record in records)
+
+
+def test_batch_commands_and_timeout_history(run, tmp_path):
+    history = AdaptiveTimeouts(str(tmp_path / 'history.json'))
+    result, records, _ = run(FORM_ROWS, batch_commands=True, timeout_history=history)
+    assert result == {'total': 5, 'failed_rows': []}
+    assert [event['row'] for event in _events(records) if event.get('batch')] == [3, 4, 5]
+    with open(tmp_path / 'history.json', 'r', encoding='utf-8') as f:
+        keys = set(json.load(f))
+    assert {AdaptiveTimeouts.make_key('https://example.com/form/1', selector_type, selector_value)
+            for selector_type, selector_value in [('id', 'field1'), ('name', 'field2'), ('id', 'result')]} <= keys
+
+
+def test_partial_batch_falls_back_to_single_commands(run):
+    rows = FORM_ROWS[:1] + [['input', 'id', f'field{i}', 'a', '', ''] for i in range(5)]
+    result, records, _ = run(rows, driver=PartialBatchDriver(2), batch_commands=True)
+    assert result == {'total': 6, 'failed_rows': []}
+    commands = _events(records)
+    assert [event['row'] for event in commands] == [2, 3, 4, 5, 6, 7]
+    assert [event['row'] for event in commands if event.get('batch')] == [3, 4, 6, 7] # 5行目は通常の方法で実行する
+
+
+def test_time_budget_fails_remaining_rows(run):
+    result, records, automation = run(FORM_ROWS, batch_commands=True, time_budget=0)
+    assert result == {'total': 0, 'failed_rows': [2, 3, 4, 5, 6]}
+    assert automation.budget_exceeded
+    assert _events(records, 'rows_failed')[0]['reason'] == 'time_budget'
+
+
+def test_checkpoint_records_rows(run, tmp_path):
+    checkpoint = RunCheckpoint(str(tmp_path / 'run.json'))
+    run(FORM_ROWS, batch_commands=True, checkpoint=checkpoint)
+    assert checkpoint.status == {row: True for row in range(2, 7)}
+    assert checkpoint.last_row == 6
+    assert not checkpoint.needs_rerun(RERUN_FAILED)
+
+
+def test_assert_screenshot_creates_and_compares_baseline(run, tmp_path):
+    baseline_dir = str(tmp_path / 'baselines')
+    rows = [['assert_screenshot', '', '', 'top.png', 'full_page=True', '']]
+    driver = FakeDriver(page_height=5000)
+    _, records, _ = run(rows, driver=driver, baseline_dir=baseline_dir)
+    assert any(record.get('level') == 'WARNING' for record in records)
+    assert os.path.isfile(os.path.join(baseline_dir, 'top.png'))
+
+    result, records, _ = run(rows, driver=driver, baseline_dir=baseline_dir)
+    assert result['failed_rows'] == []
+    assert any("ベースラインと一致しました" in record.get('message', '') for record in records)
+
+
+# 存在しないディレクトリへのスクリーンショットは保存に失敗する
+SCREENSHOT_ROWS = [['screenshot', '', '', name, '', ''] for name in ['missing/a.png', 'ok.png', 'missing/b.png']]
+
+
+def test_screenshot_failures_are_collected_once_at_the_end(tmp_path, monkeypatch):
+    checkpoint = RunCheckpoint(str(tmp_path / 'run.json'))
+    log_filepath = str(tmp_path / 'log.jsonl')
+    automation = WebTestAutomation(screenshot_dir=str(tmp_path / 'screenshots'), log_filepath=log_filepath,
+                                   log_echo=False, driver=FakeDriver(), checkpoint=checkpoint)
+    writer_wait = automation.screenshot_writer.wait
+    waits = []
+    monkeypatch.setattr(automation.screenshot_writer, 'wait', lambda: waits.append(1) or writer_wait())
+    result = automation.execute_stream(SCREENSHOT_ROWS, chunk_size=1)
+    assert len(waits) == 1 # チャンクごとには保存の完了を待たない
+    assert result == {'total': 3, 'failed_rows': [2, 4]}
+    assert checkpoint.status == {2: False, 3: True, 4: False}
+    automation.close()
+    with open(log_filepath, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [(event['rows'], event['reason']) for event in _events(records, 'rows_failed')] == [([2, 4], 'screenshot')]
+
+
+def test_run_shard_reports_screenshot_failures_per_iteration(tmp_path, monkeypatch):
+    monkeypatch.setattr(parallel_runner, '_lease_driver', lambda profile=None: nullcontext(FakeDriver()))
+    prefix, _, _ = compile_rows(SCREENSHOT_ROWS[1:2])
+    iterations = [(index, compile_rows(SCREENSHOT_ROWS[index:index + 1], 3 + index)[0]) for index in range(3)]
+    result = run_shard('shard', prefix, iterations, [], RunOptions(log_echo=False, log_format='jsonl'),
+                       output_root=str(tmp_path))
+    assert result['error'] is None
+    assert [(r['iteration'], r['failed_rows'], r['passed']) for r in result['iterations']] == [
+        (0, [3], False), (1, [], True), (2, [5], False)]
+    assert result['prefix_failed_rows'] == []
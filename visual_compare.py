@@ -0,0 +1,372 @@
+import argparse
+import csv
+import fnmatch
+import io
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+
+import numpy as np
+from PIL import Image
+
+from fullpage_capture import PngBandWriter
+
+DEFAULT_BASELINE_DIR = 'baselines'
+
+# チャンネルごとの差がこの値以下の画素は同じとみなす (アンチエイリアスや色の丸めによる揺れ)
+DEFAULT_PIXEL_THRESHOLD = 16
+
+# 画像のデコード・差分の計算・diff画像の書き込みを行う行数。配列のメモリ使用量を帯の大きさに抑える
+DEFAULT_BAND_HEIGHT = 1024
+
+IMAGE_EXTENSIONS = ('.png', '.webp', '.jpg', '.jpeg', '.bmp')
+
+# 'x,y,幅,高さ' 形式のマスク領域
+_RECT_PATTERN = re.compile(r'^\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*$')
+
+
+@dataclass
+class CompareResult:
+    """画像の比較結果。"""
+    name: str # 比較した画像の名前 (ベースラインディレクトリからの相対パスなど)
+    passed: bool
+    diff_pixels: int = 0 # 異なる画素数 (マスク領域を除く)
+    total_pixels: int = 0
+    diff_ratio: float = 0.0 # 異なる画素の割合 (0-1)
+    diff_bbox: tuple = None # 差分がある範囲 (左, 上, 右, 下)
+    diff_path: str = None # 作成したdiff画像のパス
+    error: str = None # 比較できなかった理由 (画像サイズの違い・ファイルがないなど)
+    duration: float = 0.0 # 比較にかかった時間（秒）
+
+
+def parse_mask_spec(spec):
+    """
+    ';' で区切ったマスクの指定を、領域とCSSセレクタに分けます。
+    'x,y,幅,高さ' の形式の項目は画像のピクセル単位の領域、それ以外の項目はCSSセレクタとして扱います。
+
+    例: '0,0,1920,80;.timestamp;#ad-banner'
+
+    Returns:
+        tuple: ((左, 上, 幅, 高さ) のリスト, CSSセレクタのリスト)。
+    """
+    rects = []
+    selectors = []
+    for part in filter(str.strip, (spec or '').split(';')):
+        match = _RECT_PATTERN.match(part)
+        if match is None:
+            selectors.append(part.strip())
+        else:
+            rects.append(tuple(int(value) for value in match.groups()))
+    return rects, selectors
+
+
+def _read_bytes(image):
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    with open(image, 'rb') as f:
+        return f.read()
+
+
+def _band_pixels(image, top, bottom):
+    """画像の top 行から bottom 行の手前までを、高さ x 幅 x 3 の uint8 の配列として返します。"""
+    band = image.crop((0, top, image.width, bottom))
+    if band.mode != 'RGB':
+        band = band.convert('RGB')
+    return np.asarray(band)
+
+
+def _mask_regions(masks, top, height):
+    """マスク領域 (左, 上, 幅, 高さ) のうち、top 行から始まる height 行の帯に含まれる部分の (行, 列) のスライスを返します。"""
+    for left, mask_top, mask_width, mask_height in masks:
+        rows = slice(min(max(mask_top - top, 0), height), min(max(mask_top + mask_height - top, 0), height))
+        if rows.start < rows.stop:
+            yield rows, slice(left, left + mask_width)
+
+
+def diff_pixels(baseline, actual, pixel_threshold=DEFAULT_PIXEL_THRESHOLD, masks=(), top=0):
+    """
+    同じサイズの2つの画像の帯の、異なる画素を示す真偽値の配列を返します。
+
+    Args:
+        baseline (numpy.ndarray): ベースライン画像の帯 (高さ x 幅 x 3 の uint8)。
+        actual (numpy.ndarray): 比較する画像の同じ位置の帯 (baseline と同じ形状)。
+        pixel_threshold (int): チャンネルごとの差がこの値を超える画素を異なる画素とします。
+        masks (list): 比較しない領域 (左, 上, 幅, 高さ) のリスト (画像全体のピクセル単位)。
+        top (int): 帯の上端の、画像全体での行の位置。
+
+    Returns:
+        numpy.ndarray: 帯の高さ x 幅 の真偽値の配列。
+    """
+    delta = np.maximum(baseline, actual)
+    delta -= np.minimum(baseline, actual) # uint8のまま差の絶対値を求める (桁あふれしない)
+    # max(axis=2) は要素数3の軸の縮約が遅いため、チャンネルごとの配列で最大値を求める
+    largest = np.maximum(delta[..., 0], delta[..., 1])
+    np.maximum(largest, delta[..., 2], out=largest)
+    different = largest > pixel_threshold
+    for rows, columns in _mask_regions(masks, top, len(different)):
+        different[rows, columns] = False
+    return different
+
+
+def _iter_diff_bands(baseline, actual, pixel_threshold, masks, band_height):
+    """
+    同じサイズの2つの画像を band_height 行ずつデコードして比較し、
+    (帯の上端の行, ベースライン画像の帯, diff_pixels の戻り値) を上の帯から順に返します。
+    """
+    for top in range(0, baseline.height, band_height):
+        bottom = min(top + band_height, baseline.height)
+        pixels = _band_pixels(baseline, top, bottom)
+        yield top, pixels, diff_pixels(pixels, _band_pixels(actual, top, bottom), pixel_threshold, masks, top)
+
+
+def save_diff_image(baseline, actual, filepath, pixel_threshold=DEFAULT_PIXEL_THRESHOLD, masks=(),
+                    band_height=DEFAULT_BAND_HEIGHT):
+    """
+    ベースライン画像を薄いグレーで描き、異なる画素を赤、マスク領域を青で示したdiff画像を保存します。
+    帯ごとに比較して PngBandWriter で書き込むため、画像全体の大きさの配列は確保しません。
+
+    Args:
+        baseline (PIL.Image.Image): ベースライン画像。
+        actual (PIL.Image.Image): 比較した画像 (baseline と同じサイズ)。
+        filepath (str): 保存先のパス。
+        pixel_threshold (int): チャンネルごとの差がこの値を超える画素を異なる画素とします。
+        masks (list): 比較しなかった領域 (左, 上, 幅, 高さ) のリスト。
+        band_height (int): 一度に変換する行数。
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    writer = PngBandWriter(filepath, baseline.width, baseline.height, compress_level=1)
+    try:
+        for top, pixels, different in _iter_diff_bands(baseline, actual, pixel_threshold, masks, band_height):
+            band = pixels.astype(np.uint16)
+            gray = (band[..., 0] * 77 + band[..., 1] * 150 + band[..., 2] * 29) >> 8
+            output = np.repeat((160 + gray * 95 // 255).astype(np.uint8)[..., np.newaxis], 3, axis=2)
+            for rows, columns in _mask_regions(masks, top, len(output)):
+                output[rows, columns] //= 2
+                output[rows, columns, 2] += 127
+            output[different] = (255, 0, 0)
+            writer.write_rows(Image.fromarray(output))
+    finally:
+        writer.close()
+
+
+def compare_images(baseline, actual, name=None, pixel_threshold=DEFAULT_PIXEL_THRESHOLD, tolerance=0.0, masks=(),
+                   diff_filepath=None, band_height=DEFAULT_BAND_HEIGHT):
+    """
+    ベースライン画像と比較する画像の画素を比較します。
+    ファイルの内容が同じ場合はデコードせずに一致とします。画素は band_height 行ずつ取り出して比較し、
+    異なる画素の数と範囲を帯ごとに集計するため、画像全体の大きさの配列は確保しません。
+
+    Args:
+        baseline (str または bytes): ベースライン画像のパスまたはバイト列。
+        actual (str または bytes): 比較する画像のパスまたはバイト列。
+        name (str): 結果に記録する名前。Noneの場合は baseline (パスの場合)。
+        pixel_threshold (int): チャンネルごとの差がこの値を超える画素を異なる画素とします (0-255)。
+        tolerance (float): 一致とみなす異なる画素の割合の上限 (0-1)。
+        masks (list): 比較しない領域 (左, 上, 幅, 高さ) のリスト (画像のピクセル単位)。
+        diff_filepath (str): 一致しない場合にdiff画像を保存するパス。Noneの場合は保存しません。
+        band_height (int): 一度に計算する行数。
+
+    Returns:
+        CompareResult: 比較結果。
+    """
+    start = time.perf_counter()
+    result = CompareResult(name if name is not None else str(baseline), passed=False)
+    try:
+        baseline_bytes = _read_bytes(baseline)
+        actual_bytes = _read_bytes(actual)
+    except OSError as e:
+        result.error = f"画像を読み込めません: {e}"
+        return result
+    if baseline_bytes == actual_bytes:
+        result.passed = True
+    else:
+        # 画像のサイズはヘッダーから取得し、画素は帯ごとに取り出す
+        baseline_image = Image.open(io.BytesIO(baseline_bytes))
+        actual_image = Image.open(io.BytesIO(actual_bytes))
+        with baseline_image, actual_image:
+            width, height = baseline_image.size
+            result.total_pixels = height * width
+            if baseline_image.size != actual_image.size:
+                result.error = (f"画像サイズが異なります (ベースライン: {width}x{height}, "
+                                f"比較対象: {actual_image.width}x{actual_image.height})")
+            else:
+                for top, _, different in _iter_diff_bands(baseline_image, actual_image, pixel_threshold, masks,
+                                                          band_height):
+                    count = int(np.count_nonzero(different))
+                    if not count:
+                        continue
+                    result.diff_pixels += count
+                    rows = np.flatnonzero(different.any(axis=1))
+                    columns = np.flatnonzero(different.any(axis=0))
+                    bbox = (int(columns[0]), top + int(rows[0]), int(columns[-1]) + 1, top + int(rows[-1]) + 1)
+                    if result.diff_bbox is not None: # 上の帯で見つかった範囲と合わせる
+                        bbox = (min(bbox[0], result.diff_bbox[0]), result.diff_bbox[1],
+                                max(bbox[2], result.diff_bbox[2]), bbox[3])
+                    result.diff_bbox = bbox
+                result.diff_ratio = result.diff_pixels / result.total_pixels if result.total_pixels else 0.0
+                result.passed = result.diff_ratio <= tolerance
+                if not result.passed and diff_filepath:
+                    save_diff_image(baseline_image, actual_image, diff_filepath, pixel_threshold, masks, band_height)
+                    result.diff_path = diff_filepath
+    result.duration = time.perf_counter() - start
+    return result
+
+
+def load_masks(filepath):
+    """
+    画像ごとのマスク領域を定義したJSONファイルを読み込みます。
+
+    JSONファイルの形式 (キーはベースラインディレクトリからの相対パスのglobパターン):
+        {"*/top_*.png": [[0, 0, 1920, 80]], "news/*.png": [[1500, 300, 400, 250], [0, 0, 200, 40]]}
+
+    Returns:
+        list: (globパターン, マスク領域のリスト) のリスト。
+    """
+    with open(filepath, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError("マスクのファイルには、globパターンをキーとするオブジェクトを記述してください。")
+    masks = []
+    for pattern, rects in data.items():
+        if not all(isinstance(rect, list) and len(rect) == 4 for rect in rects):
+            raise ValueError(f"'{pattern}' のマスク領域は [x, y, 幅, 高さ] のリストで指定してください。")
+        masks.append((pattern, [tuple(rect) for rect in rects]))
+    return masks
+
+
+def masks_for(relative_path, masks):
+    """相対パスに一致するglobパターンのマスク領域をすべて返します。"""
+    relative_path = relative_path.replace(os.sep, '/')
+    return [rect for pattern, rects in masks if fnmatch.fnmatch(relative_path, pattern) for rect in rects]
+
+
+def collect_pairs(baseline_dir, actual_dir):
+    """
+    ベースラインディレクトリと比較対象ディレクトリから、同じ相対パスの画像の組を集めます。
+
+    Returns:
+        tuple: (相対パスのリスト, ベースラインにない比較対象の相対パスのリスト)。
+    """
+    def relative_images(root):
+        found = set()
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    found.add(os.path.relpath(os.path.join(directory, filename), root))
+        return found
+
+    baseline_images = relative_images(baseline_dir)
+    actual_images = relative_images(actual_dir)
+    return sorted(baseline_images), sorted(actual_images - baseline_images)
+
+
+def _diff_filename(relative_path):
+    return f"{os.path.splitext(relative_path)[0]}_diff.png"
+
+
+def _compare_pair(task):
+    relative_path, baseline_dir, actual_dir, diff_dir, options = task
+    actual = os.path.join(actual_dir, relative_path)
+    if not os.path.exists(actual):
+        return CompareResult(relative_path, passed=False, error="比較対象の画像がありません")
+    diff_filepath = os.path.join(diff_dir, _diff_filename(relative_path)) if diff_dir else None
+    return compare_images(os.path.join(baseline_dir, relative_path), actual, name=relative_path,
+                          diff_filepath=diff_filepath, **options)
+
+
+def compare_directories(baseline_dir, actual_dir, diff_dir=None, workers=None, pixel_threshold=DEFAULT_PIXEL_THRESHOLD,
+                        tolerance=0.0, masks=(), band_height=DEFAULT_BAND_HEIGHT):
+    """
+    ベースラインディレクトリと比較対象ディレクトリの同じ相対パスの画像を、複数のプロセスで並列に比較します。
+
+    Args:
+        baseline_dir (str): ベースライン画像のディレクトリ (前回のリリースのスクリーンショットなど)。
+        actual_dir (str): 比較する画像のディレクトリ。
+        diff_dir (str): diff画像の保存先。Noneの場合は保存しません。
+        workers (int): プロセス数。未指定の場合はCPUコア数。
+        pixel_threshold (int): チャンネルごとの差がこの値を超える画素を異なる画素とします。
+        tolerance (float): 一致とみなす異なる画素の割合の上限 (0-1)。
+        masks (list): load_masks の戻り値。
+        band_height (int): 一度に計算する行数。
+
+    Returns:
+        tuple: (相対パス順の CompareResult のリスト, ベースラインにない画像の相対パスのリスト)。
+    """
+    relative_paths, new_images = collect_pairs(baseline_dir, actual_dir)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(relative_paths)))
+    tasks = [(path, baseline_dir, actual_dir, diff_dir,
+              {'pixel_threshold': pixel_threshold, 'tolerance': tolerance, 'masks': masks_for(path, masks),
+               'band_height': band_height})
+             for path in relative_paths]
+    if workers == 1:
+        return [_compare_pair(task) for task in tasks], new_images
+    # 画像の組を数十件ずつまとめてワーカーに渡し、プロセス間の通信回数を減らす
+    chunksize = max(1, min(32, len(tasks) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_compare_pair, tasks, chunksize=chunksize)), new_images
+
+
+def write_report(results, filepath):
+    """比較結果を保存します。拡張子が .csv の場合はCSV、それ以外はJSONで保存します。"""
+    rows = [asdict(result) for result in results]
+    if not filepath.lower().endswith('.csv'):
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        return
+    columns = list(CompareResult.__dataclass_fields__)
+    with open(filepath, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ベースラインのスクリーンショットと比較対象のスクリーンショットを一括で比較します。")
+    parser.add_argument('baseline_dir', help="ベースライン画像のディレクトリ")
+    parser.add_argument('actual_dir', help="比較する画像のディレクトリ (同じ相対パスの画像を比較します)")
+    parser.add_argument('-d', '--diff-dir', help="一致しない画像のdiff画像の保存先")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help="プロセス数 (デフォルト: CPUコア数)")
+    parser.add_argument('-t', '--tolerance', type=float, default=0.0,
+                        help="一致とみなす異なる画素の割合の上限 (0-1、デフォルト: 0)")
+    parser.add_argument('--pixel-threshold', type=int, default=DEFAULT_PIXEL_THRESHOLD,
+                        help=f"異なる画素とみなすチャンネルごとの差 (0-255、デフォルト: {DEFAULT_PIXEL_THRESHOLD})")
+    parser.add_argument('--masks', metavar='PATH', help="画像ごとのマスク領域を定義したJSONファイル")
+    parser.add_argument('--band-height', type=int, default=DEFAULT_BAND_HEIGHT, help="一度に比較する行数")
+    parser.add_argument('-o', '--output', help="比較結果を保存するファイル (.csv または .json)")
+    args = parser.parse_args(argv)
+
+    if not 0 <= args.pixel_threshold <= 255:
+        parser.error("--pixel-threshold は 0-255 で指定してください。")
+    for directory in (args.baseline_dir, args.actual_dir):
+        if not os.path.isdir(directory):
+            parser.error(f"ディレクトリが見つかりません: {directory}")
+    try:
+        masks = load_masks(args.masks) if args.masks else []
+    except (OSError, ValueError) as e:
+        parser.error(f"マスクのファイルを読み込めません: {e}")
+
+    start = time.perf_counter()
+    results, new_images = compare_directories(args.baseline_dir, args.actual_dir, args.diff_dir, args.workers,
+                                              args.pixel_threshold, args.tolerance, masks, args.band_height)
+    elapsed = time.perf_counter() - start
+
+    failed = [r for r in results if not r.passed]
+    for r in failed:
+        detail = r.error or f"差分 {r.diff_ratio:.3%} ({r.diff_pixels} 画素, 範囲: {r.diff_bbox})"
+        diff = f" diff: {r.diff_path}" if r.diff_path else ''
+        print(f"[FAIL] {r.name} {detail}{diff}")
+    for path in new_images:
+        print(f"[NEW] {path} (ベースラインにありません)")
+    if args.output:
+        write_report(results, args.output)
+        print(f"比較結果を保存しました: {args.output}")
+    print(f"合計: {len(results)} 枚 / 一致: {len(results) - len(failed)} / 不一致: {len(failed)} / "
+          f"新規: {len(new_images)} ({elapsed:.1f} 秒)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    exit(main())
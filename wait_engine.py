@@ -0,0 +1,143 @@
+import time
+
+# ページ内の通信数とDOM変更時刻を記録する計測スクリプト (複数回実行しても一度だけ設定される)
+INSTRUMENT_JS = """
+if (!window.__wtaWait) {
+    const state = window.__wtaWait = {pending: 0, lastMutation: performance.now()};
+    new MutationObserver(function() { state.lastMutation = performance.now(); })
+        .observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    if (window.fetch) {
+        const originalFetch = window.fetch;
+        window.fetch = function() {
+            state.pending++;
+            return originalFetch.apply(this, arguments).finally(function() { state.pending--; });
+        };
+    }
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        state.pending++;
+        this.addEventListener('loadend', function() { state.pending--; }, {once: true});
+        return originalSend.apply(this, arguments);
+    };
+}
+"""
+
+# ページの準備状態を取得するスクリプト
+PAGE_STATE_JS = INSTRUMENT_JS + """
+const state = window.__wtaWait;
+const viewportImages = Array.from(document.images).filter(function(img) {
+    const rect = img.getBoundingClientRect();
+    return rect.bottom >= 0 && rect.top <= window.innerHeight;
+});
+return {
+    readyState: document.readyState,
+    pending: Math.max(state.pending, 0),
+    quietMs: performance.now() - state.lastMutation,
+    imagesLoaded: viewportImages.every(function(img) { return img.complete; }),
+    fontsLoaded: !document.fonts || document.fonts.status === 'loaded'
+};
+"""
+
+
+class SmartWait:
+    """
+    固定時間のsleepの代わりに、ページの実際の準備状態をポーリングして待機します。
+    document.readyState、DOM変更の収束、fetch/XHRの未完了数、表示領域内の画像・フォントの読み込み完了を確認します。
+    """
+
+    def __init__(self, driver, poll_interval=0.1, quiet_period=0.3):
+        """
+        Args:
+            driver (WebDriver): 対象のWebDriver。
+            poll_interval (float): 状態を確認する間隔（秒）。
+            quiet_period (float): DOM変更が止まってから準備完了とみなすまでの時間（秒）。
+        """
+        self.driver = driver
+        self.poll_interval = poll_interval
+        self.quiet_period = quiet_period
+
+    def install(self):
+        """
+        Chromeの場合、ページ読み込み開始時に計測スクリプトが実行されるよう登録します。
+        登録できないブラウザでは、最初の状態確認時にスクリプトを設定します。
+        セッションプールで再利用されるWebDriverに重複して登録しないよう、登録済みの場合は何もしません。
+
+        Returns:
+            bool: 登録できた場合 (登録済みの場合を含む) はTrue。
+        """
+        if getattr(self.driver, '_smart_wait_installed', False):
+            return True
+        try:
+            self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': INSTRUMENT_JS})
+        except Exception:
+            return False
+        self.driver._smart_wait_installed = True
+        return True
+
+    def page_state(self):
+        """
+        ページの準備状態を取得します。
+
+        Returns:
+            dict: readyState, pending, quietMs, imagesLoaded, fontsLoaded を含む辞書。取得できない場合はNone。
+        """
+        state = self.driver.execute_script(PAGE_STATE_JS)
+        return state if isinstance(state, dict) else None
+
+    def is_page_ready(self, quiet_period=None):
+        """
+        ページが準備完了の状態かどうかを判定します。
+
+        Args:
+            quiet_period (float): DOM変更が止まってから準備完了とみなすまでの時間（秒）。未指定の場合は既定値。
+
+        Returns:
+            bool: 準備完了の場合はTrue。状態を取得できないページでは待機しないようTrueを返します。
+        """
+        quiet_period = self.quiet_period if quiet_period is None else quiet_period
+        state = self.page_state()
+        if state is None:
+            return True
+        return (state.get('readyState') == 'complete'
+                and state.get('pending', 0) <= 0
+                and state.get('quietMs', 0) >= quiet_period * 1000
+                and state.get('imagesLoaded', True)
+                and state.get('fontsLoaded', True))
+
+    def wait_until(self, condition, timeout):
+        """
+        条件を満たすか上限時間に達するまで待機します。
+
+        Args:
+            condition (callable): 引数なしで呼び出し、真偽値を返す関数。
+            timeout (float): 待機の上限時間（秒）。
+
+        Returns:
+            tuple: (実際に待機した秒数, 条件を満たした場合はTrue)。
+        """
+        start = time.monotonic()
+        deadline = start + timeout
+        while True:
+            try:
+                if condition():
+                    return time.monotonic() - start, True
+            except Exception:
+                # アラート表示中などで状態を取得できない場合は、それ以上待機しない
+                return time.monotonic() - start, False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return time.monotonic() - start, False
+            time.sleep(min(self.poll_interval, remaining))
+
+    def wait_for_page_ready(self, timeout, quiet_period=None):
+        """
+        ページが準備完了になるか上限時間に達するまで待機します。
+
+        Args:
+            timeout (float): 待機の上限時間（秒）。
+            quiet_period (float): DOM変更が止まってから準備完了とみなすまでの時間（秒）。
+
+        Returns:
+            tuple: (実際に待機した秒数, 準備完了になった場合はTrue)。
+        """
+        return self.wait_until(lambda: self.is_page_ready(quiet_period), timeout)